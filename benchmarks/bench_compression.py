@@ -0,0 +1,63 @@
+"""
+Microbenchmark for PolicyCompress against plain Flask-Compress.
+
+Runs the after_request compression step for a mix of responses shaped like
+ours: a rendered search page (identical for every anonymous visitor), a
+large JSON result and small JSON status responses. Reports the time per
+response and the bytes sent.
+
+Usage:
+    python benchmarks/bench_compression.py [--number 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from flask import Flask, Response
+from flask_compress import Compress
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.middleware.compression import PolicyCompress
+
+TEMPLATES = os.path.join(os.path.dirname(__file__), '..', 'src', 'templates')
+
+
+def workload():
+    """(body, mimetype) pairs in the proportions we serve them."""
+    with open(os.path.join(TEMPLATES, 'spotify.html'), encoding='utf-8') as f:
+        page = f.read() * 3
+    result = json.dumps([{'artist': f'Artist {i}', 'followers': i * 1000, 'genres': ['house']} for i in range(200)])
+    status = json.dumps({'success': True, 'authenticated': False})
+    return [(page, 'text/html')] * 2 + [(result, 'application/json')] + [(status, 'application/json')] * 5
+
+
+def run(compress, app, responses, number):
+    """Seconds per response and bytes per response for ``number`` passes over ``responses``."""
+    sent = 0
+    start = time.perf_counter()
+    with app.test_request_context(headers={'Accept-Encoding': 'br, gzip'}):
+        for _ in range(number):
+            for body, mimetype in responses:
+                sent += len(compress.after_request(Response(body, mimetype=mimetype)).get_data())
+    count = number * len(responses)
+    return (time.perf_counter() - start) / count, sent / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+    responses = workload()
+    
+    for label, compress in (('Flask-Compress', Compress()), ('PolicyCompress', PolicyCompress())):
+        app = Flask(__name__)
+        compress.init_app(app)
+        seconds, size = run(compress, app, responses, args.number)
+        print(f"{label}: {seconds * 1e6:.1f} us and {size:.0f} bytes per response")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Microbenchmark for RequestValidationMiddleware.validate_request.
+
+Compares the classifier plus combined scanner with the previous
+implementation (lowercase the full URL, one search per pattern) on a
+static asset hit and an API call, and checks that both agree on a set of
+hostile URLs.
+
+Usage:
+    python benchmarks/bench_request_validation.py [--number 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+from flask import Flask, jsonify, request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.middleware.security import SUSPICIOUS_URL_PATTERNS, RequestValidationMiddleware
+
+URLS = [
+    '/api/search?q=Daft+Punk&type=artist',
+    '/api/search?q=%3CScript%3Ealert(1)',
+    '/api/search?q=javascript%3Avoid(0)',
+    '/api/search?next=..%2F..%2Fetc%2Fpasswd',
+    '/api/playlists/abc/<iframe',
+    '/spotify?artist=4tZwfgrHOc3mvqYlEYSvVi'
+]
+
+
+def legacy_is_suspicious():
+    """The previous URL check, kept for comparison."""
+    url_lower = request.url.lower()
+    return any(pattern.search(url_lower) for pattern in SUSPICIOUS_URL_PATTERNS)
+
+
+def legacy_validate_request():
+    """The previous before_request hook (minus logging), kept for comparison."""
+    max_content_length = 10 * 1024 * 1024
+    if request.content_length and request.content_length > max_content_length:
+        return jsonify({"success": False, "error": "Request entity too large"}), 413
+    if legacy_is_suspicious():
+        return jsonify({"success": False, "error": "Invalid request"}), 400
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+    
+    app = Flask(__name__)
+    middleware = RequestValidationMiddleware(app)
+    
+    for url in URLS:
+        with app.test_request_context(url):
+            legacy = legacy_is_suspicious()
+            new = middleware.is_suspicious_url(request.path, request.query_string)
+            assert legacy == new, url
+    
+    for url in ('/static/css/main.css?v=3', '/api/search?q=Daft+Punk&type=artist'):
+        with app.test_request_context(url):
+            old = min(timeit.repeat(legacy_validate_request, number=args.number, repeat=5))
+            cur = min(timeit.repeat(middleware.validate_request, number=args.number, repeat=5))
+            print(f"{url}: legacy {old / args.number * 1e6:.2f} us, "
+                  f"current {cur / args.number * 1e6:.2f} us per request, {old / cur:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
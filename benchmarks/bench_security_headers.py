@@ -0,0 +1,71 @@
+"""
+Microbenchmark for SecurityHeadersMiddleware.add_security_headers.
+
+Measures the after_request cost per response of the precompiled header
+bundle against the previous implementation, which rebuilt the CSP and
+Permissions-Policy strings and set each header individually.
+
+Usage:
+    python benchmarks/bench_security_headers.py [--number 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+from flask import Flask, Response, request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.middleware.security import CSP_DIRECTIVES, PERMISSIONS_POLICY, SecurityHeadersMiddleware
+
+
+def legacy_add_security_headers(response):
+    """The previous implementation, kept for comparison."""
+    csp_directives = {directive: list(sources) for directive, sources in CSP_DIRECTIVES.items()}
+    csp_string = "; ".join([
+        f"{directive} {' '.join(sources)}"
+        for directive, sources in csp_directives.items()
+    ])
+    response.headers['Content-Security-Policy'] = csp_string
+    response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains; preload'
+    response.headers['X-Frame-Options'] = 'DENY'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['X-XSS-Protection'] = '1; mode=block'
+    response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
+    permissions = list(PERMISSIONS_POLICY)
+    response.headers['Permissions-Policy'] = ", ".join(permissions)
+    if request.path.startswith('/api/auth') and 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, private'
+        response.headers['Pragma'] = 'no-cache'
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+    
+    app = Flask(__name__)
+    middleware = SecurityHeadersMiddleware(app)
+    
+    for path in ('/static/css/main.css', '/api/auth/session-check'):
+        with app.test_request_context(path):
+            legacy = legacy_add_security_headers(Response('x'))
+            new = middleware.add_security_headers(Response('x'))
+            assert sorted(legacy.headers.items()) == sorted(new.headers.items()), path
+            
+            # Response creation is included in both timings; measure it alone too
+            baseline = min(timeit.repeat(lambda: Response('x'), number=args.number, repeat=5))
+            old = min(timeit.repeat(
+                lambda: legacy_add_security_headers(Response('x')), number=args.number, repeat=5
+            )) - baseline
+            cur = min(timeit.repeat(
+                lambda: middleware.add_security_headers(Response('x')), number=args.number, repeat=5
+            )) - baseline
+            print(f"{path}: legacy {old / args.number * 1e6:.2f} us, "
+                  f"precompiled {cur / args.number * 1e6:.2f} us per response, {old / cur:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
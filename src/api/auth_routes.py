@@ -1,28 +1,44 @@
 """
 Authentication API routes for user registration, login, logout, and password reset.
 """
+import hashlib
 import logging
 from datetime import timedelta, datetime
-from flask import Blueprint, request, jsonify, session, redirect, url_for, render_template
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+from typing import Optional
+from flask import Blueprint, request, jsonify, session, redirect, url_for, render_template, make_response
 
 from src.services.auth_service import auth_service
 from src.services.email_service import email_service
-from src.services.database_service import db_service
+from src.services.user_cache_service import user_cache_service
+from src.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
-# Rate limiter will be initialized in main.py
-limiter = None
 
-
-def init_limiter(app_limiter):
-    """Initialize rate limiter for auth routes."""
-    global limiter
-    limiter = app_limiter
+def init_limiter(app, app_limiter):
+    """
+    Apply per-IP rate limits to the auth routes.
+    
+    Must run after ``auth_bp`` is registered, since it wraps the registered
+    view functions. Breaches are answered by the app's 429 handler with the
+    route's message.
+    
+    Args:
+        app: Flask application instance
+        app_limiter: The application's Limiter
+    """
+    per_minute = app.config.get('LOGIN_RATE_LIMIT_PER_MINUTE', 3)
+    per_hour = app.config.get('LOGIN_RATE_LIMIT_PER_HOUR', 10)
+    route_limits = {
+        'auth.register': ("5 per hour", "Too many registration attempts. Please try again later."),
+        'auth.login': (f"{per_minute} per minute; {per_hour} per hour", "Too many login attempts. Please try again later."),
+        'auth.reset_request': ("3 per hour", "Too many reset requests. Please try again later."),
+    }
+    for endpoint, (limit_value, message) in route_limits.items():
+        view = app.view_functions[endpoint]
+        app.view_functions[endpoint] = app_limiter.limit(limit_value, error_message=message)(view)
 
 
 @auth_bp.route('/register', methods=['POST'])
@@ -45,16 +61,6 @@ def register():
             "data": {...} (optional)
         }
     """
-    # Apply rate limiting: 5 registrations per hour per IP
-    if limiter:
-        try:
-            limiter.check_limit("5 per hour")
-        except Exception:
-            return jsonify({
-                "success": False,
-                "message": "Too many registration attempts. Please try again later."
-            }), 429
-    
     data = request.get_json()
     
     if not data:
@@ -132,17 +138,6 @@ def login():
             "data": {...} (optional)
         }
     """
-    # Apply rate limiting
-    if limiter:
-        try:
-            limiter.check_limit("3 per minute")
-            limiter.check_limit("10 per hour")
-        except Exception:
-            return jsonify({
-                "success": False,
-                "message": "Too many login attempts. Please try again later."
-            }), 429
-    
     data = request.get_json()
     
     if not data:
@@ -267,16 +262,6 @@ def reset_request():
             "message": str
         }
     """
-    # Apply rate limiting: 3 per hour per IP
-    if limiter:
-        try:
-            limiter.check_limit("3 per hour")
-        except Exception:
-            return jsonify({
-                "success": False,
-                "message": "Too many reset requests. Please try again later."
-            }), 429
-    
     data = request.get_json()
     
     if not data:
@@ -293,8 +278,16 @@ def reset_request():
             "message": "Email is required"
         }), 400
     
+    # A reset already mailed within the dedup window is not sent again;
+    # issuing a new token would only revoke the link in that email
+    if email_service.recently_sent('password_reset', email):
+        return jsonify({
+            "success": True,
+            "message": "If the email exists, a reset link has been sent."
+        }), 200
+    
     # Request password reset
-    token, error = auth_service.request_password_reset(email)
+    reset, error = auth_service.request_password_reset(email)
     
     if error:
         return jsonify({
@@ -302,18 +295,13 @@ def reset_request():
             "message": error
         }), 400
     
-    # Send reset email (if user exists, token will be real; otherwise it's a dummy)
-    if token and token != "token_generated":
-        # Get user to send email
-        users_collection = db_service.get_users_collection()
-        if users_collection:
-            user_data = users_collection.find_one({"email": email.lower()})
-            if user_data:
-                email_service.send_password_reset_email(
-                    user_data['email'],
-                    user_data['username'],
-                    token
-                )
+    # Send reset email only if the account exists
+    if reset:
+        email_service.send_password_reset_email(
+            reset['email'],
+            reset['username'],
+            reset['token']
+        )
     
     # Always return generic message for security
     return jsonify({
@@ -385,6 +373,10 @@ def session_check():
     """
     Check if user session is valid.
     
+    Responses carry a private ETag derived from the session and the user's
+    version stamp; a matching If-None-Match gets 304 without a database
+    lookup until the user or the session changes.
+    
     Response:
         {
             "success": bool,
@@ -393,12 +385,17 @@ def session_check():
         }
     """
     user_id = session.get('user_id')
+    etag = session_check_etag(user_id)
+    
+    if request.if_none_match.contains_weak(etag):
+        metrics.increment('auth.session_check.not_modified')
+        return _session_check_response(make_response('', 304), etag)
     
     if not user_id:
-        return jsonify({
+        return _session_check_response(jsonify({
             "success": True,
             "authenticated": False
-        }), 200
+        }), etag)
     
     # Verify user still exists and is valid
     user = auth_service.get_user_by_id(user_id)
@@ -410,14 +407,36 @@ def session_check():
             "authenticated": False
         }), 200
     
-    return jsonify({
+    return _session_check_response(jsonify({
         "success": True,
         "authenticated": True,
         "data": {
             "username": session.get('username'),
             "email": session.get('email')
         }
-    }), 200
+    }), etag)
+
+
+def session_check_etag(user_id: Optional[str]) -> str:
+    """ETag of the session-check answer for the current session."""
+    if not user_id:
+        return 'anonymous'
+    state = '|'.join([
+        user_id,
+        str(user_cache_service.version(user_id)),
+        session.get('username') or '',
+        session.get('email') or '',
+        session.get('login_time') or ''
+    ])
+    return hashlib.blake2b(state.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _session_check_response(response, etag: str):
+    """Mark a session-check response as privately revalidatable."""
+    response.set_etag(etag)
+    # Cached by the browser only, and always revalidated
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @auth_bp.route('/refresh-session', methods=['POST'])
@@ -2,13 +2,26 @@
 Profile management API routes.
 """
 import logging
-from flask import Blueprint, request, jsonify, session
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, session, render_template
 
 from src.services.auth_service import auth_service
+from src.services.digest_service import digest_service
 from src.services.email_service import email_service
+from src.services.history_rollup_service import history_rollup_service
+from src.services.search_history_service import search_history_service
 
 logger = logging.getLogger(__name__)
 
+# Page size bounds for search history
+HISTORY_DEFAULT_LIMIT = 20
+HISTORY_MAX_LIMIT = 100
+
+# Look-back bounds (days) and list size for search statistics
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 365
+STATS_TOP_ARTISTS = 10
+
 profile_bp = Blueprint('profile', __name__, url_prefix='/api/profile')
 
 
@@ -236,3 +249,119 @@ def change_password():
         "success": True,
         "message": "Password changed successfully"
     }), 200
+
+
+@profile_bp.route('/digest/unsubscribe/<token>', methods=['GET'])
+def unsubscribe_digest(token):
+    """
+    Stop weekly digest emails, from the link at the bottom of a digest.
+    
+    Does not require a session: the signed token identifies the user.
+    
+    Args:
+        token: Unsubscribe token from URL
+    
+    Response:
+        Renders the unsubscribe result page
+    """
+    success = digest_service.unsubscribe(token)
+    
+    return render_template(
+        'auth/unsubscribe.html',
+        success=success,
+        message=(
+            "You will no longer receive weekly digest emails."
+            if success else "Invalid unsubscribe link."
+        )
+    ), 200 if success else 400
+
+
+@profile_bp.route('/history', methods=['GET'])
+@require_authentication
+def get_search_history():
+    """
+    Get the user's search history, newest first.
+    
+    Query parameters:
+        cursor: str (optional, ``next_cursor`` from the previous page)
+        limit: int (optional, 1-100, default 20)
+    
+    Response:
+        {
+            "success": bool,
+            "data": {
+                "items": [
+                    {
+                        "query": str,
+                        "artist_id": str,
+                        "artist_name": str,
+                        "artist_url": str,
+                        "searched_at": str
+                    }
+                ],
+                "next_cursor": str or null
+            }
+        }
+    """
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit', HISTORY_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    
+    user_id = session.get('user_id')
+    page, error = search_history_service.get_history(user_id, cursor=cursor, limit=limit)
+    
+    if error:
+        return jsonify({
+            "success": False,
+            "message": error
+        }), 400
+    
+    return jsonify({
+        "success": True,
+        "data": page
+    }), 200
+
+
+@profile_bp.route('/stats', methods=['GET'])
+@require_authentication
+def get_search_stats():
+    """
+    Get the user's most searched artists and searches per day.
+    
+    Read from the daily rollup, so recent searches not rolled up yet are
+    not counted.
+    
+    Query parameters:
+        days: int (optional, 1-365, default 30)
+    
+    Response:
+        {
+            "success": bool,
+            "data": {
+                "top_artists": [
+                    {"artist_id": str, "artist_name": str, "count": int}
+                ],
+                "daily_counts": [
+                    {"day": str, "count": int}
+                ]
+            }
+        }
+    """
+    days = request.args.get('days', STATS_DEFAULT_DAYS, type=int)
+    days = max(1, min(days, STATS_MAX_DAYS))
+    
+    user_id = session.get('user_id')
+    since = datetime.utcnow() - timedelta(days=days)
+    top_artists = history_rollup_service.get_top_artists(since, user_id=user_id, limit=STATS_TOP_ARTISTS)
+    daily_counts = [
+        {'day': entry['day'].strftime('%Y-%m-%d'), 'count': entry['count']}
+        for entry in history_rollup_service.get_daily_counts(user_id, days=days)
+    ]
+    
+    return jsonify({
+        "success": True,
+        "data": {
+            "top_artists": top_artists,
+            "daily_counts": daily_counts
+        }
+    }), 200
@@ -1,7 +1,11 @@
 """RESTful API routes for Octa Music."""
-from flask import Blueprint, request, jsonify
+import hmac
+from flask import Blueprint, current_app, request, jsonify
 from src.services.spotify_service import SpotifyService
 from src.services.youtube_service import get_channel_stats_by_name
+from src.services.health_service import health_service
+from src.services.trending_service import trending_service
+from src.utils.metrics import metrics
 import os
 import logging
 
@@ -35,14 +39,55 @@ def create_success_response(data, message=None):
         'message': message
     }), 200
 
+def is_internal_request():
+    """True if the request carries the configured INTERNAL_API_TOKEN as a Bearer token."""
+    token = current_app.config.get('INTERNAL_API_TOKEN')
+    if not token:
+        return False
+    supplied = request.headers.get('Authorization', '')
+    return hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())
+
 @api_bp.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint."""
+    """Health check endpoint.
+    
+    Shallow by default: returns the dependency states cached by the
+    background prober without contacting any dependency. Internal
+    callers (see ``is_internal_request``) can pass ``?deep=1`` to probe
+    every dependency now; anonymous callers always get the cached states,
+    so the endpoint cannot be used to fan out requests to dependencies.
+    """
+    deep = request.args.get('deep', '').lower() in ('1', 'true', 'yes') and is_internal_request()
+    health = health_service.get_status(deep=deep)
     return create_success_response({
-        'status': 'healthy',
-        'version': '1.0.0'
+        'status': health['status'],
+        'version': '1.0.0',
+        'dependencies': health['dependencies']
     })
 
+@api_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose in-process metrics for the worker serving the request.
+    
+    Internal only: requires ``Authorization: Bearer <INTERNAL_API_TOKEN>``
+    and is disabled when no token is configured.
+    """
+    if not is_internal_request():
+        return create_error_response('Not found', 404)
+    return create_success_response(metrics.snapshot())
+
+@api_bp.route('/trending', methods=['GET'])
+def get_trending():
+    """Get the artists searched most across all users in the recent window.
+    
+    Query parameters:
+        limit: int (optional, 1-50)
+    """
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, 50))
+    return create_success_response(trending_service.get_trending(limit))
+
 def rate_limit_decorator():
     """Get rate limiter decorator if available."""
     try:
@@ -78,6 +123,7 @@ def search_spotify_artist():
         artist = spotify_service.search_artist(artist_name)
         
         if artist:
+            trending_service.record(artist)
             return create_success_response(artist, 'Artist found successfully')
         else:
             return create_error_response('Artist not found', 404)
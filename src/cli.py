@@ -0,0 +1,144 @@
+"""
+Flask CLI commands for one-off maintenance tasks.
+
+Usage:
+    flask --app src.main <command>
+"""
+import logging
+from datetime import datetime
+import click
+from flask import current_app
+
+from src.services import migrations
+from src.services.database_service import db_service
+from src.services.search_history_service import search_history_service, MODE_COLLAPSED
+from src.services.history_rollup_service import history_rollup_service
+from src.services.digest_service import digest_service
+from src.services.asset_service import build_assets
+
+logger = logging.getLogger(__name__)
+
+# The fold pipeline uses $bottom, $bottomN and $sortArray
+FOLD_MIN_SERVER_VERSION = (5, 2)
+
+
+@click.command('fold-search-history')
+@click.option('--keep-source', is_flag=True, default=False,
+              help='Keep folded events in search_history (re-running will double count).')
+def fold_search_history_command(keep_source):
+    """Fold search_history events into one document per user and artist.
+    
+    Requires MongoDB 5.2 or later.
+    """
+    db = _require_db()
+    version = tuple(db.client.server_info()['versionArray'][:2])
+    if version < FOLD_MIN_SERVER_VERSION:
+        raise click.ClickException(
+            f"fold-search-history needs MongoDB {'.'.join(map(str, FOLD_MIN_SERVER_VERSION))} "
+            f"or later (server is {'.'.join(map(str, version))})"
+        )
+    cutoff = datetime.utcnow()
+    folded = search_history_service.fold_events(cutoff, delete_source=not keep_source)
+    click.echo(f"Folded {folded} search history events recorded before {cutoff.isoformat()}")
+
+
+@click.command('rollup-search-history')
+def rollup_search_history_command():
+    """Fold complete days of search events into daily aggregates.
+    
+    Run at least daily (e.g. from a cron job) so events are rolled up
+    before the TTL index removes them.
+    """
+    _require_event_history()
+    window_start, window_end = history_rollup_service.run_rollup()
+    if window_start is None:
+        click.echo("Search history rollup is up to date")
+        return
+    click.echo(f"Rolled up search history from {window_start.isoformat()} to {window_end.isoformat()}")
+
+
+def _require_event_history():
+    """Abort if searches are not stored as events (the rollup and digests read them)."""
+    if search_history_service.mode == MODE_COLLAPSED:
+        raise click.ClickException(
+            "SEARCH_HISTORY_MODE is 'collapsed': no events reach search_history, "
+            "so the daily rollup and digests would have no data"
+        )
+
+
+def _require_db():
+    """Database handle, or abort the command if MongoDB is not configured."""
+    db = db_service.db
+    if db is None:
+        raise click.ClickException("MongoDB is not configured (set MONGODB_URI)")
+    return db
+
+
+@click.command('db-upgrade')
+@click.option('--to', 'target', type=int, default=None, help='Stop after this schema version.')
+def db_upgrade_command(target):
+    """Apply pending index migrations and sync the history retention TTL.
+    
+    Run once per deploy (e.g. as a pre-deploy step), not from workers.
+    """
+    db = _require_db()
+    applied = migrations.apply_migrations(db, target)
+    for migration in applied:
+        click.echo(f"Applied {migration.version}: {migration.description}")
+    if migrations.sync_history_retention(db, db_service.history_retention_days):
+        click.echo(f"search_history retention set to {db_service.history_retention_days or 'unlimited'} days")
+    click.echo(f"Schema is at version {migrations.get_applied_version(db)}")
+
+
+@click.command('db-status')
+def db_status_command():
+    """Show the applied schema version and pending migrations."""
+    db = _require_db()
+    state = migrations.get_schema_state(db)
+    click.echo(f"Schema version: {state.get('version', 0)} (latest {migrations.LATEST_VERSION})")
+    click.echo(f"History retention: {state.get('history_retention_days', 0) or 'unlimited'} days")
+    for migration in migrations.pending_migrations(db):
+        click.echo(f"Pending {migration.version}: {migration.description}")
+
+
+@click.command('send-digests')
+@click.option('--days', type=int, default=7, show_default=True, help='Days of search history to summarize.')
+@click.option('--rate', type=float, default=None, help='Messages per second (defaults to DIGEST_SEND_RATE).')
+@click.option('--limit', type=int, default=None, help='Stop after this many recipients.')
+@click.option('--dry-run', is_flag=True, default=False, help='Render digests without sending them.')
+def send_digests_command(days, rate, limit, dry_run):
+    """Email each user the artists they searched for most.
+    
+    Reads the daily rollup, so run rollup-search-history first. Users who
+    already received a digest for the period are skipped.
+    """
+    _require_db()
+    _require_event_history()
+    stats = digest_service.send_digests(days=days, rate=rate, limit=limit, dry_run=dry_run)
+    if dry_run:
+        click.echo(f"Rendered {stats['rendered']} digests (dry run, nothing sent)")
+        return
+    click.echo(f"Sent {stats['sent']} digests, {stats['deferred']} deferred to the outbox")
+
+
+@click.command('build-assets')
+def build_assets_command():
+    """Build fingerprinted, minified and precompressed static bundles.
+    
+    Run on every deploy before starting the server; workers load the
+    manifest at startup.
+    """
+    report = build_assets(current_app.static_folder)
+    for name, built in report.items():
+        sizes = ', '.join(f"{encoding} {size}" for encoding, size in built['sizes'].items())
+        click.echo(f"{name} -> {built['file']} ({sizes} bytes)")
+
+
+def register_commands(app):
+    """Register maintenance commands on the Flask app."""
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(db_status_command)
+    app.cli.add_command(fold_search_history_command)
+    app.cli.add_command(rollup_search_history_command)
+    app.cli.add_command(send_digests_command)
+    app.cli.add_command(build_assets_command)
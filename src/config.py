@@ -16,6 +16,64 @@ class Config:
     MONGODB_URI = os.getenv('MONGODB_URI')
     MONGODB_DB_NAME = 'octa_music'
     
+    # MongoDB connection pool (per worker process), sized to the gunicorn thread count
+    WORKER_THREADS = int(os.getenv('WORKER_THREADS', 4))
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', WORKER_THREADS + 2))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', max(1, WORKER_THREADS // 2)))
+    MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 300000))  # 5 minutes
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 2000))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    
+    # Background dependency health probes
+    HEALTH_PROBE_INTERVAL = int(os.getenv('HEALTH_PROBE_INTERVAL', 30))  # seconds
+    
+    # Per-worker cache of users by ID (session checks, profile reads)
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))  # 0 disables the cache
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))  # seconds
+    USER_CACHE_STAMP_PATH = os.getenv('USER_CACHE_STAMP_PATH')  # Defaults to /dev/shm
+    
+    # Per-worker cache of compressed response bodies, keyed on a body hash.
+    # Minimum sizes and levels per content type: COMPRESSION_POLICY
+    # (see src/middleware/compression.py).
+    COMPRESSION_CACHE_SIZE = int(os.getenv('COMPRESSION_CACHE_SIZE', 128))  # 0 disables the cache
+    COMPRESSION_CACHE_MAX_BODY = int(os.getenv('COMPRESSION_CACHE_MAX_BODY', 262144))  # bytes
+    
+    # bcrypt runs in a per-worker process pool (0 hashes on the request thread)
+    HASHING_WORKERS = int(os.getenv('HASHING_WORKERS', 1))
+    # Logins, registrations and password changes in flight per worker before 503
+    HASHING_MAX_PENDING = int(os.getenv('HASHING_MAX_PENDING', 8))
+    # Seconds to wait for a pooled hash before giving up with 503
+    HASHING_TIMEOUT = float(os.getenv('HASHING_TIMEOUT', 10))
+    # bcrypt cost: fixed by BCRYPT_ROUNDS, otherwise calibrated once per
+    # serving process (never below BCRYPT_MIN_ROUNDS) so one hash takes about
+    # BCRYPT_TARGET_MS on this host. Hashes below the cost are upgraded on
+    # the next successful login, never downgraded; set BCRYPT_ROUNDS to pin
+    # one cost across hosts.
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 0))
+    BCRYPT_TARGET_MS = int(os.getenv('BCRYPT_TARGET_MS', 250))
+    BCRYPT_MIN_ROUNDS = int(os.getenv('BCRYPT_MIN_ROUNDS', 12))
+    BCRYPT_MAX_ROUNDS = int(os.getenv('BCRYPT_MAX_ROUNDS', 15))
+    
+    # Search history write-behind queue
+    SEARCH_HISTORY_BATCH_SIZE = int(os.getenv('SEARCH_HISTORY_BATCH_SIZE', 50))
+    SEARCH_HISTORY_FLUSH_INTERVAL = float(os.getenv('SEARCH_HISTORY_FLUSH_INTERVAL', 2.0))  # seconds
+    SEARCH_HISTORY_MAX_QUEUE = int(os.getenv('SEARCH_HISTORY_MAX_QUEUE', 5000))
+    # 'events' (one document per search) or 'collapsed' (one per user and artist).
+    # Collapsed mode writes nothing to search_history, so the daily rollup
+    # and digests have no data; their commands refuse to run.
+    SEARCH_HISTORY_MODE = os.getenv('SEARCH_HISTORY_MODE', 'events')
+    SEARCH_HISTORY_RECENT_LIMIT = int(os.getenv('SEARCH_HISTORY_RECENT_LIMIT', 10))
+    # Raw search events expire after this many days (0 keeps them forever).
+    # Run `flask rollup-search-history` daily before enabling.
+    SEARCH_HISTORY_RETENTION_DAYS = int(os.getenv('SEARCH_HISTORY_RETENTION_DAYS', 0))
+    
+    # Trending artists (sliding window over recent searches)
+    TRENDING_WINDOW_SECONDS = int(os.getenv('TRENDING_WINDOW_SECONDS', 3600))
+    TRENDING_BUCKETS = int(os.getenv('TRENDING_BUCKETS', 12))
+    TRENDING_TOP_K = int(os.getenv('TRENDING_TOP_K', 10))
+    TRENDING_MERGE_INTERVAL = int(os.getenv('TRENDING_MERGE_INTERVAL', 15))  # seconds
+    TRENDING_SNAPSHOT_DIR = os.getenv('TRENDING_SNAPSHOT_DIR')  # Defaults to /dev/shm
+    
     # Flask-Mail Configuration
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
@@ -25,15 +83,37 @@ class Config:
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
     
+    # Outbound email is queued in a local SQLite outbox and sent in the background
+    # Defaults to the temp directory, which does not survive a restart; required in production
+    EMAIL_OUTBOX_PATH = os.getenv('EMAIL_OUTBOX_PATH')
+    EMAIL_OUTBOX_PATH_REQUIRED = False
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 20))  # messages per SMTP connection
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('EMAIL_OUTBOX_POLL_INTERVAL', 5))  # seconds
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+    # A verification, reset or email change message to the same address is
+    # sent at most once per window
+    EMAIL_DEDUP_WINDOW = int(os.getenv('EMAIL_DEDUP_WINDOW', 900))  # seconds
+    
+    # Top artist digests (flask send-digests)
+    DIGEST_SEND_RATE = float(os.getenv('DIGEST_SEND_RATE', 5))  # messages per second
+    DIGEST_BATCH_SIZE = int(os.getenv('DIGEST_BATCH_SIZE', 100))  # recipients per SMTP connection
+    DIGEST_TOP_ARTISTS = int(os.getenv('DIGEST_TOP_ARTISTS', 5))
+    
     # Session Configuration
     SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
     SESSION_COOKIE_HTTPONLY = os.getenv('SESSION_COOKIE_HTTPONLY', 'True').lower() == 'true'
     SESSION_COOKIE_SAMESITE = os.getenv('SESSION_COOKIE_SAMESITE', 'Lax')
     PERMANENT_SESSION_LIFETIME = int(os.getenv('PERMANENT_SESSION_LIFETIME', 4800))  # 80 minutes
+    # 'sqlite' keeps session data server-side (cookie holds only an ID); 'cookie' uses signed cookies.
+    # The default path is on /dev/shm, so sessions do not survive a host restart.
+    SESSION_STORE = os.getenv('SESSION_STORE', 'sqlite')
+    SESSION_DB_PATH = os.getenv('SESSION_DB_PATH')
     REMEMBER_ME_DURATION = int(os.getenv('REMEMBER_ME_DURATION', 2592000))  # 30 days
     
     # Rate Limiting
-    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'memory://')
+    # Unset means a SQLite file on /dev/shm shared by all workers on the host
+    # (sqlite:///path); use memory:// for per-process counters.
+    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL')
     LOGIN_RATE_LIMIT_PER_MINUTE = int(os.getenv('LOGIN_RATE_LIMIT_PER_MINUTE', 3))
     LOGIN_RATE_LIMIT_PER_HOUR = int(os.getenv('LOGIN_RATE_LIMIT_PER_HOUR', 10))
     
@@ -41,6 +121,18 @@ class Config:
     FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5000')
     
     # Security
+    # Bearer token for internal endpoints (/api/v1/metrics); unset disables them
+    INTERNAL_API_TOKEN = os.getenv('INTERNAL_API_TOKEN')
+    # Previous SECRET_KEYs, newest first, still accepted when verifying
+    # emailed tokens so rotating the secret does not break links in flight
+    SECRET_KEY_FALLBACKS = [key for key in os.getenv('SECRET_KEY_FALLBACKS', '').split(',') if key]
+    # Serve the bundles built by `flask build-assets` when a manifest exists
+    ASSET_BUNDLES_ENABLED = os.getenv('ASSET_BUNDLES_ENABLED', 'True').lower() == 'true'
+    # Path prefixes that skip request validation (comma-separated); unset
+    # means the static folder only
+    REQUEST_VALIDATION_EXEMPT_PREFIXES = [
+        prefix for prefix in os.getenv('REQUEST_VALIDATION_EXEMPT_PREFIXES', '').split(',') if prefix
+    ] or None
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = None
 
@@ -48,6 +140,8 @@ class DevelopmentConfig(Config):
     DEBUG = True
     # In development, print emails to console instead of sending
     MAIL_SUPPRESS_SEND = os.getenv('MAIL_SUPPRESS_SEND', 'True').lower() == 'true'
+    # Edited CSS/JS shows up without rebuilding the bundles
+    ASSET_BUNDLES_ENABLED = os.getenv('ASSET_BUNDLES_ENABLED', 'False').lower() == 'true'
 
 class PreproductionConfig(Config):
     DEBUG = False
@@ -56,3 +150,5 @@ class ProductionConfig(Config):
     DEBUG = False
     # Force secure cookies in production
     SESSION_COOKIE_SECURE = True
+    # Queued mail must outlive restarts and redeploys
+    EMAIL_OUTBOX_PATH_REQUIRED = True
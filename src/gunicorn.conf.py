@@ -0,0 +1,45 @@
+"""
+Gunicorn server hooks for Octa Music.
+
+Loaded from the ``src`` directory (``--chdir src``). The app is preloaded
+in the master, so anything holding sockets or threads must be recreated
+in each worker after fork.
+"""
+
+
+def post_fork(server, worker):
+    """Give each worker its own MongoDB client, warm its pool and start background threads."""
+    from src.services.database_service import db_service
+    from src.services.hashing_service import hashing_service
+    from src.services.health_service import health_service
+    from src.services.trending_service import trending_service
+    from src.services.email_outbox import email_outbox
+    from src.utils.metrics import metrics
+    
+    metrics.reset()
+    db_service.connect()
+    db_service.warm_pool()
+    # Calibrate the bcrypt cost here rather than on the first login
+    hashing_service.get_cost()
+    health_service.start()
+    trending_service.start()
+    # Drain mail left in the outbox by a previous run
+    email_outbox.start()
+
+
+def worker_exit(server, worker):
+    """Release worker resources on shutdown."""
+    from src.services.database_service import db_service
+    from src.services.search_history_service import search_history_service
+    from src.services.health_service import health_service
+    from src.services.trending_service import trending_service
+    from src.services.hashing_service import hashing_service
+    from src.services.email_outbox import email_outbox
+    
+    # Flush queued history before the client goes away
+    search_history_service.shutdown()
+    health_service.stop()
+    trending_service.stop()
+    hashing_service.shutdown()
+    email_outbox.stop()
+    db_service.close()
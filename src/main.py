@@ -2,7 +2,6 @@ import os
 import sys
 import logging
 from datetime import timedelta
-from flask_compress import Compress
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 try:
@@ -10,7 +9,7 @@ try:
 except ImportError:
     __version__ = "unknown"
 
-from flask import Flask, request, render_template, session, redirect, url_for
+from flask import Flask, request, render_template, session, redirect, url_for, jsonify
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -23,10 +22,24 @@ from src.api.auth_routes import auth_bp, init_limiter as init_auth_limiter
 from src.api.profile_routes import profile_bp
 from src.services.database_service import db_service
 from src.services.auth_service import auth_service
+from src.services.hashing_service import hashing_service, HashingOverloadedError
+from src.services.user_cache_service import user_cache_service
 from src.services.email_service import email_service
+from src.services.email_outbox import email_outbox
+from src.services.search_history_service import search_history_service
+from src.services.history_rollup_service import history_rollup_service
+from src.services.digest_service import digest_service
+from src.services.trending_service import trending_service
+from src.services.health_service import health_service
+from src.services.asset_service import asset_service
+from src.services.youtube_service import check_reachability as check_youtube_reachability
+from src.services.session_store import init_session_store
+from src.utils.ratelimit_storage import default_storage_uri
+from src.cli import register_commands
 
 # Import security middleware
 from src.middleware.security import SecurityHeadersMiddleware, RequestValidationMiddleware
+from src.middleware.compression import PolicyCompress
 
 # Import SQLAlchemy db from models.py (for existing playlists functionality)
 from src.models import db as sqlalchemy_db
@@ -71,12 +84,15 @@ else:
         }
     })
 
-# Configure rate limiting
+# Configure rate limiting. Counters live in a SQLite file shared by every
+# worker on the host (see src/utils/ratelimit_storage.py); the sliding window
+# counter strategy approximates a moving window with two counters per limit.
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri=os.getenv("RATELIMIT_STORAGE_URL", "memory://"),
+    storage_uri=os.getenv("RATELIMIT_STORAGE_URL") or default_storage_uri(),
+    strategy="sliding-window-counter",
     enabled=app_env != "development"  # Disable in development for easier testing
 )
 
@@ -94,11 +110,15 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(
     seconds=app.config.get('PERMANENT_SESSION_LIFETIME', 4800)
 )
 
+# Server-side session storage (see SESSION_STORE)
+init_session_store(app)
+
 # Set max content length for security (10MB)
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
 
-# Initialize compression for better performance
-compress = Compress()
+# Initialize compression; minimum sizes and levels per content type, and a
+# cache of compressed outputs for repeated bodies (see COMPRESSION_POLICY)
+compress = PolicyCompress()
 compress.init_app(app)
 
 # Initialize security middleware
@@ -110,17 +130,29 @@ sqlalchemy_db.init_app(app)
 
 # Initialize MongoDB for authentication
 db_service.init_app(app)
+user_cache_service.init_app(app)
+hashing_service.init_app(app)
 auth_service.init_app(app)
+email_outbox.init_app(app)
 email_service.init_app(app)
+search_history_service.init_app(app)
+history_rollup_service.init_app(app)
+digest_service.init_app(app)
+trending_service.init_app(app)
+health_service.init_app(app)
+asset_service.init_app(app)
 
-# Initialize rate limiter for auth routes
-init_auth_limiter(limiter)
+# Register maintenance CLI commands
+register_commands(app)
 
 # Register API blueprints
 app.register_blueprint(api_bp)
 app.register_blueprint(auth_bp)
 app.register_blueprint(profile_bp)
 
+# Apply rate limits to auth routes (needs the registered view functions)
+init_auth_limiter(app, limiter)
+
 try:
     spotify_service = SpotifyService()
 except ValueError as e:
@@ -129,43 +161,28 @@ except ValueError as e:
 
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY", "YOUR_API_KEY")
 
+# Dependency probes run by the background health prober
+health_service.register_probe('mongodb', db_service.ping)
+health_service.register_probe('schema', db_service.schema_probe)
+health_service.register_probe('spotify', lambda: spotify_service.check_token() if spotify_service else None)
+health_service.register_probe('youtube', check_youtube_reachability)
+
 # Helper function to save search history
 def save_search_history(user_id, search_query, artist_result):
     """
     Save Spotify search to user's search history.
     
+    The record is queued and written in the background, so the search
+    response never waits on MongoDB.
+    
     Args:
         user_id: User ID string
         search_query: Search query string
         artist_result: Artist result dictionary from Spotify
     """
-    try:
-        from bson import ObjectId
-        from datetime import datetime
-        
-        search_history_collection = db_service.get_search_history_collection()
-        if not search_history_collection:
-            logger.warning("Search history collection not available")
-            return
-        
-        # Prepare search history document
-        history_doc = {
-            'user_id': ObjectId(user_id),
-            'search_query': search_query,
-            'timestamp': datetime.utcnow(),
-            'results': {
-                'artist_id': artist_result.get('id'),
-                'artist_name': artist_result.get('name'),
-                'artist_url': artist_result.get('url')
-            }
-        }
-        
-        # Insert into database
-        search_history_collection.insert_one(history_doc)
-        logger.info(f"Search history saved for user {user_id}: {search_query}")
-    except Exception as e:
-        logger.error(f"Error saving search history: {e}")
-        # Don't fail the search if history save fails
+    # Don't fail the search if history save fails
+    if search_history_service.record(user_id, search_query, artist_result):
+        logger.debug(f"Search history queued for user {user_id}: {search_query}")
 
 @app.route("/", methods=["GET", "POST"])
 @limiter.limit("30 per minute")
@@ -189,6 +206,7 @@ def home():
                             session['artist'] = artist
                             success_message = f"Found artist: {artist['name']}"
                             session['success'] = success_message
+                            trending_service.record(artist)
                             
                             # Save search history if user is logged in
                             if session.get('user_id'):
@@ -207,7 +225,7 @@ def home():
             else:
                 error_message = "Please enter an artist name"
                 session['error'] = error_message
-                
+        
         elif action == "youtube":
             channel_name = request.form.get("channel_name", "").strip()
             if channel_name:
@@ -227,7 +245,7 @@ def home():
             else:
                 error_message = "Please enter a channel name"
                 session['error'] = error_message
-                
+        
         return redirect(url_for('home'))
     
     # Get messages from session and clear them
@@ -293,8 +311,28 @@ def internal_error(e):
 @app.errorhandler(429)
 def ratelimit_handler(e):
     """Handle rate limit errors."""
+    if request.path.startswith('/api/'):
+        limit = getattr(e, 'limit', None)
+        message = limit.error_message if limit is not None and limit.error_message else "Rate limit exceeded. Please try again later."
+        return jsonify({"success": False, "message": message}), 429
     return render_template("spotify.html", error_message="Rate limit exceeded. Please try again later."), 429
 
+@app.errorhandler(HashingOverloadedError)
+def hashing_overloaded_handler(e):
+    """Shed password hashing load with 503 and a Retry-After hint."""
+    response = jsonify({
+        "success": False,
+        "message": "Server is busy. Please try again shortly."
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 if __name__ == "__main__":
+    # Outside gunicorn there is no post_fork hook, so warm the pool here
+    db_service.warm_pool()
+    hashing_service.get_cost()
+    health_service.start()
+    trending_service.start()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=app.config["DEBUG"])
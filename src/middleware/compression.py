@@ -0,0 +1,131 @@
+"""
+Response compression with a per content type policy.
+
+Wraps Flask-Compress so each mimetype gets its own minimum size and
+compression levels: small JSON responses are sent as is, rendered pages
+use a fast Brotli level and CSS/JS a high one. Compressed outputs are kept
+in a small per-process LRU keyed on a hash of the body, so identical
+payloads (a page rendered with no user data, a repeated API result) are
+compressed once. CPU time per compression is recorded in the metrics
+registry to tune levels against bandwidth.
+"""
+import gzip
+import hashlib
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+import brotli
+from flask_compress import Compress
+
+from src.utils.metrics import metrics
+
+# Mimetype -> minimum body size in bytes and level per Content-Encoding.
+# Encodings without a level use Flask-Compress's COMPRESS_* settings.
+# COMPRESS_MIN_SIZE still applies to every type as a floor.
+DEFAULT_COMPRESSION_POLICY = {
+    'text/html': {'min_size': 1024, 'br': 5, 'gzip': 6},
+    'application/json': {'min_size': 1024, 'br': 4, 'gzip': 5},
+    'text/css': {'min_size': 500, 'br': 9, 'gzip': 9},
+    'text/javascript': {'min_size': 500, 'br': 9, 'gzip': 9},
+    'application/javascript': {'min_size': 500, 'br': 9, 'gzip': 9}
+}
+
+
+class PolicyCompress(Compress):
+    """
+    Flask-Compress with per mimetype policies, an output cache and CPU metrics.
+    """
+    
+    def __init__(self, app=None):
+        self.policy = dict(DEFAULT_COMPRESSION_POLICY)
+        self.cache_size = 128
+        self.cache_max_body = 256 * 1024
+        self._outputs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        super().__init__(app)
+    
+    def init_app(self, app):
+        """Initialize compression with Flask app."""
+        policy = dict(DEFAULT_COMPRESSION_POLICY)
+        for mimetype, settings in app.config.get('COMPRESSION_POLICY', {}).items():
+            policy[mimetype] = {**policy.get(mimetype, {}), **settings}
+        self.policy = policy
+        self.cache_size = app.config.get('COMPRESSION_CACHE_SIZE', 128)
+        self.cache_max_body = app.config.get('COMPRESSION_CACHE_MAX_BODY', 256 * 1024)
+        self.clear_cache()
+        super().init_app(app)
+    
+    def after_request(self, response):
+        """Skip bodies below the policy minimum, then compress as Flask-Compress does."""
+        min_size = self.policy.get(response.mimetype, {}).get('min_size')
+        if min_size and response.content_length is not None and response.content_length < min_size:
+            response.vary.add('Accept-Encoding')
+            return response
+        return super().after_request(response)
+    
+    def compress(self, app, response, algorithm):
+        """
+        Compress the response body, reusing the output for a body seen recently.
+        
+        Args:
+            app: Flask app (for the COMPRESS_* settings)
+            response: Response to compress
+            algorithm: Chosen Content-Encoding
+        
+        Returns:
+            Compressed body
+        """
+        body = response.get_data()
+        level = self.policy.get(response.mimetype, {}).get(algorithm)
+        
+        key = None
+        if self.cache_size and len(body) <= self.cache_max_body:
+            key = (algorithm, level, hashlib.blake2b(body, digest_size=16).digest())
+            with self._lock:
+                data = self._outputs.get(key)
+                if data is not None:
+                    self._outputs.move_to_end(key)
+            if data is not None:
+                metrics.increment('compression.cache.hits')
+                return data
+            metrics.increment('compression.cache.misses')
+        
+        # Thread CPU time, so other threads of the worker are not counted
+        start = time.thread_time()
+        data = self._compress_body(app, body, response, algorithm, level)
+        metrics.observe(f'compression.{algorithm}.cpu_ms', (time.thread_time() - start) * 1000.0)
+        metrics.increment(f'compression.{algorithm}.bytes_in', len(body))
+        metrics.increment(f'compression.{algorithm}.bytes_out', len(data))
+        
+        if key is not None:
+            with self._lock:
+                self._outputs[key] = data
+                while len(self._outputs) > self.cache_size:
+                    self._outputs.popitem(last=False)
+        return data
+    
+    def _compress_body(self, app, body: bytes, response, algorithm: str, level: Optional[int]) -> bytes:
+        """Compress ``body`` at the policy ``level``, or with the Flask-Compress settings."""
+        if level is None:
+            return super().compress(app, response, algorithm)
+        if algorithm == 'br':
+            return brotli.compress(
+                body,
+                mode=app.config['COMPRESS_BR_MODE'],
+                quality=level,
+                lgwin=app.config['COMPRESS_BR_WINDOW'],
+                lgblock=app.config['COMPRESS_BR_BLOCK']
+            )
+        if algorithm == 'gzip':
+            return gzip.compress(body, compresslevel=level, mtime=0)
+        if algorithm == 'deflate':
+            return zlib.compress(body, level)
+        return super().compress(app, response, algorithm)
+    
+    def clear_cache(self):
+        """Drop every cached compressed output in this process."""
+        with self._lock:
+            self._outputs.clear()
@@ -5,7 +5,11 @@ Implements security headers and best practices for production deployment.
 import logging
 import re
 from functools import wraps
+from urllib.parse import unquote
 from flask import request, make_response, session, redirect, url_for, jsonify
+from werkzeug.datastructures import Headers
+
+from src.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +27,16 @@ DANGEROUS_PATTERNS = [
     re.compile(r'<embed', re.IGNORECASE)
 ]
 
+# DANGEROUS_PATTERNS as one alternation, so each string is scanned once
+DANGEROUS_PATTERN = re.compile(
+    '|'.join(f'(?:{pattern.pattern})' for pattern in DANGEROUS_PATTERNS),
+    re.IGNORECASE
+)
+
+# Every dangerous pattern contains one of these characters; strings
+# without any of them skip the regex entirely
+DANGEROUS_TRIGGER_CHARS = ('<', ':', '=')
+
 # Pre-compile URL validation patterns for better performance
 SUSPICIOUS_URL_PATTERNS = [
     re.compile(r'\.\.[/\\]'),   # Path traversal (forward or backslash)
@@ -32,6 +46,99 @@ SUSPICIOUS_URL_PATTERNS = [
     re.compile(r'<object')      # Object injection
 ]
 
+# SUSPICIOUS_URL_PATTERNS as one scanner, run over the lowercased URL.
+# Lowercasing first is faster than re.IGNORECASE, which disables the
+# literal prefix search.
+SUSPICIOUS_URL_PATTERN = re.compile(
+    '|'.join(f'(?:{pattern.pattern})' for pattern in SUSPICIOUS_URL_PATTERNS)
+)
+
+
+# Content Security Policy - Restricts resource loading
+# This policy allows resources from self, inline styles/scripts needed by the app
+# and specific CDNs used by the application
+CSP_DIRECTIVES = {
+    "default-src": ["'self'"],
+    "script-src": [
+        "'self'",
+        "'unsafe-inline'",  # Required for inline scripts in templates
+        "https://cdn.jsdelivr.net",
+        "https://cdnjs.cloudflare.com"
+    ],
+    "style-src": [
+        "'self'",
+        "'unsafe-inline'",  # Required for inline styles
+        "https://fonts.googleapis.com"
+    ],
+    "img-src": [
+        "'self'",
+        "data:",
+        "https:",  # Allow images from Spotify, YouTube APIs
+        "http:"  # Allow HTTP images in development
+    ],
+    "font-src": [
+        "'self'",
+        "https://fonts.gstatic.com",
+        "data:"
+    ],
+    "connect-src": [
+        "'self'",
+        "https://api.spotify.com",
+        "https://www.googleapis.com"
+    ],
+    "frame-ancestors": ["'none'"],  # Prevent clickjacking
+    "base-uri": ["'self'"],
+    "form-action": ["'self'"]
+}
+
+# Permissions Policy - Control browser features
+PERMISSIONS_POLICY = [
+    "geolocation=()",
+    "microphone=()",
+    "camera=()",
+    "payment=()",
+    "usb=()",
+    "magnetometer=()",
+    "gyroscope=()",
+    "accelerometer=()"
+]
+
+DEFAULT_SECURITY_HEADERS = {
+    'Content-Security-Policy': "; ".join(
+        f"{directive} {' '.join(sources)}" for directive, sources in CSP_DIRECTIVES.items()
+    ),
+    # Strict Transport Security - Force HTTPS
+    # max-age=31536000 (1 year), includeSubDomains, preload
+    'Strict-Transport-Security': 'max-age=31536000; includeSubDomains; preload',
+    # X-Frame-Options - Prevent clickjacking
+    'X-Frame-Options': 'DENY',
+    # X-Content-Type-Options - Prevent MIME type sniffing
+    'X-Content-Type-Options': 'nosniff',
+    # X-XSS-Protection - Enable XSS filter (legacy browsers)
+    'X-XSS-Protection': '1; mode=block',
+    # Referrer Policy - Control referrer information
+    'Referrer-Policy': 'strict-origin-when-cross-origin',
+    'Permissions-Policy': ", ".join(PERMISSIONS_POLICY)
+}
+
+# Extra headers by path prefix (whole path segments). A group is skipped
+# when the view already set any header in it.
+PREFIX_HEADERS = {
+    # Security-sensitive responses are not cached, unless the view chose
+    # its own private caching policy
+    '/api/auth': {
+        'Cache-Control': 'no-store, no-cache, must-revalidate, private',
+        'Pragma': 'no-cache'
+    }
+}
+
+
+def _compile_headers(headers: dict) -> tuple:
+    """Header dict as validated (items, lowercased names), dropping headers set to None."""
+    # Building Headers runs werkzeug's value checks once, here
+    items = tuple(Headers([(name, value) for name, value in headers.items() if value is not None]).items())
+    return items, frozenset(name.lower() for name, _ in items)
+
 
 class SecurityHeadersMiddleware:
     """
@@ -45,99 +152,73 @@ class SecurityHeadersMiddleware:
     - X-XSS-Protection
     - Referrer-Policy
     - Permissions-Policy
+    
+    Header values are compiled once in ``init_app``, from the defaults
+    above merged with the ``SECURITY_HEADERS`` and
+    ``SECURITY_PREFIX_HEADERS`` config dicts (a value of None removes a
+    header). Each response then gets a single bulk header update.
     """
     
     def __init__(self, app=None):
         self.app = app
+        self.headers: tuple = ()
+        self.header_names = frozenset()
+        self.prefix_headers = {}
+        self.prefix_depth = 0
         if app is not None:
             self.init_app(app)
     
     def init_app(self, app):
         """Initialize security headers middleware with Flask app."""
+        self.headers, self.header_names = _compile_headers(
+            {**DEFAULT_SECURITY_HEADERS, **(app.config.get('SECURITY_HEADERS') or {})}
+        )
+        prefixes = {**PREFIX_HEADERS, **(app.config.get('SECURITY_PREFIX_HEADERS') or {})}
+        self.prefix_headers = {}
+        for prefix, headers in prefixes.items():
+            # Stored merged with the defaults so a match is still one update
+            items, names = _compile_headers(headers)
+            self.prefix_headers[prefix.rstrip('/')] = (self.headers + items, names)
+        self.prefix_depth = max((prefix.count('/') for prefix in self.prefix_headers), default=0)
         app.after_request(self.add_security_headers)
         logger.info("Security headers middleware initialized")
     
-    @staticmethod
-    def add_security_headers(response):
+    def add_security_headers(self, response):
         """Add security headers to response."""
-        # Content Security Policy - Restricts resource loading
-        # This policy allows resources from self, inline styles/scripts needed by the app
-        # and specific CDNs used by the application
-        csp_directives = {
-            "default-src": ["'self'"],
-            "script-src": [
-                "'self'",
-                "'unsafe-inline'",  # Required for inline scripts in templates
-                "https://cdn.jsdelivr.net",
-                "https://cdnjs.cloudflare.com"
-            ],
-            "style-src": [
-                "'self'",
-                "'unsafe-inline'",  # Required for inline styles
-                "https://fonts.googleapis.com"
-            ],
-            "img-src": [
-                "'self'",
-                "data:",
-                "https:",  # Allow images from Spotify, YouTube APIs
-                "http:"  # Allow HTTP images in development
-            ],
-            "font-src": [
-                "'self'",
-                "https://fonts.gstatic.com",
-                "data:"
-            ],
-            "connect-src": [
-                "'self'",
-                "https://api.spotify.com",
-                "https://www.googleapis.com"
-            ],
-            "frame-ancestors": ["'none'"],  # Prevent clickjacking
-            "base-uri": ["'self'"],
-            "form-action": ["'self'"]
-        }
-        
-        csp_string = "; ".join([
-            f"{directive} {' '.join(sources)}"
-            for directive, sources in csp_directives.items()
-        ])
-        response.headers['Content-Security-Policy'] = csp_string
-        
-        # Strict Transport Security - Force HTTPS
-        # max-age=31536000 (1 year), includeSubDomains, preload
-        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains; preload'
-        
-        # X-Frame-Options - Prevent clickjacking
-        response.headers['X-Frame-Options'] = 'DENY'
+        headers = response.headers
+        present = {name.lower() for name in headers.keys()}
+        items = self.headers
+        override = self.match_prefix(request.path)
+        if override is not None and present.isdisjoint(override[1]):
+            items = override[0]
         
-        # X-Content-Type-Options - Prevent MIME type sniffing
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        
-        # X-XSS-Protection - Enable XSS filter (legacy browsers)
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-        
-        # Referrer Policy - Control referrer information
-        response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-        
-        # Permissions Policy - Control browser features
-        permissions = [
-            "geolocation=()",
-            "microphone=()",
-            "camera=()",
-            "payment=()",
-            "usb=()",
-            "magnetometer=()",
-            "gyroscope=()",
-            "accelerometer=()"
-        ]
-        response.headers['Permissions-Policy'] = ", ".join(permissions)
+        if present.isdisjoint(self.header_names):
+            # Nothing to replace, so append without Headers.set's per-name scans
+            headers.extend(items)
+        else:
+            # The view set one of these headers itself; ours take precedence
+            for name, value in items:
+                headers[name] = value
+        return response
+    
+    def match_prefix(self, path: str):
+        """
+        Prefix headers for the longest configured prefix of ``path``.
         
-        # Cache-Control for security-sensitive responses
-        if request.path.startswith('/api/auth'):
-            response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, private'
-            response.headers['Pragma'] = 'no-cache'
+        Args:
+            path: Request path
         
-        return response
+        Returns:
+            Tuple of (default plus prefix header items, lowercased prefix header names), or None
+        """
+        if not self.prefix_headers:
+            return None
+        segments = path.split('/', self.prefix_depth + 1)
+        for depth in range(min(len(segments) - 1, self.prefix_depth), 0, -1):
+            override = self.prefix_headers.get('/'.join(segments[:depth + 1]))
+            if override is not None:
+                return override
+        return None
 
 
 def rate_limit_error_handler(e):
@@ -155,26 +236,53 @@ def rate_limit_error_handler(e):
 def sanitize_input(data):
     """
     Sanitize user input to prevent XSS and injection attacks.
-    Uses pre-compiled regex patterns for better performance.
+    
+    Strings are scanned once with the combined ``DANGEROUS_PATTERN``,
+    repeated until nothing matches (so a removal cannot splice together a
+    new match). Values that need no change are returned as the same
+    object, and dicts and lists are only copied when something inside
+    them changed.
     
     Args:
-        data: String or dict to sanitize
-        
+        data: String, dict or list to sanitize
+    
     Returns:
         Sanitized data
     """
     if isinstance(data, str):
-        sanitized = data
-        for pattern in DANGEROUS_PATTERNS:
-            sanitized = pattern.sub('', sanitized)
-        return sanitized.strip()
+        return _sanitize_string(data)
     elif isinstance(data, dict):
-        return {k: sanitize_input(v) for k, v in data.items()}
+        sanitized = None
+        for key, value in data.items():
+            clean = sanitize_input(value)
+            if clean is not value:
+                if sanitized is None:
+                    sanitized = dict(data)
+                sanitized[key] = clean
+        return data if sanitized is None else sanitized
     elif isinstance(data, list):
-        return [sanitize_input(item) for item in data]
+        sanitized = None
+        for index, item in enumerate(data):
+            clean = sanitize_input(item)
+            if clean is not item:
+                if sanitized is None:
+                    sanitized = list(data)
+                sanitized[index] = clean
+        return data if sanitized is None else sanitized
     return data
 
 
+def _sanitize_string(value: str) -> str:
+    """Remove dangerous patterns from one string and strip it."""
+    if any(char in value for char in DANGEROUS_TRIGGER_CHARS) and DANGEROUS_PATTERN.search(value):
+        while True:
+            value, count = DANGEROUS_PATTERN.subn('', value)
+            if not count:
+                break
+    # str.strip returns the same object when there is nothing to strip
+    return value.strip()
+
+
 def require_auth(f):
     """
     Decorator to require authentication for routes.
@@ -223,42 +331,80 @@ def validate_content_type(required_type='application/json'):
 
 
 class RequestValidationMiddleware:
-    """Middleware for validating and sanitizing incoming requests."""
+    """
+    Middleware for validating and sanitizing incoming requests.
+    
+    Requests whose path starts with one of the exempt prefixes (static
+    assets by default, see ``REQUEST_VALIDATION_EXEMPT_PREFIXES``) skip
+    validation entirely. Flask's ``MAX_CONTENT_LENGTH`` still applies to
+    them, and the static route rejects path traversal itself.
+    """
     
     def __init__(self, app=None):
         self.app = app
+        self.exempt_prefixes: tuple = ()
         if app is not None:
             self.init_app(app)
     
     def init_app(self, app):
         """Initialize request validation middleware with Flask app."""
+        prefixes = app.config.get('REQUEST_VALIDATION_EXEMPT_PREFIXES')
+        if prefixes is None:
+            prefixes = [f"{app.static_url_path}/"] if app.static_url_path else []
+        self.exempt_prefixes = tuple(prefixes)
         app.before_request(self.validate_request)
         logger.info("Request validation middleware initialized")
     
-    @staticmethod
-    def validate_request():
+    def is_exempt(self, path: str) -> bool:
+        """True if requests for ``path`` skip validation."""
+        return bool(self.exempt_prefixes) and path.startswith(self.exempt_prefixes)
+    
+    def validate_request(self):
         """Validate incoming requests for security issues."""
+        # Resolve the request proxy once; each attribute access through it costs
+        # about as much as the whole URL scan
+        req = request._get_current_object()
+        path = req.path
+        if self.is_exempt(path):
+            return None
+        metrics.increment('security.request_validation.inspected')
+        
         # Validate request size
         max_content_length = 10 * 1024 * 1024  # 10MB
-        if request.content_length and request.content_length > max_content_length:
-            logger.warning(f"Request too large: {request.content_length} bytes from {request.remote_addr}")
+        content_length = req.content_length
+        if content_length and content_length > max_content_length:
+            logger.warning(f"Request too large: {content_length} bytes from {req.remote_addr}")
+            metrics.increment('security.request_validation.rejected')
             return jsonify({
                 "success": False,
                 "error": "Request entity too large"
             }), 413
         
-        # Check for suspicious patterns in URL (using pre-compiled patterns)
-        # Only check the lowercase URL, don't log full URL (may contain sensitive data)
-        url_lower = request.url.lower()
-        
-        for pattern in SUSPICIOUS_URL_PATTERNS:
-            if pattern.search(url_lower):
-                # Log only the path, not the full URL (to avoid logging query params with tokens)
-                path = request.path if request.path else "unknown"
-                logger.warning(f"Suspicious URL pattern detected from {request.remote_addr} - path: {path}")
-                return jsonify({
-                    "success": False,
-                    "error": "Invalid request"
-                }), 400
+        # Check for suspicious patterns in the decoded path and query string
+        # (don't log them, the query may contain sensitive data)
+        if self.is_suspicious_url(path, req.query_string):
+            # Log only the path, not the full URL (to avoid logging query params with tokens)
+            logger.warning(f"Suspicious URL pattern detected from {req.remote_addr} - path: {path or 'unknown'}")
+            metrics.increment('security.request_validation.rejected')
+            return jsonify({
+                "success": False,
+                "error": "Invalid request"
+            }), 400
         
         return None
+    
+    @staticmethod
+    def is_suspicious_url(path: str, query_string: bytes = b'') -> bool:
+        """
+        Scan a request path and raw query string with ``SUSPICIOUS_URL_PATTERN``.
+        
+        Args:
+            path: Decoded request path
+            query_string: Raw (percent-encoded) query string
+        
+        Returns:
+            True if any suspicious pattern is present
+        """
+        if query_string:
+            path = f"{path}?{unquote(query_string.decode('latin-1'))}"
+        return SUSPICIOUS_URL_PATTERN.search(path.lower()) is not None
@@ -0,0 +1,237 @@
+"""
+Fingerprinted, precompressed static asset bundles.
+
+``flask build-assets`` concatenates and minifies the files of each bundle
+in ``ASSET_BUNDLES``, names the result after a hash of its content and
+writes ``.br`` and ``.gz`` variants next to it in ``static/dist``, together
+with a ``manifest.json`` mapping bundle names to file names. Templates call
+``asset_urls(name)``, which returns the hashed URL when a manifest is
+loaded and the source file URLs otherwise, so development works without a
+build. Bundles are served with a one year ``immutable`` cache lifetime and
+the precompressed variant the client accepts, so Flask-Compress never
+touches them.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+from typing import Dict, List, Optional
+
+import brotli
+import rcssmin
+import rjsmin
+from flask import abort, request, send_from_directory, url_for
+
+logger = logging.getLogger(__name__)
+
+# Bundle name -> source files (relative to the static folder), in load order
+ASSET_BUNDLES = {
+    'main.css': [
+        'css/design-tokens.css',
+        'css/base.css',
+        'css/main.css',
+        'css/spotify.css',
+        'css/youtube.css'
+    ],
+    'youtube.css': [
+        'css/design-tokens.css',
+        'css/base.css',
+        'css/spotify.css',
+        'css/youtube.css'
+    ],
+    'auth.css': ['css/auth.css'],
+    'main.js': ['js/session.js'],
+    'auth.js': ['js/auth.js'],
+    'profile.js': ['js/auth.js', 'js/profile.js']
+}
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Content-Encoding -> file suffix, in order of preference
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def minify(name: str, source: str) -> str:
+    """Minify CSS or JavaScript source according to the bundle extension."""
+    if name.endswith('.css'):
+        return rcssmin.cssmin(source)
+    if name.endswith('.js'):
+        return rjsmin.jsmin(source)
+    return source
+
+
+def build_bundle(static_folder: str, name: str, sources: List[str]) -> bytes:
+    """
+    Concatenate and minify the sources of one bundle.
+    
+    Args:
+        static_folder: Absolute path of the static folder
+        name: Bundle name (its extension selects the minifier)
+        sources: Source files relative to the static folder
+    
+    Returns:
+        UTF-8 encoded bundle content
+    """
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            parts.append(minify(name, f.read()))
+    # Scripts are joined with a semicolon so a file without a trailing one
+    # cannot run into the next
+    separator = ';\n' if name.endswith('.js') else '\n'
+    return separator.join(parts).encode('utf-8')
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    """``main.css`` -> ``main.<hash>.css``, the hash taken over ``content``."""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def build_assets(static_folder: str, bundles: Optional[Dict[str, List[str]]] = None) -> Dict[str, dict]:
+    """
+    Build every bundle into ``<static_folder>/dist`` and write the manifest.
+    
+    Files from previous builds that are not part of the new manifest are
+    removed.
+    
+    Args:
+        static_folder: Absolute path of the static folder
+        bundles: Bundle definitions (defaults to ASSET_BUNDLES)
+    
+    Returns:
+        Per bundle: hashed "file" name and byte "sizes" per encoding
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    
+    manifest = {}
+    report = {}
+    keep = {MANIFEST_NAME}
+    for name, sources in (bundles or ASSET_BUNDLES).items():
+        content = build_bundle(static_folder, name, sources)
+        filename = fingerprint(name, content)
+        variants = {
+            '': content,
+            '.gz': gzip.compress(content, compresslevel=9, mtime=0),
+            '.br': brotli.compress(content, mode=brotli.MODE_TEXT, quality=11)
+        }
+        sizes = {}
+        for suffix, data in variants.items():
+            # Skip a compressed variant that would not be smaller
+            if suffix and len(data) >= len(content):
+                continue
+            with open(os.path.join(dist, filename + suffix), 'wb') as f:
+                f.write(data)
+            keep.add(filename + suffix)
+            sizes[suffix.lstrip('.') or 'identity'] = len(data)
+        manifest[name] = filename
+        report[name] = {'file': filename, 'sizes': sizes}
+    
+    with open(os.path.join(dist, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    
+    for stale in set(os.listdir(dist)) - keep:
+        os.remove(os.path.join(dist, stale))
+    return report
+
+
+class AssetService:
+    """
+    Service resolving bundle URLs and serving built bundles.
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.dist = None
+        self.manifest: Dict[str, str] = {}
+        # Built file name -> (Content-Encoding, suffix) of its precompressed variants
+        self.variants: Dict[str, tuple] = {}
+    
+    def init_app(self, app):
+        """Initialize the asset service with Flask app."""
+        self.app = app
+        self.dist = os.path.join(app.static_folder, DIST_DIR)
+        self.manifest = {}
+        if app.config.get('ASSET_BUNDLES_ENABLED', True):
+            self.manifest = self.load_manifest()
+        self.variants = {
+            filename: tuple(
+                (encoding, suffix) for encoding, suffix in PRECOMPRESSED
+                if os.path.exists(os.path.join(self.dist, filename + suffix))
+            )
+            for filename in self.manifest.values()
+        }
+        
+        app.add_url_rule(
+            f"{app.static_url_path}/{DIST_DIR}/<path:filename>",
+            endpoint='asset',
+            view_func=self.send_asset
+        )
+        app.add_template_global(self.asset_urls, 'asset_urls')
+        
+        if self.manifest:
+            logger.info(f"Asset bundles loaded: {len(self.manifest)} bundles")
+        else:
+            logger.info("Asset bundles not built or disabled; serving source files")
+    
+    def load_manifest(self) -> Dict[str, str]:
+        """Read the build manifest, or an empty one if assets were not built."""
+        try:
+            with open(os.path.join(self.dist, MANIFEST_NAME), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read asset manifest: {e}")
+            return {}
+    
+    def asset_urls(self, name: str) -> List[str]:
+        """
+        URLs to include for bundle ``name``.
+        
+        Args:
+            name: Bundle name from ASSET_BUNDLES (e.g. "main.css")
+        
+        Returns:
+            The hashed bundle URL if built, otherwise the source file URLs
+        """
+        filename = self.manifest.get(name)
+        if filename:
+            return [url_for('asset', filename=filename)]
+        return [url_for('static', filename=source) for source in ASSET_BUNDLES[name]]
+    
+    def send_asset(self, filename: str):
+        """Serve a built bundle, precompressed if the client accepts it."""
+        variants = self.variants.get(filename)
+        if variants is None:
+            abort(404)
+        
+        encoding, suffix = None, ''
+        for candidate, candidate_suffix in variants:
+            if request.accept_encodings[candidate]:
+                encoding, suffix = candidate, candidate_suffix
+                break
+        
+        mimetype = mimetypes.guess_type(filename)[0]
+        response = send_from_directory(
+            self.dist,
+            filename + suffix,
+            mimetype=mimetype,
+            download_name=filename,
+            max_age=ASSET_MAX_AGE
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+# Global asset service instance
+asset_service = AssetService()
@@ -1,15 +1,19 @@
 """
 Authentication service for user management and authentication operations.
 """
+import hashlib
 import logging
+import re
 from datetime import datetime, timedelta
 from typing import Optional, Tuple
-from itsdangerous import URLSafeTimedSerializer
 from bson import ObjectId
 from flask import current_app
 
 from src.user_models.user_model import User
+from src.utils.signing import signer_registry
 from src.services.database_service import db_service
+from src.services.hashing_service import hashing_service
+from src.services.user_cache_service import user_cache_service
 from src.utils.validators import (
     validate_username,
     validate_email_format,
@@ -19,6 +23,42 @@ from src.utils.validators import (
 
 logger = logging.getLogger(__name__)
 
+# Field projections per use case. Password hashes and tokens are only
+# loaded by the flows that need them.
+ID_PROJECTION = {"_id": 1}
+# Session checks and profile reads (this is the shape kept in the user cache)
+SESSION_PROJECTION = {
+    "username": 1,
+    "email": 1,
+    "email_verified": 1,
+    "created_at": 1,
+    "last_login": 1,
+    "lockout_until": 1
+}
+LOGIN_PROJECTION = {
+    "username": 1,
+    "email": 1,
+    "password_hash": 1,
+    "email_verified": 1,
+    "failed_login_attempts": 1,
+    "lockout_until": 1
+}
+PASSWORD_PROJECTION = {"password_hash": 1}
+RESET_PROJECTION = {"username": 1, "email": 1}
+
+# Token purposes and lifetimes in seconds
+EMAIL_VERIFICATION = 'email-verification'
+PASSWORD_RESET = 'password-reset'
+TOKEN_MAX_AGE = {
+    EMAIL_VERIFICATION: 86400,  # 24 hours
+    PASSWORD_RESET: 3600  # 1 hour
+}
+
+
+def hash_token(token: str) -> str:
+    """SHA-256 of a token; only this is stored, never the token itself."""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
 
 class AuthService:
     """
@@ -26,11 +66,33 @@ class AuthService:
     """
     
     def __init__(self):
-        self.users_collection = None
+        self.app = None
     
     def init_app(self, app):
         """Initialize the auth service with Flask app."""
-        self.users_collection = db_service.get_users_collection()
+        self.app = app
+    
+    @property
+    def users_collection(self):
+        """
+        Users collection for the current process.
+        
+        Resolved on each access so that workers forked after app creation
+        use their own MongoClient instead of one created before the fork.
+        """
+        return db_service.get_users_collection()
+    
+    @property
+    def tokens_collection(self):
+        """Verification and password reset tokens for the current process."""
+        return db_service.get_auth_tokens_collection()
+    
+    @staticmethod
+    def _get_serializer(purpose: str):
+        """Shared serializer for ``purpose`` that also accepts rotated-out secrets."""
+        config = current_app.config
+        secrets = (config['SECRET_KEY'], *config.get('SECRET_KEY_FALLBACKS', ()))
+        return signer_registry.get(secrets, purpose)
     
     def generate_token(self, purpose: str, **kwargs) -> str:
         """
@@ -43,7 +105,7 @@ class AuthService:
         Returns:
             Secure token string
         """
-        serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+        serializer = self._get_serializer(purpose)
         data = {'purpose': purpose, **kwargs}
         return serializer.dumps(data, salt=purpose)
     
@@ -59,7 +121,7 @@ class AuthService:
         Returns:
             Decoded token data or None if invalid
         """
-        serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+        serializer = self._get_serializer(purpose)
         try:
             data = serializer.loads(token, salt=purpose, max_age=max_age)
             if data.get('purpose') == purpose:
@@ -68,6 +130,61 @@ class AuthService:
             logger.warning(f"Token verification failed: {e}")
         return None
     
+    def issue_token(self, purpose: str, user_id: ObjectId, email: str) -> str:
+        """
+        Create a single-use token and store its hash in ``auth_tokens``.
+        
+        A user holds at most one token per purpose: issuing a new one
+        atomically replaces (and so revokes) the previous one.
+        
+        Args:
+            purpose: EMAIL_VERIFICATION or PASSWORD_RESET
+            user_id: Owner of the token
+            email: Email address the token was sent to
+        
+        Returns:
+            Token string for the emailed link
+        """
+        token = self.generate_token(purpose, email=email)
+        now = datetime.utcnow()
+        self.tokens_collection.replace_one(
+            {"user_id": user_id, "purpose": purpose},
+            {
+                "token_hash": hash_token(token),
+                "purpose": purpose,
+                "user_id": user_id,
+                "email": email,
+                "created_at": now,
+                # The TTL index removes the document once this passes
+                "expires_at": now + timedelta(seconds=TOKEN_MAX_AGE[purpose])
+            },
+            upsert=True
+        )
+        return token
+    
+    def consume_token(self, token: str, purpose: str) -> Optional[dict]:
+        """
+        Redeem a single-use token.
+        
+        The signature and age are checked first, so forged or expired links
+        never reach the database; a valid one is then removed with a single
+        atomic ``find_one_and_delete``, so it can only be redeemed once.
+        
+        Args:
+            token: Token from the link
+            purpose: Expected token purpose
+        
+        Returns:
+            Stored token document ({"user_id", "email", ...}) or None if invalid
+        """
+        if not self.verify_token(token, purpose, max_age=TOKEN_MAX_AGE[purpose]):
+            return None
+        return self.tokens_collection.find_one_and_delete({
+            "token_hash": hash_token(token),
+            "purpose": purpose,
+            "expires_at": {"$gt": datetime.utcnow()}
+        })
+    
     def create_user(
         self,
         username: str,
@@ -109,35 +226,46 @@ class AuthService:
             return None, error
         
         # Check if username already exists
-        if self.users_collection.find_one({"username": username}):
+        if self.users_collection.find_one({"username": username}, ID_PROJECTION):
             return None, "Username already exists"
         
         # Check if email already exists
-        if self.users_collection.find_one({"email": email}):
+        if self.users_collection.find_one({"email": email}, ID_PROJECTION):
             return None, "Email already exists"
         
         # Create user
-        password_hash = User.hash_password(password)
-        verification_token = self.generate_token('email-verification', email=email)
+        password_hash = hashing_service.hash_password(password)
         
         user = User(
             username=username,
             email=email,
             password_hash=password_hash,
-            email_verified=True,  # Auto-verify for now (no email service)
-            verification_token=verification_token,
-            verification_token_expires=datetime.utcnow() + timedelta(hours=24)
+            email_verified=True  # Auto-verify for now (no email service)
         )
         
         # Insert into database
         try:
             result = self.users_collection.insert_one(user.to_dict())
-            user._id = result.inserted_id
-            logger.info(f"User created: {username} ({email})")
-            return user, None
         except Exception as e:
             logger.error(f"Error creating user: {e}")
             return None, "Failed to create user account"
+        user._id = result.inserted_id
+        
+        try:
+            # Kept on the object for the verification email, not on the document
+            user.verification_token = self.issue_token(EMAIL_VERIFICATION, user._id, email)
+        except Exception as e:
+            # Without a token the account could never be verified; remove it
+            # so the username and email can be registered again
+            logger.error(f"Error issuing verification token for {username}, removing the account: {e}")
+            try:
+                self.users_collection.delete_one({"_id": user._id})
+            except Exception as cleanup_error:
+                logger.error(f"Failed to remove user {user._id} after token error: {cleanup_error}")
+            return None, "Failed to create user account"
+        
+        logger.info(f"User created: {username} ({email})")
+        return user, None
     
     def authenticate_user(
         self,
@@ -147,25 +275,41 @@ class AuthService:
         """
         Authenticate a user with email/username and password.
         
+        A projected read and the password check are followed by a single
+        write: an atomic server-side increment on failure, so concurrent
+        attempts are all counted, or the counter reset on success.
+        
         Args:
             login: Email or username
             password: Plain text password
         
         Returns:
             Tuple of (User object, error_message)
+        
+        Raises:
+            HashingOverloadedError: If no password hashing slot is free
         """
         if self.users_collection is None:
             return None, "Database not available"
         
-        login = sanitize_input(login)
+        # Take the hashing slot before the attempt is recorded, so an
+        # overloaded server never counts an attempt it did not check
+        with hashing_service.reserve():
+            return self._authenticate_user(sanitize_input(login), password)
+    
+    def _authenticate_user(self, login: str, password: str) -> Tuple[Optional[User], Optional[str]]:
+        """Authenticate with a hashing slot already reserved."""
+        now = datetime.utcnow()
         
-        # Find user by email or username (case-insensitive)
-        user_data = self.users_collection.find_one({
-            "$or": [
-                {"email": {"$regex": f"^{login}$", "$options": "i"}},
-                {"username": {"$regex": f"^{login}$", "$options": "i"}}
-            ]
-        })
+        user_data = self.users_collection.find_one(
+            {
+                "$or": [
+                    {"email": {"$regex": f"^{re.escape(login)}$", "$options": "i"}},
+                    {"username": {"$regex": f"^{re.escape(login)}$", "$options": "i"}}
+                ]
+            },
+            LOGIN_PROJECTION
+        )
         
         if not user_data:
             return None, "Invalid credentials"
@@ -177,38 +321,51 @@ class AuthService:
             return None, "Account is temporarily locked. Please try again later."
         
         # Verify password
-        if not User.verify_password(password, user.password_hash):
-            # Increment failed attempts
-            user.increment_failed_attempts()
+        if not hashing_service.verify_password(password, user.password_hash):
+            # Count the failure server side so concurrent attempts cannot
+            # overwrite each other; attempts made once locked are not counted
+            locked = {"$gt": ["$lockout_until", now]}
+            attempts = {"$add": [{"$ifNull": ["$failed_login_attempts", 0]}, 1]}
             self.users_collection.update_one(
                 {"_id": user._id},
-                {
+                [{
                     "$set": {
-                        "failed_login_attempts": user.failed_login_attempts,
-                        "lockout_until": user.lockout_until
+                        "failed_login_attempts": {"$cond": [locked, "$failed_login_attempts", attempts]},
+                        "lockout_until": {"$cond": [
+                            {"$and": [{"$not": [locked]}, {"$gte": [attempts, User.MAX_FAILED_ATTEMPTS]}]},
+                            now + timedelta(minutes=User.LOCKOUT_MINUTES),
+                            "$lockout_until"
+                        ]}
                     }
-                }
+                }]
             )
+            user_cache_service.invalidate(user._id)
             return None, "Invalid credentials"
         
+        # A correct password costs one write: the counter reset and, when the
+        # stored cost is outdated, the upgraded hash go out together. An
+        # unverified account keeps its earlier failures, as before.
+        query = {"_id": user._id}
+        update = {}
+        if user.email_verified:
+            user.last_login = now
+            update = {"failed_login_attempts": 0, "lockout_until": None, "last_login": now}
+        if hashing_service.needs_rehash(user.password_hash):
+            # Only if the password has not changed meanwhile
+            new_hash = hashing_service.hash_password(password)
+            query["password_hash"] = user.password_hash
+            update["password_hash"] = new_hash
+            user.password_hash = new_hash
+        if update:
+            self.users_collection.update_one(query, {"$set": update})
+        
+        user_cache_service.invalidate(user._id)
+        
         # Check if email is verified
         if not user.email_verified:
             return None, "Please verify your email address before logging in."
         
-        # Reset failed attempts on successful login
         user.reset_failed_attempts()
-        user.last_login = datetime.utcnow()
-        
-        self.users_collection.update_one(
-            {"_id": user._id},
-            {
-                "$set": {
-                    "failed_login_attempts": 0,
-                    "lockout_until": None,
-                    "last_login": user.last_login
-                }
-            }
-        )
         
         logger.info(f"User authenticated: {user.username}")
         return user, None
@@ -226,34 +383,26 @@ class AuthService:
         if self.users_collection is None:
             return False, "Database not available"
         
-        # Verify token (24 hours expiry)
-        data = self.verify_token(token, 'email-verification', max_age=86400)
-        if not data:
+        token_data = self.consume_token(token, EMAIL_VERIFICATION)
+        if not token_data:
             return False, "Invalid or expired verification link"
         
-        email = data.get('email')
-        if not email:
-            return False, "Invalid verification link"
+        email = token_data["email"]
         
-        # Update user
+        # Only the address the link was sent to is verified
         result = self.users_collection.update_one(
-            {"email": email, "email_verified": False},
-            {
-                "$set": {
-                    "email_verified": True,
-                    "verification_token": None,
-                    "verification_token_expires": None
-                }
-            }
+            {"_id": token_data["user_id"], "email": email, "email_verified": False},
+            {"$set": {"email_verified": True}}
         )
         
         if result.modified_count > 0:
+            user_cache_service.invalidate(token_data["user_id"])
             logger.info(f"Email verified: {email}")
             return True, None
         
         return False, "Email already verified or user not found"
     
-    def request_password_reset(self, email: str) -> Tuple[Optional[str], Optional[str]]:
+    def request_password_reset(self, email: str) -> Tuple[Optional[dict], Optional[str]]:
         """
         Request a password reset token.
         
@@ -261,7 +410,8 @@ class AuthService:
             email: User email address
         
         Returns:
-            Tuple of (reset_token, error_message)
+            Tuple of ({"token", "email", "username"}, error_message); the
+            dictionary is None when no account uses the address
         """
         if self.users_collection is None:
             return None, "Database not available"
@@ -269,28 +419,19 @@ class AuthService:
         email = sanitize_input(email.lower())
         
         # Find user
-        user_data = self.users_collection.find_one({"email": email})
+        user_data = self.users_collection.find_one({"email": email}, RESET_PROJECTION)
         if not user_data:
-            # Don't reveal if email exists - security best practice
-            return "token_generated", None
+            # Callers must not reveal whether the email exists
+            return None, None
         
-        # Generate reset token
-        reset_token = self.generate_token('password-reset', email=email)
-        reset_token_expires = datetime.utcnow() + timedelta(hours=1)
-        
-        # Update user with reset token
-        self.users_collection.update_one(
-            {"email": email},
-            {
-                "$set": {
-                    "reset_token": reset_token,
-                    "reset_token_expires": reset_token_expires
-                }
-            }
-        )
+        reset_token = self.issue_token(PASSWORD_RESET, user_data["_id"], email)
         
         logger.info(f"Password reset requested: {email}")
-        return reset_token, None
+        return {
+            "token": reset_token,
+            "email": user_data["email"],
+            "username": user_data["username"]
+        }, None
     
     def reset_password(self, token: str, new_password: str) -> Tuple[bool, Optional[str]]:
         """
@@ -306,46 +447,46 @@ class AuthService:
         if self.users_collection is None:
             return False, "Database not available"
         
-        # Verify token (1 hour expiry)
-        data = self.verify_token(token, 'password-reset', max_age=3600)
-        if not data:
+        # Cheap signature check before any validation or hashing
+        if not self.verify_token(token, PASSWORD_RESET, max_age=TOKEN_MAX_AGE[PASSWORD_RESET]):
             return False, "Invalid or expired reset link"
         
-        email = data.get('email')
-        if not email:
-            return False, "Invalid reset link"
-        
         # Validate new password
         valid, error = validate_password(new_password)
         if not valid:
             return False, error
         
-        # Hash new password
-        password_hash = User.hash_password(new_password)
+        # Hash before redeeming, so an overloaded server does not burn the link
+        password_hash = hashing_service.hash_password(new_password)
+        
+        token_data = self.consume_token(token, PASSWORD_RESET)
+        if not token_data:
+            return False, "Invalid or expired reset link"
         
-        # Update user password and clear reset token
         result = self.users_collection.update_one(
-            {"email": email},
+            {"_id": token_data["user_id"]},
             {
                 "$set": {
                     "password_hash": password_hash,
-                    "reset_token": None,
-                    "reset_token_expires": None,
                     "failed_login_attempts": 0,
                     "lockout_until": None
                 }
             }
         )
         
-        if result.modified_count > 0:
-            logger.info(f"Password reset: {email}")
+        if result.matched_count > 0:
+            user_cache_service.invalidate(token_data["user_id"])
+            logger.info(f"Password reset: {token_data['email']}")
             return True, None
         
         return False, "User not found or password already reset"
     
     def get_user_by_id(self, user_id: str) -> Optional[User]:
         """
-        Get user by ID.
+        Get user by ID, served from the user cache when possible.
+        
+        Only the session and profile fields are loaded (see
+        ``SESSION_PROJECTION``); password hashes and tokens are not.
         
         Args:
             user_id: User ID string
@@ -356,8 +497,12 @@ class AuthService:
         if self.users_collection is None:
             return None
         
+        return user_cache_service.get(user_id, self._load_user_by_id)
+    
+    def _load_user_by_id(self, user_id: str) -> Optional[User]:
+        """Load a user by ID from the database."""
         try:
-            user_data = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            user_data = self.users_collection.find_one({"_id": ObjectId(user_id)}, SESSION_PROJECTION)
             if user_data:
                 return User.from_dict(user_data)
         except Exception as e:
@@ -390,7 +535,7 @@ class AuthService:
         existing = self.users_collection.find_one({
             "username": new_username,
             "_id": {"$ne": ObjectId(user_id)}
-        })
+        }, ID_PROJECTION)
         if existing:
             return False, "Username already exists"
         
@@ -401,6 +546,7 @@ class AuthService:
         )
         
         if result.modified_count > 0:
+            user_cache_service.invalidate(user_id)
             logger.info(f"Username updated for user: {user_id}")
             return True, None
         
@@ -434,27 +580,20 @@ class AuthService:
         existing = self.users_collection.find_one({
             "email": new_email,
             "_id": {"$ne": ObjectId(user_id)}
-        })
+        }, ID_PROJECTION)
         if existing:
             return None, "Email already exists"
         
-        # Generate verification token
-        verification_token = self.generate_token('email-verification', email=new_email)
-        
         # Update email (set as unverified)
         result = self.users_collection.update_one(
             {"_id": ObjectId(user_id)},
-            {
-                "$set": {
-                    "email": new_email,
-                    "email_verified": False,
-                    "verification_token": verification_token,
-                    "verification_token_expires": datetime.utcnow() + timedelta(hours=24)
-                }
-            }
+            {"$set": {"email": new_email, "email_verified": False}}
         )
         
         if result.modified_count > 0:
+            user_cache_service.invalidate(user_id)
+            # Replaces any verification link sent to the previous address
+            verification_token = self.issue_token(EMAIL_VERIFICATION, ObjectId(user_id), new_email)
             logger.info(f"Email updated for user: {user_id}")
             return verification_token, None
         
@@ -481,14 +620,12 @@ class AuthService:
             return False, "Database not available"
         
         # Get user
-        user_data = self.users_collection.find_one({"_id": ObjectId(user_id)})
+        user_data = self.users_collection.find_one({"_id": ObjectId(user_id)}, PASSWORD_PROJECTION)
         if not user_data:
             return False, "User not found"
         
-        user = User.from_dict(user_data)
-        
         # Verify current password
-        if not User.verify_password(current_password, user.password_hash):
+        if not hashing_service.verify_password(current_password, user_data.get("password_hash")):
             return False, "Current password is incorrect"
         
         # Validate new password
@@ -497,7 +634,7 @@ class AuthService:
             return False, error
         
         # Hash new password
-        password_hash = User.hash_password(new_password)
+        password_hash = hashing_service.hash_password(new_password)
         
         # Update password
         result = self.users_collection.update_one(
@@ -506,6 +643,7 @@ class AuthService:
         )
         
         if result.modified_count > 0:
+            user_cache_service.invalidate(user_id)
             logger.info(f"Password changed for user: {user_id}")
             return True, None
         
@@ -2,26 +2,94 @@
 Database service for MongoDB connection and operations.
 """
 import logging
-from typing import Optional
-from pymongo import MongoClient, ASCENDING
-from pymongo.errors import ConnectionFailure, OperationFailure
+import os
+import threading
+import time
+from typing import Optional, Tuple
+from pymongo import MongoClient, monitoring
+from pymongo.errors import ConnectionFailure, OperationFailure, PyMongoError
 from flask import current_app
 
+from src.services import migrations
+from src.utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener that exports checkout wait times and pool
+    activity to the metrics registry.
+    """
+    
+    def pool_created(self, event):
+        metrics.increment('mongodb.pool.created')
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        metrics.increment('mongodb.pool.cleared')
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        metrics.increment('mongodb.pool.connections_created')
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        metrics.increment('mongodb.pool.connections_closed')
+    
+    def connection_check_out_started(self, event):
+        pass
+    
+    def connection_check_out_failed(self, event):
+        metrics.increment('mongodb.pool.checkout_failed')
+        if event.duration is not None:
+            metrics.observe('mongodb.pool.checkout_wait_ms', event.duration * 1000.0)
+    
+    def connection_checked_out(self, event):
+        metrics.increment('mongodb.pool.checkouts')
+        if event.duration is not None:
+            metrics.observe('mongodb.pool.checkout_wait_ms', event.duration * 1000.0)
+    
+    def connection_checked_in(self, event):
+        pass
+
+
 class DatabaseService:
     """
     MongoDB database service for managing connections and collections.
+    
+    PyMongo clients are not fork-safe, so the client is created lazily in
+    the process that first uses it. When gunicorn runs with ``--preload``
+    ``init_app`` only records the settings in the master process; each
+    worker then builds its own client (see ``connect`` and the
+    ``post_fork`` hook in ``gunicorn.conf.py``).
     """
     
     def __init__(self):
-        self.client: Optional[MongoClient] = None
-        self.db = None
+        self._client: Optional[MongoClient] = None
+        self._db = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._mongodb_uri: Optional[str] = None
+        self._db_name = 'octa_music'
+        self._client_options = {}
+        self._history_retention_days = 0
+        self._ping_ok = False
+        self._ping_checked_at = 0.0
+        self._ping_max_age = 60.0
     
     def init_app(self, app):
         """
-        Initialize MongoDB connection with Flask app.
+        Configure MongoDB connection settings from the Flask app.
+        
+        No connection is opened here; the client is created on first use
+        in the current process.
         
         Args:
             app: Flask application instance
@@ -32,73 +100,231 @@ class DatabaseService:
             logger.warning("MongoDB URI not configured. Authentication features will be disabled.")
             return
         
-        try:
-            self.client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=5000)
-            # Test connection
-            self.client.admin.command('ping')
+        self._mongodb_uri = mongodb_uri
+        self._db_name = app.config.get('MONGODB_DB_NAME', 'octa_music')
+        self._history_retention_days = app.config.get('SEARCH_HISTORY_RETENTION_DAYS', 0)
+        # A cached ping result is trusted for two probe intervals
+        self._ping_max_age = 2 * app.config.get('HEALTH_PROBE_INTERVAL', 30)
+        if 0 < self._history_retention_days < 2:
+            # The rollup only processes complete days, so events must outlive one
+            logger.warning("SEARCH_HISTORY_RETENTION_DAYS below 2 would expire events before rollup, using 2")
+            self._history_retention_days = 2
+        self._client_options = {
+            'serverSelectionTimeoutMS': app.config.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000),
+            'maxPoolSize': app.config.get('MONGODB_MAX_POOL_SIZE', 6),
+            'minPoolSize': app.config.get('MONGODB_MIN_POOL_SIZE', 2),
+            'maxIdleTimeMS': app.config.get('MONGODB_MAX_IDLE_TIME_MS', 300000),
+            'waitQueueTimeoutMS': app.config.get('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 2000),
+            'event_listeners': [PoolMetricsListener()]
+        }
+        logger.info(
+            f"MongoDB configured for database {self._db_name} "
+            f"(maxPoolSize={self._client_options['maxPoolSize']}, "
+            f"minPoolSize={self._client_options['minPoolSize']})"
+        )
+    
+    @property
+    def client(self) -> Optional[MongoClient]:
+        """MongoClient owned by the current process (created on demand)."""
+        self.connect()
+        return self._client
+    
+    @property
+    def db(self):
+        """Database handle owned by the current process (created on demand)."""
+        self.connect()
+        return self._db
+    
+    def connect(self) -> bool:
+        """
+        Create the MongoClient for the current process if needed.
+        
+        A client inherited from a parent process (detected by PID) is
+        discarded without being used and replaced by a fresh one.
+        
+        Returns:
+            True if a client is available, False otherwise
+        """
+        if not self._mongodb_uri:
+            return False
+        
+        pid = os.getpid()
+        if self._client is not None and self._pid == pid:
+            return True
+        
+        with self._lock:
+            if self._client is not None and self._pid == pid:
+                return True
             
-            db_name = app.config.get('MONGODB_DB_NAME', 'octa_music')
-            self.db = self.client[db_name]
+            if self._client is not None:
+                # Inherited across fork: never touch the parent's sockets
+                logger.info(f"Discarding MongoDB client inherited from process {self._pid}")
+                self._client = None
+                self._db = None
             
-            # Create indexes for better performance
-            self._create_indexes()
+            try:
+                # MongoClient connects in the background; this does not block
+                client = MongoClient(self._mongodb_uri, **self._client_options)
+            except (ConnectionFailure, OperationFailure, PyMongoError) as e:
+                logger.error(f"Failed to create MongoDB client: {e}")
+                return False
             
-            logger.info(f"Successfully connected to MongoDB database: {db_name}")
-        except (ConnectionFailure, OperationFailure) as e:
-            logger.error(f"Failed to connect to MongoDB: {e}")
-            self.client = None
-            self.db = None
-    
-    def _create_indexes(self):
-        """Create database indexes for optimized queries."""
-        if self.db is None:
+            self._client = client
+            self._db = client[self._db_name]
+            self._pid = pid
+            logger.info(f"MongoDB client created for process {pid}")
+        
+        return True
+    
+    def warm_pool(self, background: bool = True):
+        """
+        Establish the connection pool ahead of the first request.
+        
+        Intended to be called from gunicorn's ``post_fork`` hook. The ping
+        forces server selection and opens the first connection; the driver
+        then fills the pool up to ``minPoolSize`` in the background. By
+        default this runs in a daemon thread so worker boot never waits on
+        MongoDB.
+        
+        Args:
+            background: Warm from a daemon thread instead of blocking
+        """
+        if not self.connect():
             return
         
+        if background:
+            threading.Thread(target=self._warm, name='mongodb-warmup', daemon=True).start()
+        else:
+            self._warm()
+    
+    def _warm(self):
+        """Ping the server, then check the schema version."""
         try:
-            # Users collection indexes
-            users = self.db.users
-            users.create_index([("email", ASCENDING)], unique=True)
-            users.create_index([("username", ASCENDING)], unique=True)
-            users.create_index([("verification_token", ASCENDING)], sparse=True)
-            users.create_index([("reset_token", ASCENDING)], sparse=True)
-            
-            # Search history collection indexes
-            search_history = self.db.search_history
-            search_history.create_index([("user_id", ASCENDING)])
-            search_history.create_index([("timestamp", ASCENDING)])
-            
-            logger.info("Database indexes created successfully")
-        except Exception as e:
-            logger.error(f"Error creating indexes: {e}")
+            with metrics.timer('mongodb.pool.warmup_ms'):
+                self._client.admin.command('ping')
+            logger.info(f"MongoDB pool warmed for process {os.getpid()}")
+            self.check_schema()
+        except PyMongoError as e:
+            logger.error(f"Failed to warm MongoDB pool: {e}")
+    
+    def check_schema(self) -> Optional[int]:
+        """
+        Compare the applied schema version with the latest migration.
+        
+        A single read of ``schema_meta``; indexes are never built here.
+        Pending migrations are applied with ``flask db-upgrade``.
+        
+        Returns:
+            Applied schema version, or None if MongoDB is not configured
+        """
+        db = self.db
+        if db is None:
+            return None
+        
+        applied = migrations.get_applied_version(db)
+        metrics.set_gauge('mongodb.schema_version', applied)
+        if applied < migrations.LATEST_VERSION:
+            logger.error(
+                f"MongoDB schema is at version {applied}, latest is {migrations.LATEST_VERSION}; "
+                "run 'flask db-upgrade'"
+            )
+        return applied
+    
+    @property
+    def history_retention_days(self) -> int:
+        """Configured search history retention in days (0 keeps events forever)."""
+        return self._history_retention_days
     
     def get_users_collection(self):
         """Get users collection."""
-        if self.db is None:
+        db = self.db
+        if db is None:
             return None
-        return self.db.users
+        return db.users
     
     def get_search_history_collection(self):
         """Get search history collection."""
-        if self.db is None:
+        db = self.db
+        if db is None:
             return None
-        return self.db.search_history
+        return db.search_history
     
-    def is_connected(self) -> bool:
-        """Check if database is connected."""
-        if self.client is None or self.db is None:
-            return False
+    def get_search_history_collapsed_collection(self):
+        """Get collapsed search history collection (one document per user and artist)."""
+        db = self.db
+        if db is None:
+            return None
+        return db.search_history_collapsed
+    
+    def get_auth_tokens_collection(self):
+        """Get auth tokens collection (hashed email verification and reset tokens)."""
+        db = self.db
+        if db is None:
+            return None
+        return db.auth_tokens
+    
+    def ping(self) -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        Ping the server and cache the result.
+        
+        Returns:
+            Tuple of (ok, error_message), or None if MongoDB is not configured
+        """
+        client = self.client
+        if client is None:
+            return None
         
         try:
-            self.client.admin.command('ping')
-            return True
-        except:
+            client.admin.command('ping')
+            ok, error = True, None
+        except PyMongoError as e:
+            ok, error = False, str(e)
+        
+        self._ping_ok = ok
+        self._ping_checked_at = time.monotonic()
+        return ok, error
+    
+    def schema_probe(self) -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        Health probe that is down while schema migrations are pending.
+        
+        Returns:
+            Tuple of (ok, error_message), or None if MongoDB is not configured
+        """
+        db = self.db
+        if db is None:
+            return None
+        
+        try:
+            pending = migrations.pending_migrations(db)
+        except PyMongoError as e:
+            return False, str(e)
+        if pending:
+            versions = ', '.join(str(migration.version) for migration in pending)
+            return False, f"Pending migrations {versions}; run 'flask db-upgrade'"
+        return True, None
+    
+    def is_connected(self) -> bool:
+        """
+        Check if database is connected.
+        
+        Uses the last ping result (kept fresh by the health prober) and
+        only pings again when it is older than the cache window.
+        """
+        if self.client is None:
             return False
+        
+        if time.monotonic() - self._ping_checked_at > self._ping_max_age:
+            self.ping()
+        return self._ping_ok
     
     def close(self):
-        """Close database connection."""
-        if self.client:
-            self.client.close()
+        """Close the connection owned by the current process."""
+        if self._client is not None and self._pid == os.getpid():
+            self._client.close()
             logger.info("MongoDB connection closed")
+        self._client = None
+        self._db = None
 
 
 # Global database service instance
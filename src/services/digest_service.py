@@ -0,0 +1,257 @@
+"""
+Weekly "your top artists" digest emails.
+
+Recipients and their top artists come from a single aggregation over the
+daily search rollup, read through a cursor, so memory use stays flat no
+matter how many users there are. Bodies are rendered in batches from a
+precompiled template and each batch is sent over one SMTP connection at a
+fixed rate. Messages that cannot be sent are handed to the email outbox
+for retry. Users are stamped with ``last_digest_at`` after their batch, so
+re-running the job for the same period skips them. Each digest carries a
+signed unsubscribe link that sets ``digest_opt_out`` on the user.
+"""
+import logging
+import smtplib
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask_mail import Message
+from itsdangerous import BadSignature
+from pymongo import ASCENDING, DESCENDING
+
+from src.services.database_service import db_service
+from src.services.email_outbox import email_outbox
+from src.services.email_service import email_service
+from src.services.history_rollup_service import start_of_day
+from src.utils.metrics import metrics
+from src.utils.signing import signer_registry
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SUBJECT = "Your Top Artists This Week on Octa Music"
+UNSUBSCRIBE_PURPOSE = 'digest-unsubscribe'
+
+
+class RatePacer:
+    """Spaces calls to ``wait`` evenly at ``rate`` per second."""
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+    
+    def wait(self):
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+class DigestService:
+    """
+    Service for building and sending top artist digests.
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.batch_size = 100
+        self.rate = 5.0
+        self.top_artists = 5
+    
+    def init_app(self, app):
+        """Initialize the digest service with Flask app."""
+        self.app = app
+        self.batch_size = app.config.get('DIGEST_BATCH_SIZE', 100)
+        self.rate = app.config.get('DIGEST_SEND_RATE', 5.0)
+        self.top_artists = app.config.get('DIGEST_TOP_ARTISTS', 5)
+    
+    def iter_recipients(self, since: datetime) -> Iterator[dict]:
+        """
+        Stream verified users who searched since ``since`` with their top artists.
+        
+        Users already sent a digest on or after ``since`` and users who
+        unsubscribed are skipped.
+        
+        Args:
+            since: Start of the digest period (UTC)
+        
+        Returns:
+            Cursor of {"_id", "username", "email", "artists"} documents
+        """
+        db = db_service.db
+        if db is None:
+            raise RuntimeError("Database not available")
+        
+        pipeline = [
+            {'$match': {'day': {'$gte': start_of_day(since)}}},
+            # $last is only defined over ordered input: the latest day's name wins
+            {'$sort': {'day': ASCENDING}},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'artist_id': '$artist_id'},
+                'artist_name': {'$last': '$artist_name'},
+                'count': {'$sum': '$count'}
+            }},
+            {'$sort': {'_id.user_id': ASCENDING, 'count': DESCENDING}},
+            # $push keeps the sort order, so each list is most searched first
+            {'$group': {
+                '_id': '$_id.user_id',
+                'artists': {'$push': {'artist_name': '$artist_name', 'count': '$count'}}
+            }},
+            {'$lookup': {
+                'from': 'users',
+                'localField': '_id',
+                'foreignField': '_id',
+                'pipeline': [
+                    {'$match': {
+                        'email_verified': True,
+                        'digest_opt_out': {'$ne': True},
+                        'last_digest_at': {'$not': {'$gte': since}}
+                    }},
+                    {'$project': {'_id': 0, 'username': 1, 'email': 1}}
+                ],
+                'as': 'user'
+            }},
+            {'$unwind': '$user'},
+            {'$project': {
+                'username': '$user.username',
+                'email': '$user.email',
+                'artists': {'$slice': ['$artists', self.top_artists]}
+            }}
+        ]
+        return db.search_history_daily.aggregate(pipeline, allowDiskUse=True, batchSize=self.batch_size)
+    
+    def _get_serializer(self):
+        """Serializer for unsubscribe tokens that also accepts rotated-out secrets."""
+        config = self.app.config
+        secrets = (config['SECRET_KEY'], *config.get('SECRET_KEY_FALLBACKS', ()))
+        return signer_registry.get(secrets, UNSUBSCRIBE_PURPOSE)
+    
+    def unsubscribe_token(self, user_id: ObjectId) -> str:
+        """Signed token for the unsubscribe link in ``user_id``'s digests."""
+        return self._get_serializer().dumps({'user_id': str(user_id)})
+    
+    def unsubscribe(self, token: str) -> bool:
+        """
+        Stop sending digests to the user an unsubscribe token was issued for.
+        
+        Tokens do not expire, so the link in any past digest keeps working.
+        
+        Args:
+            token: Token from the unsubscribe link
+        
+        Returns:
+            True if the token was valid and the user exists
+        """
+        try:
+            user_id = ObjectId(self._get_serializer().loads(token)['user_id'])
+        except (BadSignature, InvalidId, KeyError, TypeError) as e:
+            logger.warning(f"Invalid digest unsubscribe token: {e}")
+            return False
+        
+        users = db_service.get_users_collection()
+        if users is None:
+            return False
+        result = users.update_one(
+            {'_id': user_id},
+            {'$set': {'digest_opt_out': True}}
+        )
+        if result.matched_count:
+            logger.info(f"Unsubscribed from digests: {user_id}")
+        return result.matched_count > 0
+    
+    def send_digests(
+        self,
+        days: int = 7,
+        rate: Optional[float] = None,
+        limit: Optional[int] = None,
+        dry_run: bool = False
+    ) -> dict:
+        """
+        Send a digest of the last ``days`` days to every eligible user.
+        
+        Args:
+            days: Length of the digest period
+            rate: Messages per second (defaults to ``DIGEST_SEND_RATE``)
+            limit: Stop after this many recipients
+            dry_run: Render the digests without sending or stamping anything
+        
+        Returns:
+            Counts of "rendered", "sent" and "deferred" (handed to the outbox) messages
+        """
+        since = datetime.utcnow() - timedelta(days=days)
+        period = start_of_day(since).strftime('%Y-%m-%d')
+        frontend_url = self.app.config.get('FRONTEND_URL', 'http://localhost:5000')
+        pacer = RatePacer(rate or self.rate)
+        stats = {'rendered': 0, 'sent': 0, 'deferred': 0}
+        
+        recipients = self.iter_recipients(since)
+        if limit:
+            recipients = islice(recipients, limit)
+        
+        while True:
+            batch = list(islice(recipients, self.batch_size))
+            if not batch:
+                break
+            messages = [
+                (recipient, email_service.render(
+                    'digest',
+                    username=recipient['username'],
+                    artists=recipient['artists'],
+                    days=days,
+                    frontend_url=frontend_url,
+                    unsubscribe_link=f"{frontend_url}/api/profile/digest/unsubscribe/{self.unsubscribe_token(recipient['_id'])}"
+                ))
+                for recipient in batch
+            ]
+            stats['rendered'] += len(messages)
+            if dry_run:
+                continue
+            
+            self._send_batch(messages, pacer, period, stats)
+            db_service.get_users_collection().update_many(
+                {'_id': {'$in': [recipient['_id'] for recipient in batch]}},
+                {'$set': {'last_digest_at': datetime.utcnow()}}
+            )
+            logger.info(f"Digests: {stats['sent']} sent, {stats['deferred']} deferred so far")
+        return stats
+    
+    def _send_batch(self, messages: List[Tuple[dict, str]], pacer: RatePacer, period: str, stats: dict):
+        """Send one batch over a single SMTP connection, deferring what fails to the outbox."""
+        done = set()
+        try:
+            with self.app.app_context():
+                with self.app.extensions['mail'].connect() as connection:
+                    for recipient, html in messages:
+                        pacer.wait()
+                        try:
+                            connection.send(Message(subject=DIGEST_SUBJECT, recipients=[recipient['email']], html=html))
+                            stats['sent'] += 1
+                            metrics.increment('email.digest.sent')
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                            logger.warning(f"Digest to {recipient['email']} not accepted: {e}")
+                            self._defer(recipient, html, period, stats)
+                        done.add(recipient['_id'])
+        except (OSError, smtplib.SMTPException) as e:
+            logger.warning(f"SMTP connection failed during digest batch: {e}")
+            for recipient, html in messages:
+                if recipient['_id'] not in done:
+                    self._defer(recipient, html, period, stats)
+    
+    def _defer(self, recipient: dict, html: str, period: str, stats: dict):
+        """Hand a digest to the outbox, which retries it with backoff."""
+        email_outbox.enqueue(
+            recipient['email'],
+            DIGEST_SUBJECT,
+            html,
+            dedup_key=f"digest:{recipient['_id']}:{period}"
+        )
+        stats['deferred'] += 1
+        metrics.increment('email.digest.deferred')
+
+
+# Global digest service instance
+digest_service = DigestService()
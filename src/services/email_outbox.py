@@ -0,0 +1,335 @@
+"""
+Persistent outbox for outbound email.
+
+Requests render a message, enqueue it in a local SQLite database and
+return without talking to the SMTP server. A background sender in each
+worker claims due messages in batches and sends every batch over a single
+SMTP connection. Failed sends are retried with exponential backoff; a
+message that keeps failing (or is rejected outright) is parked as
+``failed``. Each message has a dedup key, so enqueueing the same message
+twice, e.g. from a double-submitted form, sends it once. Account emails
+are keyed on recipient and purpose and deduplicated within a time window,
+since each one carries a freshly issued token.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from flask_mail import Message
+
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+# Seconds between sweeps of old sent and failed messages
+PURGE_INTERVAL = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    dedup_key TEXT NOT NULL UNIQUE,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+def message_key(recipient: str, subject: str, html: str) -> str:
+    """Default dedup key: a digest of the message itself."""
+    digest = hashlib.sha256()
+    for part in (recipient, subject, html):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class EmailOutboxService:
+    """
+    Service for queueing email and sending it in the background.
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.path: Optional[str] = None
+        self.batch_size = 20
+        self.poll_interval = 5.0
+        self.max_attempts = 8
+        self.backoff_base = 30.0
+        self.backoff_max = 3600.0
+        self.claim_timeout = 300.0
+        self.retention = 86400.0
+        self._local = threading.local()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._last_purge = 0.0
+    
+    def init_app(self, app):
+        """Initialize the outbox with Flask app."""
+        self.app = app
+        self.batch_size = app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 20)
+        self.poll_interval = app.config.get('EMAIL_OUTBOX_POLL_INTERVAL', 5.0)
+        self.max_attempts = app.config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 8)
+        self.path = app.config.get('EMAIL_OUTBOX_PATH')
+        if not self.path:
+            if app.config.get('EMAIL_OUTBOX_PATH_REQUIRED'):
+                # The temp directory is wiped on restart, along with any mail queued in it
+                raise RuntimeError("EMAIL_OUTBOX_PATH must point at persistent storage")
+            self.path = os.path.join(tempfile.gettempdir(), 'octa-music-outbox.db')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._connect().executescript(SCHEMA)
+        try:
+            # Queued messages contain verification and reset links
+            os.chmod(self.path, 0o600)
+        except OSError:
+            pass
+        atexit.register(self.stop)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Connection for the current thread and process."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+    
+    def enqueue(
+        self,
+        recipient: str,
+        subject: str,
+        html: str,
+        dedup_key: Optional[str] = None,
+        dedup_window: Optional[float] = None
+    ) -> bool:
+        """
+        Queue a message for sending.
+        
+        A message whose dedup key is still waiting to be sent is replaced
+        by the new content, so only the latest version goes out. One that
+        was sent within ``dedup_window`` seconds (or at all, when no window
+        is given) is not queued again; one that previously failed is queued
+        for a fresh round of attempts.
+        
+        Args:
+            recipient: Email address
+            subject: Subject line
+            html: Rendered HTML body
+            dedup_key: Identity of the message (defaults to a digest of its content)
+            dedup_window: Seconds after sending during which the key stays deduplicated
+        
+        Returns:
+            True if the message is queued (or already was), False on storage errors
+        """
+        now = time.time()
+        # No window: a sent message is deduplicated until it is purged
+        sent_before = now - dedup_window if dedup_window is not None else -1.0
+        try:
+            cursor = self._connect().execute(
+                'INSERT INTO outbox (dedup_key, recipient, subject, html, status, next_attempt_at, updated_at) '
+                'VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?6) '
+                'ON CONFLICT (dedup_key) DO UPDATE SET '
+                'recipient = ?2, subject = ?3, html = ?4, status = ?5, attempts = 0, '
+                'next_attempt_at = ?6, updated_at = ?6, last_error = NULL '
+                # Never rewrite a message a sender has claimed and may be sending
+                'WHERE status = ?7 OR (status = ?5 AND claimed_until <= ?6) '
+                'OR (status = ?8 AND updated_at <= ?9)',
+                (dedup_key or message_key(recipient, subject, html), recipient, subject, html,
+                 STATUS_PENDING, now, STATUS_FAILED, STATUS_SENT, sent_before)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to queue email to {recipient}: {e}")
+            metrics.increment('email.outbox.enqueue_failed')
+            return False
+        
+        if cursor.rowcount:
+            metrics.increment('email.outbox.queued')
+        else:
+            metrics.increment('email.outbox.deduplicated')
+        self.start()
+        self._wake.set()
+        return True
+    
+    def is_recent(self, dedup_key: str, dedup_window: float) -> bool:
+        """
+        True if a message with this key is queued or was sent within ``dedup_window`` seconds.
+        
+        Lets callers skip work (such as issuing a new token, which revokes
+        the one already mailed) that the outbox would deduplicate anyway.
+        """
+        try:
+            row = self._connect().execute(
+                'SELECT 1 FROM outbox WHERE dedup_key = ? AND (status = ? OR (status = ? AND updated_at > ?))',
+                (dedup_key, STATUS_PENDING, STATUS_SENT, time.time() - dedup_window)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read email outbox: {e}")
+            return False
+        return row is not None
+    
+    def start(self):
+        """Start the background sender for the current process (idempotent)."""
+        pid = os.getpid()
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='email-sender', daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop the background sender.
+        
+        Messages still queued stay in the outbox; a batch cut short is
+        picked up again once its claim times out.
+        """
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread is not threading.current_thread():
+            thread.join(timeout)
+    
+    def _run(self):
+        """Send due batches back to back, then sleep until woken or the poll interval."""
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                sent_batch = self.process_due()
+            except sqlite3.Error as e:
+                logger.error(f"Email outbox unavailable: {e}")
+                sent_batch = False
+            if not sent_batch:
+                self._wake.wait(self.poll_interval)
+    
+    def process_due(self) -> bool:
+        """
+        Claim and send one batch of due messages.
+        
+        Returns:
+            True if a batch was processed
+        """
+        batch = self._claim(time.time())
+        self._maybe_purge()
+        if not batch:
+            return False
+        with metrics.timer('email.outbox.batch_ms'):
+            self._send_batch(batch)
+        return True
+    
+    def _claim(self, now: float) -> List[tuple]:
+        """
+        Claim up to ``batch_size`` due messages.
+        
+        The claim is a single UPDATE, so senders in other workers never
+        take the same message. A claim that is not resolved (the worker
+        died mid-batch) lapses after ``claim_timeout``.
+        """
+        return self._connect().execute(
+            'UPDATE outbox SET claimed_until = ?1 + ?2 WHERE id IN ('
+            'SELECT id FROM outbox WHERE status = ?3 AND next_attempt_at <= ?1 AND claimed_until <= ?1 '
+            'ORDER BY next_attempt_at LIMIT ?4'
+            ') RETURNING id, recipient, subject, html, attempts',
+            (now, self.claim_timeout, STATUS_PENDING, self.batch_size)
+        ).fetchall()
+    
+    def _send_batch(self, batch: List[tuple]):
+        """Send a batch over one SMTP connection, rescheduling whatever is not sent."""
+        done = set()
+        try:
+            with self.app.app_context():
+                with self.app.extensions['mail'].connect() as connection:
+                    for message_id, recipient, subject, html, attempts in batch:
+                        try:
+                            connection.send(Message(subject=subject, recipients=[recipient], html=html))
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                            # The server rejected this message; the connection is still usable
+                            code = getattr(e, 'smtp_code', 550)
+                            self._mark_failed(message_id, attempts, e, permanent=code >= 500)
+                        else:
+                            self._mark_sent(message_id)
+                        done.add(message_id)
+        except (OSError, smtplib.SMTPException) as e:
+            # Connection-level failure: nothing after this point was sent
+            logger.warning(f"SMTP connection failed after {len(done)} of {len(batch)} messages: {e}")
+            for message_id, _, _, _, attempts in batch:
+                if message_id not in done:
+                    self._mark_failed(message_id, attempts, e)
+    
+    def _mark_sent(self, message_id: int):
+        self._connect().execute(
+            'UPDATE outbox SET status = ?, html = ?, claimed_until = 0, updated_at = ?, last_error = NULL '
+            'WHERE id = ?',
+            (STATUS_SENT, '', time.time(), message_id)
+        )
+        metrics.increment('email.outbox.sent')
+    
+    def _mark_failed(self, message_id: int, attempts: int, error: Exception, permanent: bool = False):
+        """Schedule a retry with exponential backoff, or park the message as failed."""
+        attempts += 1
+        now = time.time()
+        if permanent or attempts >= self.max_attempts:
+            self._connect().execute(
+                'UPDATE outbox SET status = ?, attempts = ?, claimed_until = 0, updated_at = ?, last_error = ? '
+                'WHERE id = ?',
+                (STATUS_FAILED, attempts, now, str(error), message_id)
+            )
+            metrics.increment('email.outbox.failed')
+            logger.error(f"Giving up on email {message_id} after {attempts} attempts: {error}")
+            return
+        
+        # Jitter keeps workers from retrying in lockstep after an outage
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+        self._connect().execute(
+            'UPDATE outbox SET attempts = ?, next_attempt_at = ?, claimed_until = 0, updated_at = ?, last_error = ? '
+            'WHERE id = ?',
+            (attempts, now + delay, now, str(error), message_id)
+        )
+        metrics.increment('email.outbox.retried')
+    
+    def counts(self) -> dict:
+        """Number of messages per status."""
+        rows = self._connect().execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall()
+        return dict(rows)
+    
+    def _maybe_purge(self):
+        """Forget sent and failed messages once they are past the dedup retention."""
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self._connect().execute(
+            'DELETE FROM outbox WHERE status != ? AND updated_at <= ?',
+            (STATUS_PENDING, now - self.retention)
+        )
+        metrics.set_gauge('email.outbox.pending', self.counts().get(STATUS_PENDING, 0))
+
+
+# Global email outbox instance
+email_outbox = EmailOutboxService()
@@ -1,10 +1,15 @@
 """
 Email service for sending authentication-related emails.
+
+Messages are rendered in the request and handed to the outbox
+(``src.services.email_outbox``), which sends them in the background.
 """
 import logging
 from typing import Optional
-from flask import current_app, render_template_string
-from flask_mail import Mail, Message
+from flask import current_app
+from flask_mail import Mail
+
+from src.services.email_outbox import email_outbox
 
 logger = logging.getLogger(__name__)
 
@@ -120,6 +125,54 @@ EMAIL_CHANGE_VERIFICATION_TEMPLATE = """
 </html>
 """
 
+DIGEST_EMAIL_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background-color: #1db954; color: white; padding: 20px; text-align: center; }
+        .content { padding: 20px; background-color: #f9f9f9; }
+        .artist { padding: 8px 0; border-bottom: 1px solid #eee; }
+        .count { color: #666; font-size: 12px; }
+        .footer { text-align: center; padding: 20px; color: #666; font-size: 12px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Your Top Artists This Week</h1>
+        </div>
+        <div class="content">
+            <p>Hi {{ username }},</p>
+            <p>Here are the artists you searched for most over the last {{ days }} days:</p>
+            {% for artist in artists %}
+            <div class="artist">
+                <strong>{{ loop.index }}. {{ artist.artist_name }}</strong>
+                <span class="count">({{ artist.count }} search{{ 'es' if artist.count != 1 else '' }})</span>
+            </div>
+            {% endfor %}
+            <p style="text-align: center;">
+                <a href="{{ frontend_url }}/profile">See your full history</a>
+            </p>
+        </div>
+        <div class="footer">
+            <p><a href="{{ unsubscribe_link }}">Unsubscribe from weekly digests</a></p>
+            <p>&copy; 2024 Octa Music. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+TEMPLATES = {
+    'verification': VERIFICATION_EMAIL_TEMPLATE,
+    'password_reset': PASSWORD_RESET_EMAIL_TEMPLATE,
+    'email_change': EMAIL_CHANGE_VERIFICATION_TEMPLATE,
+    'digest': DIGEST_EMAIL_TEMPLATE,
+}
+
 
 class EmailService:
     """
@@ -128,10 +181,46 @@ class EmailService:
     
     def __init__(self):
         self.mail = None
+        self.templates = {}
+        self.dedup_window = 900
     
     def init_app(self, app):
         """Initialize the email service with Flask app."""
         self.mail = Mail(app)
+        self.dedup_window = app.config.get('EMAIL_DEDUP_WINDOW', 900)
+        # Parse every template once instead of on each send
+        self.templates = {name: app.jinja_env.from_string(source) for name, source in TEMPLATES.items()}
+    
+    def render(self, name: str, **context) -> str:
+        """
+        Render a precompiled email template.
+        
+        Does not need an app or request context, so bulk jobs can render
+        from any thread.
+        
+        Args:
+            name: Template name (a key of ``TEMPLATES``)
+            **context: Template variables
+        
+        Returns:
+            Rendered HTML
+        """
+        return self.templates[name].render(**context)
+    
+    @staticmethod
+    def dedup_key(name: str, email: str) -> str:
+        """Outbox dedup key for a template sent to an address."""
+        return f"{name}:{email.strip().lower()}"
+    
+    def recently_sent(self, name: str, email: str) -> bool:
+        """
+        True if ``name`` was queued for or sent to ``email`` within the dedup window.
+        
+        Callers check this before issuing a token: the outbox would drop
+        the new message, and the new token would revoke the link in the
+        one already sent.
+        """
+        return email_outbox.is_recent(self.dedup_key(name, email), self.dedup_window)
     
     def send_verification_email(self, email: str, username: str, token: str) -> bool:
         """
@@ -143,34 +232,35 @@ class EmailService:
             token: Verification token
         
         Returns:
-            True if email sent successfully, False otherwise
+            True if the email was queued, False otherwise
         """
         try:
             frontend_url = current_app.config.get('FRONTEND_URL', 'http://localhost:5000')
             verification_link = f"{frontend_url}/api/auth/verify-email/{token}"
             
-            html_body = render_template_string(
-                VERIFICATION_EMAIL_TEMPLATE,
+            html_body = self.render(
+                'verification',
                 username=username,
                 verification_link=verification_link
             )
             
-            msg = Message(
-                subject="Verify Your Octa Music Account",
-                recipients=[email],
-                html=html_body
-            )
-            
             # In development mode, log email instead of sending
             if current_app.config.get('MAIL_SUPPRESS_SEND', False):
                 logger.info(f"[DEV MODE] Email verification link for {email}: {verification_link}")
                 return True
             
-            self.mail.send(msg)
-            logger.info(f"Verification email sent to: {email}")
-            return True
+            queued = email_outbox.enqueue(
+                email,
+                "Verify Your Octa Music Account",
+                html_body,
+                dedup_key=self.dedup_key('verification', email),
+                dedup_window=self.dedup_window
+            )
+            if queued:
+                logger.info(f"Verification email queued for: {email}")
+            return queued
         except Exception as e:
-            logger.error(f"Failed to send verification email: {e}")
+            logger.error(f"Failed to queue verification email: {e}")
             return False
     
     def send_password_reset_email(self, email: str, username: str, token: str) -> bool:
@@ -183,34 +273,35 @@ class EmailService:
             token: Reset token
         
         Returns:
-            True if email sent successfully, False otherwise
+            True if the email was queued, False otherwise
         """
         try:
             frontend_url = current_app.config.get('FRONTEND_URL', 'http://localhost:5000')
             reset_link = f"{frontend_url}/reset-password/{token}"
             
-            html_body = render_template_string(
-                PASSWORD_RESET_EMAIL_TEMPLATE,
+            html_body = self.render(
+                'password_reset',
                 username=username,
                 reset_link=reset_link
             )
             
-            msg = Message(
-                subject="Reset Your Octa Music Password",
-                recipients=[email],
-                html=html_body
-            )
-            
             # In development mode, log email instead of sending
             if current_app.config.get('MAIL_SUPPRESS_SEND', False):
                 logger.info(f"[DEV MODE] Password reset link for {email}: {reset_link}")
                 return True
             
-            self.mail.send(msg)
-            logger.info(f"Password reset email sent to: {email}")
-            return True
+            queued = email_outbox.enqueue(
+                email,
+                "Reset Your Octa Music Password",
+                html_body,
+                dedup_key=self.dedup_key('password_reset', email),
+                dedup_window=self.dedup_window
+            )
+            if queued:
+                logger.info(f"Password reset email queued for: {email}")
+            return queued
         except Exception as e:
-            logger.error(f"Failed to send password reset email: {e}")
+            logger.error(f"Failed to queue password reset email: {e}")
             return False
     
     def send_email_change_verification(self, email: str, username: str, token: str) -> bool:
@@ -223,34 +314,35 @@ class EmailService:
             token: Verification token
         
         Returns:
-            True if email sent successfully, False otherwise
+            True if the email was queued, False otherwise
         """
         try:
             frontend_url = current_app.config.get('FRONTEND_URL', 'http://localhost:5000')
             verification_link = f"{frontend_url}/api/auth/verify-email/{token}"
             
-            html_body = render_template_string(
-                EMAIL_CHANGE_VERIFICATION_TEMPLATE,
+            html_body = self.render(
+                'email_change',
                 username=username,
                 verification_link=verification_link
             )
             
-            msg = Message(
-                subject="Verify Your New Email Address",
-                recipients=[email],
-                html=html_body
-            )
-            
             # In development mode, log email instead of sending
             if current_app.config.get('MAIL_SUPPRESS_SEND', False):
                 logger.info(f"[DEV MODE] Email change verification link for {email}: {verification_link}")
                 return True
             
-            self.mail.send(msg)
-            logger.info(f"Email change verification sent to: {email}")
-            return True
+            queued = email_outbox.enqueue(
+                email,
+                "Verify Your New Email Address",
+                html_body,
+                dedup_key=self.dedup_key('email_change', email),
+                dedup_window=self.dedup_window
+            )
+            if queued:
+                logger.info(f"Email change verification queued for: {email}")
+            return queued
         except Exception as e:
-            logger.error(f"Failed to send email change verification: {e}")
+            logger.error(f"Failed to queue email change verification: {e}")
             return False
 
 
@@ -0,0 +1,245 @@
+"""
+Bounded executor for password hashing.
+
+bcrypt is deliberately slow. Running it on request threads lets a burst of
+logins occupy every gthread slot, so hashing runs in a small process pool
+instead, behind a fixed number of slots. When every slot is taken new work
+is rejected with ``HashingOverloadedError`` (served as 503 + Retry-After)
+rather than queued without bound.
+"""
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Optional
+
+from src.user_models.user_model import User
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class HashingOverloadedError(Exception):
+    """Raised when every hashing slot is in use."""
+    
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing capacity exceeded")
+        self.retry_after = retry_after
+
+
+def _timed_call(fn, *args):
+    """Run ``fn`` in a pool process and report when it started and how long it took."""
+    started_at = time.time()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, started_at, (time.perf_counter() - start) * 1000.0
+
+
+def calibrate_cost(target_ms: float, min_cost: int = 12, max_cost: int = 15, probe_cost: int = 8) -> int:
+    """
+    Pick the bcrypt cost whose hash time is closest to ``target_ms`` on this host.
+    
+    Each extra unit of cost doubles the work, so a cheap probe hash at
+    ``probe_cost`` is timed and extrapolated instead of timing the
+    expensive costs themselves.
+    
+    Args:
+        target_ms: Desired time for one hash in milliseconds
+        min_cost: Lowest cost ever returned
+        max_cost: Highest cost ever returned
+        probe_cost: Cost used for the timing probe
+    
+    Returns:
+        bcrypt cost (log2 rounds)
+    """
+    # Best of a few runs filters out scheduling noise
+    probe_ms = min(_timed_call(User.hash_password, 'calibration', probe_cost)[2] for _ in range(3))
+    cost = probe_cost + round(math.log2(max(target_ms, 1.0) / max(probe_ms, 0.01)))
+    return max(min_cost, min(max_cost, cost))
+
+
+class HashingService:
+    """
+    Service for running bcrypt off the request threads.
+    """
+    
+    def __init__(self):
+        self.workers = 0
+        self.max_pending = 8
+        self.timeout = 10.0
+        self.cost: Optional[int] = None
+        self._calibration = (250, 12, 15)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = 0
+        self._avg_hash_ms = 250.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    def init_app(self, app):
+        """Initialize the hashing service with Flask app."""
+        self.workers = app.config.get('HASHING_WORKERS', 1)
+        self.max_pending = max(1, app.config.get('HASHING_MAX_PENDING', 8))
+        self.timeout = app.config.get('HASHING_TIMEOUT', 10.0)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = 0
+        
+        # Calibration is deferred to the first hash (or post_fork), so CLI
+        # commands and imports never pay for it
+        self.cost = app.config.get('BCRYPT_ROUNDS') or None
+        self._calibration = (
+            app.config.get('BCRYPT_TARGET_MS', 250),
+            app.config.get('BCRYPT_MIN_ROUNDS', 12),
+            app.config.get('BCRYPT_MAX_ROUNDS', 15)
+        )
+    
+    def get_cost(self) -> int:
+        """Current bcrypt cost, calibrating on this host the first time it is needed."""
+        if self.cost is not None:
+            return self.cost
+        
+        with self._lock:
+            if self.cost is None:
+                self.cost = calibrate_cost(*self._calibration)
+                metrics.set_gauge('auth.hash.cost', self.cost)
+                logger.info(f"bcrypt cost set to {self.cost}")
+        return self.cost
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """Process pool owned by the current process, or None to hash inline."""
+        if self.workers <= 0:
+            return None
+        
+        pid = os.getpid()
+        if self._executor is not None and self._pid == pid:
+            return self._executor
+        
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                # Spawn rather than fork: forking a multi-threaded worker is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pid = pid
+        return self._executor
+    
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up."""
+        busy_ms = self._pending * self._avg_hash_ms / max(1, self.workers)
+        return max(1, math.ceil(busy_ms / 1000.0))
+    
+    @contextmanager
+    def reserve(self):
+        """
+        Hold one hashing slot for the duration of the block.
+        
+        Nested reservations on the same thread share the outer slot, so a
+        caller can reserve before doing other work (e.g. a login that
+        records the attempt) and hash inside the block without being
+        rejected half-way through.
+        
+        Raises:
+            HashingOverloadedError: If no slot is free
+        """
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        
+        if not self._slots.acquire(blocking=False):
+            metrics.increment('auth.hash.rejected')
+            raise HashingOverloadedError(self.retry_after())
+        
+        with self._lock:
+            self._pending += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+    
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """Drop a broken pool so the next call starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _run(self, fn, *args):
+        """
+        Run a hashing function in the pool (or inline) and record metrics.
+        
+        Raises:
+            HashingOverloadedError: If no slot is free, the pool process died
+                or the hash did not finish within the timeout
+        """
+        with self.reserve():
+            metrics.set_gauge('auth.hash.pending', self._pending)
+            executor = self._get_executor()
+            submitted_at = time.time()
+            if executor is None:
+                result, started_at, hash_ms = _timed_call(fn, *args)
+            else:
+                try:
+                    future = executor.submit(_timed_call, fn, *args)
+                    result, started_at, hash_ms = future.result(timeout=self.timeout)
+                except BrokenProcessPool:
+                    logger.error("Hashing process pool broken; starting a new one")
+                    metrics.increment('auth.hash.pool_broken')
+                    self._discard_executor(executor)
+                    raise HashingOverloadedError(self.retry_after())
+                except FutureTimeoutError:
+                    logger.warning(f"Password hash did not finish within {self.timeout}s")
+                    metrics.increment('auth.hash.timeouts')
+                    future.cancel()
+                    raise HashingOverloadedError(self.retry_after())
+        
+        metrics.observe('auth.hash.queue_wait_ms', max(0.0, (started_at - submitted_at) * 1000.0))
+        metrics.observe('auth.hash.hash_ms', hash_ms)
+        self._avg_hash_ms = 0.8 * self._avg_hash_ms + 0.2 * hash_ms
+        return result
+    
+    def hash_password(self, password: str) -> str:
+        """Hash a password with bcrypt at the configured cost."""
+        return self._run(User.hash_password, password, self.get_cost())
+    
+    def needs_rehash(self, password_hash: Optional[str]) -> bool:
+        """
+        True if a stored hash was made with a lower cost than the current one.
+        
+        Calibration can settle on a different cost per host or restart, so
+        hashes above the current cost are left alone rather than rewritten
+        back and forth between deployments.
+        """
+        cost = User.get_hash_cost(password_hash)
+        return cost is None or cost < self.get_cost()
+    
+    def verify_password(self, password: str, password_hash: Optional[str]) -> bool:
+        """Verify a password against its bcrypt hash."""
+        if not password_hash:
+            return False
+        return self._run(User.verify_password, password, password_hash)
+    
+    def shutdown(self):
+        """Stop the process pool owned by the current process."""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+# Global hashing service instance
+hashing_service = HashingService()
@@ -0,0 +1,135 @@
+"""
+Dependency health prober.
+
+Probes external dependencies (MongoDB, Spotify, YouTube) on a fixed
+interval from a background thread and caches their state and latency.
+Health checks read the cache instead of generating dependency traffic.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# A probe returns (ok, error_message), or None when the dependency is not configured
+Probe = Callable[[], Optional[Tuple[bool, Optional[str]]]]
+
+STATUS_UP = 'up'
+STATUS_DOWN = 'down'
+STATUS_DISABLED = 'disabled'
+
+
+class HealthService:
+    """
+    Service for probing dependencies in the background.
+    """
+    
+    def __init__(self):
+        self.interval = 30
+        self._probes: Dict[str, Probe] = {}
+        self._state: Dict[str, dict] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+    
+    def init_app(self, app):
+        """Initialize the health service with Flask app."""
+        self.interval = app.config.get('HEALTH_PROBE_INTERVAL', 30)
+    
+    def register_probe(self, name: str, probe: Probe):
+        """
+        Register a dependency probe.
+        
+        Args:
+            name: Dependency name used in health responses
+            probe: Callable returning (ok, error_message) or None if disabled
+        """
+        self._probes[name] = probe
+    
+    def start(self):
+        """Start the background prober for the current process (idempotent)."""
+        pid = os.getpid()
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='health-prober', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop the background prober."""
+        self._stop.set()
+    
+    def _run(self):
+        """Probe every dependency, then sleep until the next interval."""
+        while not self._stop.is_set():
+            self.probe_all()
+            self._stop.wait(self.interval)
+    
+    def probe_all(self) -> Dict[str, dict]:
+        """Run every probe now and update the cache."""
+        for name, probe in list(self._probes.items()):
+            self._state[name] = self._run_probe(name, probe)
+        return self.get_dependencies()
+    
+    @staticmethod
+    def _run_probe(name: str, probe: Probe) -> dict:
+        """Run one probe, timing it and converting failures to state."""
+        start = time.perf_counter()
+        try:
+            result = probe()
+        except Exception as e:
+            result = (False, str(e))
+        latency_ms = round((time.perf_counter() - start) * 1000.0, 2)
+        
+        if result is None:
+            return {
+                'status': STATUS_DISABLED,
+                'latency_ms': None,
+                'checked_at': datetime.utcnow().isoformat(),
+                'error': None
+            }
+        
+        ok, error = result
+        metrics.observe(f'health.{name}.latency_ms', latency_ms)
+        if not ok:
+            metrics.increment(f'health.{name}.failures')
+            logger.warning(f"Health probe '{name}' failed: {error}")
+        return {
+            'status': STATUS_UP if ok else STATUS_DOWN,
+            'latency_ms': latency_ms,
+            'checked_at': datetime.utcnow().isoformat(),
+            'error': error
+        }
+    
+    def get_dependencies(self) -> Dict[str, dict]:
+        """Cached dependency states (empty until the first probe runs)."""
+        return dict(self._state)
+    
+    def get_status(self, deep: bool = False) -> dict:
+        """
+        Overall health.
+        
+        Args:
+            deep: Probe every dependency now instead of reading the cache
+        
+        Returns:
+            Dictionary with "status" ("healthy" or "degraded") and "dependencies"
+        """
+        dependencies = self.probe_all() if deep else self.get_dependencies()
+        degraded = any(dep['status'] == STATUS_DOWN for dep in dependencies.values())
+        return {
+            'status': 'degraded' if degraded else 'healthy',
+            'dependencies': dependencies
+        }
+
+
+# Global health service instance
+health_service = HealthService()
@@ -0,0 +1,193 @@
+"""
+Retention and daily rollup for search history.
+
+Raw search events in ``search_history`` expire through a TTL index after
+``SEARCH_HISTORY_RETENTION_DAYS``. Before they expire, an incremental job
+folds them into per-user, per-artist daily counts in
+``search_history_daily``; analytics queries read only that collection.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, List, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from src.services.database_service import db_service
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_JOB_ID = 'search_history_daily_rollup'
+
+
+def start_of_day(value: datetime) -> datetime:
+    """Truncate a naive UTC datetime to midnight."""
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class HistoryRollupService:
+    """
+    Service for rolling raw search events up into daily aggregates.
+    """
+    
+    def __init__(self):
+        self.retention_days = 0
+    
+    def init_app(self, app):
+        """Initialize the rollup service with Flask app."""
+        self.retention_days = app.config.get('SEARCH_HISTORY_RETENTION_DAYS', 0)
+    
+    def run_rollup(self, now: Optional[datetime] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """
+        Fold every complete day since the last run into daily aggregates.
+        
+        Days are processed whole and merged with ``whenMatched: replace``,
+        so re-running a window after a crash rewrites the same counts
+        instead of adding them twice.
+        
+        The write-behind queue can insert an event stamped before midnight
+        after the rollup of that day ran, so each run also re-rolls the
+        last day of the previous window (unless retention may already have
+        expired part of it).
+        
+        Args:
+            now: Current UTC time (defaults to ``datetime.utcnow()``)
+        
+        Returns:
+            Tuple of (window_start, window_end), or (None, None) if there was nothing to do
+        """
+        db = db_service.db
+        if db is None:
+            raise RuntimeError("Database not available")
+        
+        events = db.search_history
+        job_state = db.job_state
+        now = now or datetime.utcnow()
+        window_end = start_of_day(now)
+        
+        state = job_state.find_one({'_id': ROLLUP_JOB_ID}) or {}
+        window_start = state.get('watermark')
+        if window_start is None:
+            oldest = events.find_one({}, {'timestamp': 1}, sort=[('timestamp', ASCENDING)])
+            if not oldest:
+                return None, None
+            window_start = start_of_day(oldest['timestamp'])
+        else:
+            trailing_day = window_start - timedelta(days=1)
+            if not self.retention_days or trailing_day >= now - timedelta(days=self.retention_days):
+                window_start = trailing_day
+        
+        if window_start >= window_end:
+            return None, None
+        
+        if self.retention_days and window_start < window_end - timedelta(days=self.retention_days):
+            logger.warning(
+                f"Rollup window starts more than {self.retention_days} days ago; "
+                "some events may have expired before being rolled up"
+            )
+        
+        pipeline = [
+            {'$match': {'timestamp': {'$gte': window_start, '$lt': window_end}}},
+            # $last needs an order: the most recent name wins
+            {'$sort': {'timestamp': ASCENDING}},
+            {'$group': {
+                '_id': {
+                    'user_id': '$user_id',
+                    'artist_id': {'$ifNull': ['$results.artist_id', '$results.artist_name']},
+                    'day': {'$dateTrunc': {'date': '$timestamp', 'unit': 'day'}}
+                },
+                'count': {'$sum': 1},
+                'artist_name': {'$last': '$results.artist_name'}
+            }},
+            {'$project': {
+                '_id': 0,
+                'user_id': '$_id.user_id',
+                'artist_id': '$_id.artist_id',
+                'day': '$_id.day',
+                'artist_name': 1,
+                'count': 1
+            }},
+            {'$merge': {
+                'into': 'search_history_daily',
+                'on': ['user_id', 'artist_id', 'day'],
+                'whenMatched': 'replace',
+                'whenNotMatched': 'insert'
+            }}
+        ]
+        
+        with metrics.timer('search_history.rollup_ms'):
+            events.aggregate(pipeline, allowDiskUse=True)
+        
+        job_state.update_one(
+            {'_id': ROLLUP_JOB_ID},
+            {'$set': {'watermark': window_end, 'last_run': datetime.utcnow()}},
+            upsert=True
+        )
+        logger.info(f"Search history rolled up from {window_start.isoformat()} to {window_end.isoformat()}")
+        return window_start, window_end
+    
+    def get_top_artists(
+        self,
+        since: datetime,
+        user_id: Optional[str] = None,
+        limit: int = 10
+    ) -> List[dict]:
+        """
+        Most searched artists since a date, read from the daily rollup.
+        
+        Args:
+            since: Include days on or after this date
+            user_id: Restrict to one user (all users if None)
+            limit: Maximum number of artists
+        
+        Returns:
+            List of {"artist_id", "artist_name", "count"} dictionaries
+        """
+        db = db_service.db
+        if db is None:
+            return []
+        
+        match = {'day': {'$gte': start_of_day(since)}}
+        if user_id:
+            match['user_id'] = ObjectId(user_id)
+        
+        pipeline = [
+            {'$match': match},
+            {'$group': {
+                '_id': '$artist_id',
+                'artist_name': {'$last': '$artist_name'},
+                'count': {'$sum': '$count'}
+            }},
+            {'$sort': {'count': DESCENDING, '_id': ASCENDING}},
+            {'$limit': limit},
+            {'$project': {'_id': 0, 'artist_id': '$_id', 'artist_name': 1, 'count': 1}}
+        ]
+        return list(db.search_history_daily.aggregate(pipeline))
+    
+    def get_daily_counts(self, user_id: str, days: int = 30) -> List[dict]:
+        """
+        Searches per day for one user, read from the daily rollup.
+        
+        Args:
+            user_id: User ID string
+            days: Number of days to look back
+        
+        Returns:
+            List of {"day", "count"} dictionaries, oldest first
+        """
+        db = db_service.db
+        if db is None:
+            return []
+        
+        since = start_of_day(datetime.utcnow() - timedelta(days=days))
+        pipeline = [
+            {'$match': {'user_id': ObjectId(user_id), 'day': {'$gte': since}}},
+            {'$group': {'_id': '$day', 'count': {'$sum': '$count'}}},
+            {'$sort': {'_id': ASCENDING}},
+            {'$project': {'_id': 0, 'day': '$_id', 'count': 1}}
+        ]
+        return list(db.search_history_daily.aggregate(pipeline))
+
+
+# Global history rollup service instance
+history_rollup_service = HistoryRollupService()
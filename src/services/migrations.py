@@ -0,0 +1,200 @@
+"""
+Versioned schema migrations for MongoDB.
+
+Each migration has a version number and is applied once, in order. The
+highest applied version is stored in the ``schema_meta`` collection, so
+workers only need a single read at startup to know whether anything is
+pending. Migrations are applied with ``flask db-upgrade``, never on boot.
+
+To change indexes, append a new migration; never edit an applied one.
+"""
+import logging
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_META_ID = 'schema'
+
+# MongoDB error codes for an index that exists with different options
+INDEX_CONFLICT_CODES = (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+INDEX_NOT_FOUND_CODE = 27
+
+
+class Migration(NamedTuple):
+    """A single schema migration."""
+    version: int
+    description: str
+    apply: Callable
+
+
+def _initial_indexes(db):
+    users = db.users
+    users.create_index([("email", ASCENDING)], unique=True)
+    users.create_index([("username", ASCENDING)], unique=True)
+    users.create_index([("verification_token", ASCENDING)], sparse=True)
+    users.create_index([("reset_token", ASCENDING)], sparse=True)
+    
+    search_history = db.search_history
+    # Serves the keyset-paginated history reads; also covers user_id lookups
+    search_history.create_index(
+        [("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]
+    )
+    search_history.create_index([("timestamp", ASCENDING)])
+
+
+def _drop_legacy_history_user_index(db):
+    # Superseded by the (user_id, timestamp, _id) compound index
+    try:
+        db.search_history.drop_index("user_id_1")
+    except OperationFailure as e:
+        if e.code != INDEX_NOT_FOUND_CODE:
+            raise
+
+
+def _collapsed_history_indexes(db):
+    collapsed = db.search_history_collapsed
+    collapsed.create_index([("user_id", ASCENDING), ("artist_id", ASCENDING)], unique=True)
+    collapsed.create_index(
+        [("user_id", ASCENDING), ("last_seen", DESCENDING), ("_id", DESCENDING)]
+    )
+
+
+def _daily_rollup_indexes(db):
+    daily = db.search_history_daily
+    # $merge target key, plus per-day analytics scans
+    daily.create_index(
+        [("user_id", ASCENDING), ("artist_id", ASCENDING), ("day", ASCENDING)],
+        unique=True
+    )
+    daily.create_index([("day", ASCENDING)])
+
+
+def _auth_tokens_collection(db):
+    tokens = db.auth_tokens
+    tokens.create_index([("token_hash", ASCENDING)], unique=True)
+    # One live token per user and purpose; issuing replaces the previous one
+    tokens.create_index([("user_id", ASCENDING), ("purpose", ASCENDING)], unique=True)
+    tokens.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    
+    # Tokens no longer live on user documents. Links already sent expire
+    # within a day, so they are dropped rather than copied.
+    for name in ("verification_token_1", "reset_token_1"):
+        try:
+            db.users.drop_index(name)
+        except OperationFailure as e:
+            if e.code != INDEX_NOT_FOUND_CODE:
+                raise
+    db.users.update_many(
+        {},
+        {"$unset": {
+            "verification_token": "",
+            "verification_token_expires": "",
+            "reset_token": "",
+            "reset_token_expires": ""
+        }}
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Initial users and search_history indexes", _initial_indexes),
+    Migration(2, "Drop single-field search_history user_id index", _drop_legacy_history_user_index),
+    Migration(3, "Collapsed search history indexes", _collapsed_history_indexes),
+    Migration(4, "Daily search history rollup indexes", _daily_rollup_indexes),
+    Migration(5, "Move tokens to auth_tokens with TTL expiry", _auth_tokens_collection),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_state(db) -> dict:
+    """Return the stored schema state document (empty if never migrated)."""
+    return db.schema_meta.find_one({'_id': SCHEMA_META_ID}) or {}
+
+
+def get_applied_version(db) -> int:
+    """Highest migration version applied to the database."""
+    return get_schema_state(db).get('version', 0)
+
+
+def pending_migrations(db) -> List[Migration]:
+    """Migrations not yet applied, in order."""
+    applied = get_applied_version(db)
+    return [migration for migration in MIGRATIONS if migration.version > applied]
+
+
+def apply_migrations(db, target: Optional[int] = None) -> List[Migration]:
+    """
+    Apply pending migrations up to ``target`` (latest by default).
+    
+    The stored version is advanced after each migration, so a failure
+    leaves the database at the last migration that succeeded.
+    
+    Args:
+        db: Database handle
+        target: Stop after this version
+    
+    Returns:
+        List of applied migrations
+    """
+    applied = []
+    for migration in pending_migrations(db):
+        if target is not None and migration.version > target:
+            break
+        logger.info(f"Applying migration {migration.version}: {migration.description}")
+        migration.apply(db)
+        db.schema_meta.update_one(
+            {'_id': SCHEMA_META_ID},
+            {'$set': {'version': migration.version, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+        applied.append(migration)
+    return applied
+
+
+def sync_history_retention(db, retention_days: int) -> bool:
+    """
+    Make the ``search_history`` timestamp index match the retention setting.
+    
+    Retention is configuration rather than a schema version, so the
+    applied value is recorded separately and the index is only touched
+    when it changes. An existing index is converted in place with
+    ``collMod`` instead of being rebuilt.
+    
+    Args:
+        db: Database handle
+        retention_days: Days to keep raw events (0 keeps them forever)
+    
+    Returns:
+        True if the index was changed
+    """
+    if get_schema_state(db).get('history_retention_days', 0) == retention_days:
+        return False
+    
+    if retention_days:
+        expire_after = int(retention_days * 86400)
+        try:
+            db.search_history.create_index([("timestamp", ASCENDING)], expireAfterSeconds=expire_after)
+        except OperationFailure as e:
+            if e.code not in INDEX_CONFLICT_CODES:
+                raise
+            db.command(
+                'collMod', 'search_history',
+                index={'keyPattern': {'timestamp': 1}, 'expireAfterSeconds': expire_after}
+            )
+    else:
+        # Setting expireAfterSeconds this high effectively disables expiry in place
+        db.command(
+            'collMod', 'search_history',
+            index={'keyPattern': {'timestamp': 1}, 'expireAfterSeconds': 2147483647}
+        )
+    
+    db.schema_meta.update_one(
+        {'_id': SCHEMA_META_ID},
+        {'$set': {'history_retention_days': retention_days, 'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+    logger.info(f"search_history retention set to {retention_days or 'unlimited'} days")
+    return True
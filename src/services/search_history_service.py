@@ -0,0 +1,543 @@
+"""
+Search history service with write-behind batching.
+"""
+import atexit
+import base64
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from src.services.database_service import db_service
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Queue marker used to wake the writer thread on shutdown
+_STOP = object()
+
+# Storage modes
+MODE_EVENTS = 'events'
+MODE_COLLAPSED = 'collapsed'
+
+# Events folded (and deleted) per aggregation in fold_events
+FOLD_CHUNK_SIZE = 10000
+
+# Only the fields the profile UI renders are read back
+EVENT_PROJECTION = {
+    'search_query': 1,
+    'timestamp': 1,
+    'results.artist_id': 1,
+    'results.artist_name': 1,
+    'results.artist_url': 1
+}
+COLLAPSED_PROJECTION = {
+    'artist_id': 1,
+    'artist_name': 1,
+    'artist_url': 1,
+    'last_query': 1,
+    'last_seen': 1,
+    'search_count': 1
+}
+
+
+def encode_cursor(timestamp: datetime, doc_id: ObjectId) -> str:
+    """
+    Encode the sort key of the last item on a page as an opaque token.
+    
+    Args:
+        timestamp: Sort timestamp of the last item (millisecond precision)
+        doc_id: ``_id`` of the last item, used as a tie-breaker
+    
+    Returns:
+        URL-safe cursor string
+    """
+    millis = int(timestamp.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    raw = json.dumps({'t': millis, 'id': str(doc_id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, ObjectId]]:
+    """
+    Decode a cursor produced by ``encode_cursor``.
+    
+    Args:
+        cursor: Opaque cursor string
+    
+    Returns:
+        Tuple of (timestamp, ObjectId) or None if the cursor is invalid
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        timestamp = datetime.fromtimestamp(data['t'] / 1000, tz=timezone.utc).replace(tzinfo=None)
+        return timestamp, ObjectId(data['id'])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        return None
+
+
+class SearchHistoryService:
+    """
+    Records user searches without blocking the request.
+    
+    Records are put on a bounded in-memory queue and written by a
+    background thread with ``insert_many(ordered=False)`` once either the
+    batch size or the flush interval is reached. When the queue is full,
+    new records are dropped and counted rather than slowing down searches.
+    
+    Two storage modes are supported:
+    
+    - ``events``: one document per search in ``search_history``.
+    - ``collapsed``: one document per (user_id, artist_id) in
+      ``search_history_collapsed``, updated with ``$inc``/``$max`` and a
+      capped array of recent timestamps.
+    """
+    
+    def __init__(self):
+        self.mode = MODE_EVENTS
+        self.recent_limit = 10
+        self.batch_size = 50
+        self.flush_interval = 2.0
+        self.max_queue_size = 5000
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+    
+    def init_app(self, app):
+        """Initialize the search history service with Flask app."""
+        self.batch_size = app.config.get('SEARCH_HISTORY_BATCH_SIZE', 50)
+        self.flush_interval = app.config.get('SEARCH_HISTORY_FLUSH_INTERVAL', 2.0)
+        self.max_queue_size = app.config.get('SEARCH_HISTORY_MAX_QUEUE', 5000)
+        self.mode = app.config.get('SEARCH_HISTORY_MODE', MODE_EVENTS)
+        self.recent_limit = app.config.get('SEARCH_HISTORY_RECENT_LIMIT', 10)
+        if self.mode not in (MODE_EVENTS, MODE_COLLAPSED):
+            logger.warning(f"Unknown search history mode '{self.mode}', using '{MODE_EVENTS}'")
+            self.mode = MODE_EVENTS
+        atexit.register(self.shutdown)
+    
+    def _ensure_writer(self):
+        """Start the background writer for the current process if needed."""
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                # Queue and thread do not survive fork; start fresh
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._stop.clear()
+            self._pid = pid
+            self._thread = threading.Thread(
+                target=self._run,
+                name='search-history-writer',
+                daemon=True
+            )
+            self._thread.start()
+    
+    def record(self, user_id: str, search_query: str, artist_result: dict) -> bool:
+        """
+        Queue a search for persistence.
+        
+        Args:
+            user_id: User ID string
+            search_query: Search query string
+            artist_result: Artist result dictionary from Spotify
+        
+        Returns:
+            True if the record was queued, False if it was dropped
+        """
+        try:
+            history_doc = {
+                'user_id': ObjectId(user_id),
+                'search_query': search_query,
+                'timestamp': datetime.utcnow(),
+                'results': {
+                    'artist_id': artist_result.get('id'),
+                    'artist_name': artist_result.get('name'),
+                    'artist_url': artist_result.get('url') or artist_result.get('spotify_url')
+                }
+            }
+        except Exception as e:
+            logger.error(f"Invalid search history record: {e}")
+            metrics.increment('search_history.invalid')
+            return False
+        
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(history_doc)
+        except queue.Full:
+            metrics.increment('search_history.dropped')
+            return False
+        
+        metrics.increment('search_history.queued')
+        metrics.set_gauge('search_history.queue_depth', self._queue.qsize())
+        return True
+    
+    def _run(self):
+        """Background loop: collect a batch by size or time and write it."""
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+    
+    def _collect_batch(self) -> List[dict]:
+        """Block until a batch is full or the flush interval elapses."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                break
+            batch.append(item)
+        return batch
+    
+    def _write(self, batch: List[dict]):
+        """Persist a batch of history records using the configured mode."""
+        if self.mode == MODE_COLLAPSED:
+            self._write_collapsed(batch)
+        else:
+            self._write_events(batch)
+    
+    def _write_events(self, batch: List[dict]):
+        """Insert one document per search."""
+        collection = db_service.get_search_history_collection()
+        if collection is None:
+            metrics.increment('search_history.dropped', len(batch))
+            logger.warning("Search history collection not available")
+            return
+        
+        try:
+            with metrics.timer('search_history.flush_ms'):
+                collection.insert_many(batch, ordered=False)
+            metrics.increment('search_history.written', len(batch))
+        except BulkWriteError as e:
+            failed = len(e.details.get('writeErrors', []))
+            metrics.increment('search_history.written', len(batch) - failed)
+            metrics.increment('search_history.failed', failed)
+            logger.error(f"Partial failure writing search history: {failed} of {len(batch)} records")
+        except PyMongoError as e:
+            metrics.increment('search_history.failed', len(batch))
+            logger.error(f"Error saving search history: {e}")
+    
+    def _write_collapsed(self, batch: List[dict]):
+        """Fold the batch into one counted upsert per (user_id, artist_id)."""
+        collection = db_service.get_search_history_collapsed_collection()
+        if collection is None:
+            metrics.increment('search_history.dropped', len(batch))
+            logger.warning("Search history collection not available")
+            return
+        
+        operations = self.build_collapsed_updates(batch, self.recent_limit)
+        try:
+            with metrics.timer('search_history.flush_ms'):
+                collection.bulk_write(operations, ordered=False)
+            metrics.increment('search_history.written', len(batch))
+            metrics.increment('search_history.upserts', len(operations))
+        except BulkWriteError as e:
+            failed = len(e.details.get('writeErrors', []))
+            metrics.increment('search_history.failed', failed)
+            logger.error(f"Partial failure writing search history: {failed} of {len(operations)} upserts")
+        except PyMongoError as e:
+            metrics.increment('search_history.failed', len(batch))
+            logger.error(f"Error saving search history: {e}")
+    
+    @staticmethod
+    def build_collapsed_updates(batch: List[dict], recent_limit: int) -> List[UpdateOne]:
+        """
+        Group search records by (user_id, artist_id) into upserts.
+        
+        Legacy records without a Spotify id are keyed by artist name.
+        
+        Args:
+            batch: Search history documents in event form
+            recent_limit: Maximum number of recent timestamps to keep
+        
+        Returns:
+            List of UpdateOne operations
+        """
+        groups = {}
+        for doc in batch:
+            results = doc.get('results') or {}
+            artist_id = results.get('artist_id') or results.get('artist_name')
+            key = (doc['user_id'], artist_id)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = group = {'count': 0, 'timestamps': [], 'latest': doc}
+            group['count'] += 1
+            group['timestamps'].append(doc['timestamp'])
+            if doc['timestamp'] >= group['latest']['timestamp']:
+                group['latest'] = doc
+        
+        operations = []
+        for (user_id, artist_id), group in groups.items():
+            latest = group['latest']
+            timestamps = sorted(group['timestamps'])[-recent_limit:]
+            operations.append(UpdateOne(
+                {'user_id': user_id, 'artist_id': artist_id},
+                {
+                    '$inc': {'search_count': group['count']},
+                    '$min': {'first_seen': timestamps[0]},
+                    '$max': {'last_seen': timestamps[-1]},
+                    '$set': {
+                        'artist_name': latest['results'].get('artist_name'),
+                        'artist_url': latest['results'].get('artist_url'),
+                        'last_query': latest.get('search_query')
+                    },
+                    '$push': {
+                        'recent_timestamps': {'$each': timestamps, '$slice': -recent_limit}
+                    }
+                },
+                upsert=True
+            ))
+        return operations
+    
+    def fold_events(self, cutoff: datetime, delete_source: bool = True) -> int:
+        """
+        Fold event documents older than ``cutoff`` into the collapsed collection.
+        
+        Runs server-side with an aggregation pipeline ending in ``$merge``,
+        so existing collapsed documents are combined rather than replaced.
+        Folded events are deleted afterwards unless ``delete_source`` is
+        False (running the fold twice over the same events double counts).
+        
+        The write-behind queue inserts events up to a flush interval after
+        their timestamp, so ``cutoff`` is clamped to two flush intervals
+        ago, and each chunk of events is selected by ``_id`` before it is
+        folded. Only those exact documents are folded and deleted, so an
+        event inserted while the fold runs is left for the next run.
+        
+        Args:
+            cutoff: Only events with a timestamp before this are folded
+            delete_source: Delete the folded events from ``search_history``
+        
+        Returns:
+            Number of event documents folded
+        """
+        source = db_service.get_search_history_collection()
+        target = db_service.get_search_history_collapsed_collection()
+        if source is None or target is None:
+            raise RuntimeError("Database not available")
+        
+        cutoff = min(cutoff, datetime.utcnow() - timedelta(seconds=2 * self.flush_interval))
+        folded = 0
+        last_id = None
+        while True:
+            match = {'timestamp': {'$lt': cutoff}}
+            if last_id is not None:
+                match['_id'] = {'$gt': last_id}
+            ids = [doc['_id'] for doc in source.find(match, {'_id': 1}).sort('_id', ASCENDING).limit(FOLD_CHUNK_SIZE)]
+            if not ids:
+                break
+            self._fold_chunk(source, target, ids)
+            if delete_source:
+                source.delete_many({'_id': {'$in': ids}})
+            folded += len(ids)
+            last_id = ids[-1]
+        
+        if folded:
+            logger.info(f"Folded {folded} search history events into {target.name}")
+        return folded
+    
+    def _fold_chunk(self, source, target, ids: List[ObjectId]):
+        """Merge the events with the given ``_id``s into the collapsed collection."""
+        limit = self.recent_limit
+        pipeline = [
+            {'$match': {'_id': {'$in': ids}}},
+            {'$group': {
+                '_id': {
+                    'user_id': '$user_id',
+                    'artist_id': {'$ifNull': ['$results.artist_id', '$results.artist_name']}
+                },
+                'search_count': {'$sum': 1},
+                'first_seen': {'$min': '$timestamp'},
+                'last_seen': {'$max': '$timestamp'},
+                'artist_name': {'$bottom': {'sortBy': {'timestamp': 1}, 'output': '$results.artist_name'}},
+                'artist_url': {'$bottom': {'sortBy': {'timestamp': 1}, 'output': '$results.artist_url'}},
+                'last_query': {'$bottom': {'sortBy': {'timestamp': 1}, 'output': '$search_query'}},
+                'recent_timestamps': {'$bottomN': {'n': limit, 'sortBy': {'timestamp': 1}, 'output': '$timestamp'}}
+            }},
+            {'$project': {
+                '_id': 0,
+                'user_id': '$_id.user_id',
+                'artist_id': '$_id.artist_id',
+                'search_count': 1,
+                'first_seen': 1,
+                'last_seen': 1,
+                'artist_name': 1,
+                'artist_url': 1,
+                'last_query': 1,
+                'recent_timestamps': 1
+            }},
+            {'$merge': {
+                'into': target.name,
+                'on': ['user_id', 'artist_id'],
+                'whenMatched': [{'$set': {
+                    'search_count': {'$add': ['$search_count', '$$new.search_count']},
+                    'first_seen': {'$min': ['$first_seen', '$$new.first_seen']},
+                    'last_seen': {'$max': ['$last_seen', '$$new.last_seen']},
+                    'recent_timestamps': {'$slice': [
+                        {'$sortArray': {
+                            'input': {'$concatArrays': [
+                                {'$ifNull': ['$recent_timestamps', []]},
+                                '$$new.recent_timestamps'
+                            ]},
+                            'sortBy': 1
+                        }},
+                        -limit
+                    ]},
+                    # Existing documents are newer unless the folded events say otherwise
+                    'artist_name': {'$cond': [{'$gt': ['$$new.last_seen', '$last_seen']}, '$$new.artist_name', '$artist_name']},
+                    'artist_url': {'$cond': [{'$gt': ['$$new.last_seen', '$last_seen']}, '$$new.artist_url', '$artist_url']},
+                    'last_query': {'$cond': [{'$gt': ['$$new.last_seen', '$last_seen']}, '$$new.last_query', '$last_query']}
+                }}],
+                'whenNotMatched': 'insert'
+            }}
+        ]
+        source.aggregate(pipeline, allowDiskUse=True)
+    
+    def get_history(
+        self,
+        user_id: str,
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> Tuple[Optional[dict], Optional[str]]:
+        """
+        Read one page of a user's search history, newest first.
+        
+        Pages are addressed with keyset cursors on (timestamp, _id) backed
+        by the (user_id, timestamp desc, _id desc) index, so every page
+        costs the same regardless of how deep it is. Searches still in the
+        write-behind queue appear once flushed.
+        
+        Args:
+            user_id: User ID string
+            cursor: Cursor returned as ``next_cursor`` by the previous page
+            limit: Page size
+        
+        Returns:
+            Tuple of ({"items": [...], "next_cursor": str or None}, error_message)
+        """
+        if self.mode == MODE_COLLAPSED:
+            collection = db_service.get_search_history_collapsed_collection()
+            sort_field, projection = 'last_seen', COLLAPSED_PROJECTION
+        else:
+            collection = db_service.get_search_history_collection()
+            sort_field, projection = 'timestamp', EVENT_PROJECTION
+        
+        if collection is None:
+            return None, "Database not available"
+        
+        try:
+            query = {'user_id': ObjectId(user_id)}
+        except (InvalidId, TypeError):
+            return None, "Invalid user"
+        
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None:
+                return None, "Invalid cursor"
+            last_seen, last_id = position
+            query['$or'] = [
+                {sort_field: {'$lt': last_seen}},
+                {sort_field: last_seen, '_id': {'$lt': last_id}}
+            ]
+        
+        # Fetch one extra document to know whether another page exists
+        docs = list(
+            collection.find(query, projection)
+            .sort([(sort_field, DESCENDING), ('_id', DESCENDING)])
+            .limit(limit + 1)
+        )
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        
+        next_cursor = None
+        if has_more and docs:
+            next_cursor = encode_cursor(docs[-1][sort_field], docs[-1]['_id'])
+        
+        if self.mode == MODE_COLLAPSED:
+            items = [self._collapsed_item(doc) for doc in docs]
+        else:
+            items = [self._event_item(doc) for doc in docs]
+        
+        return {'items': items, 'next_cursor': next_cursor}, None
+    
+    @staticmethod
+    def _event_item(doc: dict) -> dict:
+        """Shape an event document for the API."""
+        results = doc.get('results') or {}
+        return {
+            'query': doc.get('search_query'),
+            'artist_id': results.get('artist_id'),
+            'artist_name': results.get('artist_name'),
+            'artist_url': results.get('artist_url'),
+            'searched_at': doc['timestamp'].isoformat() if doc.get('timestamp') else None
+        }
+    
+    @staticmethod
+    def _collapsed_item(doc: dict) -> dict:
+        """Shape a collapsed document for the API."""
+        return {
+            'query': doc.get('last_query'),
+            'artist_id': doc.get('artist_id'),
+            'artist_name': doc.get('artist_name'),
+            'artist_url': doc.get('artist_url'),
+            'searched_at': doc['last_seen'].isoformat() if doc.get('last_seen') else None,
+            'search_count': doc.get('search_count', 1)
+        }
+    
+    def flush(self):
+        """Write every queued record synchronously."""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+    
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the writer thread and flush what is left in the queue."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        
+        self._stop.set()
+        try:
+            self._queue.put_nowait(_STOP)
+        except queue.Full:
+            pass  # The writer is busy draining and will see the stop flag
+        self._thread.join(timeout)
+        self.flush()
+        logger.info("Search history writer stopped")
+
+
+# Global search history service instance
+search_history_service = SearchHistoryService()
@@ -0,0 +1,278 @@
+"""
+Server-side sessions stored in a local SQLite database.
+
+The cookie carries only an opaque random session ID. Session data is
+encoded compactly and kept in SQLite (WAL mode, shared by every worker on
+the host). Sessions load lazily: a request that never touches ``session``
+never reads the store. They are written back only when modified, or when
+a sliding expiry needs extending.
+"""
+import json
+import logging
+import marshal
+import os
+import re
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from flask.sessions import SessionInterface, SessionMixin
+
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SID_PATTERN = re.compile(r'[A-Za-z0-9_-]{43}')
+
+# Encoded payloads start with a format byte
+FORMAT_MARSHAL = b'm'
+FORMAT_JSON = b'j'
+
+
+def encode_session(data: dict) -> bytes:
+    """
+    Encode session data.
+    
+    ``marshal`` is compact and fast for the plain dicts, lists and strings
+    sessions hold, and is safe here because payloads never leave the
+    server. Anything it cannot encode falls back to JSON.
+    """
+    try:
+        return FORMAT_MARSHAL + marshal.dumps(data)
+    except ValueError:
+        return FORMAT_JSON + json.dumps(data, default=str).encode('utf-8')
+
+
+def decode_session(payload: bytes) -> dict:
+    """Decode session data written by ``encode_session``."""
+    fmt, body = payload[:1], payload[1:]
+    if fmt == FORMAT_MARSHAL:
+        return marshal.loads(body)
+    if fmt == FORMAT_JSON:
+        return json.loads(body)
+    raise ValueError(f"Unknown session format {fmt!r}")
+
+
+class SQLiteSessionStore:
+    """
+    Session payloads keyed by session ID with an absolute expiry.
+    
+    Each thread uses its own connection, recreated after fork.
+    """
+    
+    def __init__(self, path: str, purge_interval: int = 300):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)'
+        )
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Connection for the current thread and process."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL with NORMAL sync only risks the last commits on power loss
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+    
+    def load(self, sid: str) -> Tuple[Optional[dict], float]:
+        """
+        Load a session.
+        
+        Returns:
+            Tuple of (data, expires_at); data is None if missing, expired or unreadable
+        """
+        row = self._connect().execute(
+            'SELECT data, expires_at FROM sessions WHERE id = ?', (sid,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None, 0.0
+        try:
+            return decode_session(row[0]), row[1]
+        except (ValueError, EOFError, TypeError) as e:
+            logger.warning(f"Discarding unreadable session: {e}")
+            return None, 0.0
+    
+    def save(self, sid: str, data: dict, expires_at: float):
+        """Insert or replace a session."""
+        self._connect().execute(
+            'INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)',
+            (sid, encode_session(data), expires_at)
+        )
+        self._maybe_purge()
+    
+    def touch(self, sid: str, expires_at: float):
+        """Extend a session's expiry without rewriting its data."""
+        self._connect().execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (expires_at, sid))
+    
+    def delete(self, sid: str):
+        """Remove a session."""
+        self._connect().execute('DELETE FROM sessions WHERE id = ?', (sid,))
+    
+    def _maybe_purge(self):
+        """Delete expired sessions at most once per purge interval."""
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self._connect().execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+
+
+class ServerSideSession(SessionMixin):
+    """
+    Session whose data is loaded from the store on first access.
+    
+    ``clear()`` also rotates the session ID when the session is saved,
+    so a login (which clears the session first) never reuses an ID that
+    existed before authentication.
+    """
+    
+    def __init__(self, sid: Optional[str] = None, loader: Optional[Callable] = None):
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.rotate = False
+        self.expires_at = 0.0
+        self._loader = loader
+        self._data: Optional[dict] = None if loader else {}
+    
+    @property
+    def loaded(self) -> bool:
+        """True once the data has been read (or the session was replaced)."""
+        return self._data is not None
+    
+    def _load(self) -> dict:
+        self.accessed = True
+        if self._data is None:
+            data, self.expires_at = self._loader()
+            metrics.increment('session.loads')
+            if data is None:
+                # Unknown or expired ID: start over with a fresh one
+                self.rotate = True
+            self._data = data or {}
+        return self._data
+    
+    def __getitem__(self, key):
+        return self._load()[key]
+    
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+    
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+    
+    def __iter__(self):
+        return iter(self._load())
+    
+    def __len__(self):
+        return len(self._load())
+    
+    def clear(self):
+        """Drop all data and rotate the ID on save."""
+        self.accessed = True
+        self.modified = True
+        self.rotate = True
+        self._data = {}
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """
+    Flask session interface backed by ``SQLiteSessionStore``.
+    """
+    
+    def __init__(self, store: SQLiteSessionStore):
+        self.store = store
+    
+    def open_session(self, app, request) -> ServerSideSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and SID_PATTERN.fullmatch(sid):
+            return ServerSideSession(sid, lambda: self.store.load(sid))
+        return ServerSideSession()
+    
+    def save_session(self, app, session: ServerSideSession, response):
+        if not session.loaded:
+            # The request never touched the session
+            return
+        
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        
+        if session.accessed:
+            response.vary.add('Cookie')
+        
+        if not session:
+            if session.modified and session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure,
+                    samesite=samesite, httponly=httponly
+                )
+            return
+        
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        expires_at = now + lifetime
+        
+        if session.modified or session.rotate or session.sid is None:
+            if session.rotate or session.sid is None:
+                if session.sid:
+                    self.store.delete(session.sid)
+                session.sid = secrets.token_urlsafe(32)
+            self.store.save(session.sid, dict(session), expires_at)
+            metrics.increment('session.saves')
+        elif session.expires_at - now < lifetime / 2 and self.should_set_cookie(app, session):
+            # Sliding expiry, extended at most once per half lifetime
+            self.store.touch(session.sid, expires_at)
+        else:
+            return
+        
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite
+        )
+
+
+def init_session_store(app):
+    """
+    Install server-side sessions unless ``SESSION_STORE`` is ``cookie``.
+    
+    Args:
+        app: Flask application instance
+    """
+    if app.config.get('SESSION_STORE', 'sqlite') != 'sqlite':
+        return
+    
+    path = app.config.get('SESSION_DB_PATH')
+    if not path:
+        base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        path = os.path.join(base, 'octa-music-sessions.db')
+    try:
+        app.session_interface = SQLiteSessionInterface(SQLiteSessionStore(path))
+        logger.info(f"Server-side sessions stored in {path}")
+    except sqlite3.Error as e:
+        logger.warning(f"Falling back to cookie sessions, cannot open {path}: {e}")
@@ -19,6 +19,27 @@ class SpotifyService:
         auth_manager = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret)
         self.sp = spotipy.Spotify(auth_manager=auth_manager)
 
+    def check_token(self):
+        """Check that a valid client-credentials token is available.
+        
+        Uses the cached token while it is valid and only contacts Spotify
+        to fetch a new one when it has expired, which also keeps the token
+        warm for searches.
+        
+        Returns:
+            tuple: (ok, error_message)
+        """
+        auth_manager = self.sp.auth_manager
+        token = auth_manager.cache_handler.get_cached_token()
+        if token and not auth_manager.is_token_expired(token):
+            return True, None
+        
+        try:
+            auth_manager.get_access_token(as_dict=False)
+            return True, None
+        except Exception as e:
+            return False, str(e)
+
     def search_artist(self, artist_name):
         """Search for an artist on Spotify.
         
@@ -41,6 +62,7 @@ class SpotifyService:
             if results and results.get('artists') and results['artists'].get('items'):
                 a = results['artists']['items'][0]
                 return {
+                    'id': a.get('id'),
                     'name': a['name'],
                     'followers': f"{a['followers']['total']:,}",
                     'popularity': a['popularity'],
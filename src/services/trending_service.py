@@ -0,0 +1,298 @@
+"""
+Trending artists service.
+
+Counts artist searches in-process with a count-min sketch per time bucket
+over a sliding window and keeps a small top-K candidate set. A background
+thread in each worker periodically publishes its candidates to a shared
+snapshot directory and merges the snapshots of every live worker, so
+``get_trending`` returns a precomputed list in constant time and request
+threads never touch the snapshot directory.
+"""
+import hashlib
+import heapq
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Optional, List, Dict, Tuple
+
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CountMinSketch:
+    """
+    Fixed-size frequency estimator.
+    
+    Estimates never undercount; overcounts are bounded by the sketch
+    width. Hashing is deterministic across processes.
+    """
+    
+    def __init__(self, width: int = 1024, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array('q', [0]) * width for _ in range(depth)]
+    
+    def indexes(self, key: str) -> List[int]:
+        """Column index of ``key`` in each row."""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * self.depth).digest()
+        return [
+            int.from_bytes(digest[i * 4:(i + 1) * 4], 'little') % self.width
+            for i in range(self.depth)
+        ]
+    
+    def add(self, key: str, count: int = 1, indexes: Optional[List[int]] = None):
+        """Add ``count`` occurrences of ``key``."""
+        for row, column in zip(self.rows, indexes or self.indexes(key)):
+            row[column] += count
+    
+    def estimate(self, key: str, indexes: Optional[List[int]] = None) -> int:
+        """Estimated number of occurrences of ``key``."""
+        return min(row[column] for row, column in zip(self.rows, indexes or self.indexes(key)))
+
+
+class SlidingTopK:
+    """
+    Heavy-hitter tracker over a sliding time window.
+    
+    The window is split into ``bucket_count`` buckets, each with its own
+    sketch; expired buckets are dropped whole. A candidate set a few times
+    larger than ``top_k`` keeps the current heavy hitters.
+    """
+    
+    def __init__(
+        self,
+        window_seconds: int = 3600,
+        bucket_count: int = 12,
+        top_k: int = 10,
+        width: int = 1024,
+        depth: int = 4
+    ):
+        self.bucket_seconds = max(1, window_seconds // bucket_count)
+        self.bucket_count = bucket_count
+        self.top_k = top_k
+        self.capacity = top_k * 4
+        self.width = width
+        self.depth = depth
+        self._buckets: deque = deque()
+        self._candidates: Dict[str, int] = {}
+    
+    def _rotate(self, now: float):
+        """Start a new bucket if needed and expire buckets outside the window."""
+        epoch = int(now // self.bucket_seconds)
+        if not self._buckets or self._buckets[-1][0] != epoch:
+            self._buckets.append((epoch, CountMinSketch(self.width, self.depth)))
+        
+        expired = False
+        while self._buckets and self._buckets[0][0] <= epoch - self.bucket_count:
+            self._buckets.popleft()
+            expired = True
+        
+        if expired:
+            # Counts dropped with the expired buckets; re-rank candidates
+            refreshed = {key: self._window_estimate(key) for key in self._candidates}
+            self._candidates = {key: count for key, count in refreshed.items() if count > 0}
+    
+    def _window_estimate(self, key: str, indexes: Optional[List[int]] = None) -> int:
+        """Estimated count of ``key`` across all live buckets."""
+        if indexes is None and self._buckets:
+            indexes = self._buckets[-1][1].indexes(key)
+        return sum(sketch.estimate(key, indexes) for _, sketch in self._buckets)
+    
+    def add(self, key: str, now: Optional[float] = None) -> int:
+        """
+        Count one occurrence of ``key``.
+        
+        Returns:
+            Estimated count of ``key`` in the window
+        """
+        self._rotate(now if now is not None else time.time())
+        sketch = self._buckets[-1][1]
+        indexes = sketch.indexes(key)
+        sketch.add(key, 1, indexes)
+        estimate = self._window_estimate(key, indexes)
+        
+        if key in self._candidates or len(self._candidates) < self.capacity:
+            self._candidates[key] = estimate
+        else:
+            weakest = min(self._candidates, key=self._candidates.get)
+            if estimate > self._candidates[weakest]:
+                del self._candidates[weakest]
+                self._candidates[key] = estimate
+        return estimate
+    
+    def top(self, n: Optional[int] = None, now: Optional[float] = None) -> List[Tuple[str, int]]:
+        """Heaviest keys in the window as (key, estimate), highest first."""
+        self._rotate(now if now is not None else time.time())
+        return heapq.nlargest(n or self.capacity, self._candidates.items(), key=lambda item: item[1])
+
+
+class TrendingService:
+    """
+    Service for the global "trending now" artist list.
+    """
+    
+    def __init__(self):
+        self.top_k = 10
+        self.merge_interval = 15
+        self.window_seconds = 3600
+        self.snapshot_dir = None
+        self._counter = SlidingTopK()
+        self._names: Dict[str, str] = {}
+        self._merged: List[dict] = []
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+    
+    def init_app(self, app):
+        """Initialize the trending service with Flask app."""
+        self.top_k = app.config.get('TRENDING_TOP_K', 10)
+        self.merge_interval = app.config.get('TRENDING_MERGE_INTERVAL', 15)
+        self.window_seconds = app.config.get('TRENDING_WINDOW_SECONDS', 3600)
+        self._counter = SlidingTopK(
+            window_seconds=self.window_seconds,
+            bucket_count=app.config.get('TRENDING_BUCKETS', 12),
+            top_k=self.top_k
+        )
+        snapshot_dir = app.config.get('TRENDING_SNAPSHOT_DIR')
+        if not snapshot_dir:
+            base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+            snapshot_dir = os.path.join(base, 'octa-music-trending')
+        self.snapshot_dir = snapshot_dir
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Trending snapshots disabled, cannot create {self.snapshot_dir}: {e}")
+            self.snapshot_dir = None
+    
+    def record(self, artist: Optional[dict]):
+        """
+        Count a successful artist search.
+        
+        Args:
+            artist: Artist result dictionary from Spotify
+        """
+        if not artist:
+            return
+        key = artist.get('id') or artist.get('name')
+        if not key:
+            return
+        
+        with self._lock:
+            self._counter.add(key)
+            if len(self._names) > self._counter.capacity * 4:
+                # Keep display names only for current candidates
+                candidates = [k for k, _ in self._counter.top()]
+                self._names = {k: self._names[k] for k in candidates if k in self._names}
+            self._names[key] = artist.get('name') or key
+        metrics.increment('trending.recorded')
+    
+    def get_trending(self, limit: Optional[int] = None) -> List[dict]:
+        """
+        Current trending artists across all workers.
+        
+        Args:
+            limit: Maximum number of artists (defaults to ``TRENDING_TOP_K``)
+        
+        Returns:
+            List of {"artist_id", "artist_name", "score"} dictionaries
+        """
+        return self._merged[:limit or self.top_k]
+    
+    def start(self):
+        """Start the background merger for the current process (idempotent)."""
+        pid = os.getpid()
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='trending-merger', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop the background merger."""
+        self._stop.set()
+    
+    def _run(self):
+        """Merge snapshots, then sleep until the next merge interval."""
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                logger.warning(f"Trending merge failed: {e}")
+            self._stop.wait(self.merge_interval)
+    
+    def sync(self, now: Optional[float] = None):
+        """Publish this worker's candidates and merge every live snapshot."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            local = [
+                {'artist_id': key, 'artist_name': self._names.get(key, key), 'score': count}
+                for key, count in self._counter.top(now=now)
+            ]
+        
+        snapshots = [local]
+        if self.snapshot_dir:
+            self._write_snapshot(local, now)
+            snapshots = self._read_snapshots(now)
+        
+        totals: Dict[str, dict] = {}
+        for entries in snapshots:
+            for entry in entries:
+                merged = totals.setdefault(entry['artist_id'], {
+                    'artist_id': entry['artist_id'],
+                    'artist_name': entry['artist_name'],
+                    'score': 0
+                })
+                merged['score'] += entry['score']
+        
+        self._merged = heapq.nlargest(self.top_k, totals.values(), key=lambda entry: entry['score'])
+        metrics.increment('trending.merges')
+    
+    def _write_snapshot(self, entries: List[dict], now: float):
+        """Atomically replace this worker's snapshot file."""
+        path = os.path.join(self.snapshot_dir, f"worker-{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                json.dump({'written_at': now, 'entries': entries}, fh)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write trending snapshot: {e}")
+    
+    def _read_snapshots(self, now: float) -> List[List[dict]]:
+        """Load snapshots of every worker that published within the window."""
+        # A worker that stopped publishing still holds valid counts until they age out
+        max_age = self.window_seconds
+        snapshots = []
+        try:
+            names = os.listdir(self.snapshot_dir)
+        except OSError:
+            return snapshots
+        
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.snapshot_dir, name)
+            try:
+                if now - os.stat(path).st_mtime > max_age:
+                    # Everything in it has left the window; drop it unread
+                    os.remove(path)
+                    continue
+                with open(path, 'r', encoding='utf-8') as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            snapshots.append(data.get('entries', []))
+        return snapshots
+
+
+# Global trending service instance
+trending_service = TrendingService()
@@ -0,0 +1,116 @@
+"""
+Read-through cache of User objects.
+
+Session checks and profile reads look users up by ID on almost every
+request. This cache keeps recently used users in a bounded, per-process
+LRU with a short TTL. Writers call ``invalidate`` after changing a user;
+the change is published through a shared version stamp so every worker
+drops its copy on the next read.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from src.user_models.user_model import User
+from src.utils.metrics import metrics
+from src.utils.version_stamps import VersionStampTable
+
+logger = logging.getLogger(__name__)
+
+
+class UserCacheService:
+    """
+    Service for caching users by ID across requests.
+    """
+    
+    def __init__(self):
+        self.max_size = 1024
+        self.ttl = 60.0
+        self.stamps = VersionStampTable()
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        """Initialize the user cache with Flask app."""
+        self.max_size = app.config.get('USER_CACHE_SIZE', 1024)
+        self.ttl = app.config.get('USER_CACHE_TTL', 60)
+        stamp_path = app.config.get('USER_CACHE_STAMP_PATH')
+        if not stamp_path:
+            base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+            stamp_path = os.path.join(base, 'octa-music-user-stamps')
+        self.stamps = VersionStampTable(stamp_path)
+        self.clear()
+    
+    def get(self, user_id: str, loader: Callable[[str], Optional[User]]) -> Optional[User]:
+        """
+        Return the user with ``user_id``, loading it on a miss.
+        
+        The version stamp is read before loading, so a write that lands
+        while the load is in flight invalidates the entry it produces.
+        
+        Args:
+            user_id: User ID string
+            loader: Called with ``user_id`` on a miss; returns a User or None
+        
+        Returns:
+            User object or None
+        """
+        if not self.max_size:
+            return loader(user_id)
+        
+        version = self.stamps.get(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                user, entry_version, expires_at = entry
+                if entry_version == version and expires_at > now:
+                    self._entries.move_to_end(user_id)
+                    metrics.increment('user_cache.hits')
+                    return user
+                del self._entries[user_id]
+        
+        metrics.increment('user_cache.misses')
+        user = loader(user_id)
+        if user is None:
+            # Not cached: a user created later must not be hidden
+            return None
+        
+        with self._lock:
+            self._entries[user_id] = (user, version, now + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return user
+    
+    def invalidate(self, user_id) -> None:
+        """
+        Drop a user from every worker's cache.
+        
+        Call after the database write has been acknowledged.
+        
+        Args:
+            user_id: User ID (string or ObjectId)
+        """
+        user_id = str(user_id)
+        self.stamps.bump(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+        metrics.increment('user_cache.invalidations')
+    
+    def version(self, user_id) -> int:
+        """Current version stamp of a user."""
+        return self.stamps.get(str(user_id))
+    
+    def clear(self):
+        """Drop every cached user in this process."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global user cache service instance
+user_cache_service = UserCacheService()
@@ -11,6 +11,24 @@ def format_number(num_str):
     except (ValueError, TypeError):
         return num_str
 
+def check_reachability(timeout=5):
+    """Check that the YouTube Data API host is reachable.
+    
+    Sends an unauthenticated HEAD request, so it uses no API quota; any
+    HTTP response counts as reachable.
+    
+    Args:
+        timeout: Request timeout in seconds
+        
+    Returns:
+        tuple: (ok, error_message)
+    """
+    try:
+        requests.head("https://www.googleapis.com/youtube/v3/", timeout=timeout)
+        return True, None
+    except requests.RequestException as e:
+        return False, str(e)
+
 def get_top_video_quick(channel_id, api_key):
     """Get the top video by view count for a channel.
     
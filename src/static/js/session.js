@@ -6,12 +6,21 @@
 // Session timeout configuration (in milliseconds)
 const SESSION_TIMEOUT = 80 * 60 * 1000; // 80 minutes
 const WARNING_TIME = 70 * 60 * 1000; // 70 minutes (10 min before timeout)
-const CHECK_INTERVAL = 5 * 60 * 1000; // Check every 5 minutes
+// Server checks start at MIN_CHECK_INTERVAL and double while nothing
+// changes (304 responses), up to MAX_CHECK_INTERVAL
+const MIN_CHECK_INTERVAL = 2 * 60 * 1000; // 2 minutes
+const MAX_CHECK_INTERVAL = 15 * 60 * 1000; // 15 minutes
 
 let sessionStartTime = null;
 let sessionCheckInterval = null;
+let checkDelay = MIN_CHECK_INTERVAL;
 let warningShown = false;
 
+// Last session-check answer, reused when the server replies 304
+let sessionEtag = null;
+let sessionAuthenticated = false;
+let sessionCheckInFlight = null;
+
 // Initialize session monitoring
 function initSessionMonitoring() {
   // Check if user is authenticated
@@ -24,18 +33,40 @@ function initSessionMonitoring() {
 }
 
 // Check session validity
-async function checkSession() {
+function checkSession() {
+  // Concurrent callers (navbar and monitoring on page load) share one request
+  if (!sessionCheckInFlight) {
+    sessionCheckInFlight = fetchSessionState().finally(() => {
+      sessionCheckInFlight = null;
+    });
+  }
+  return sessionCheckInFlight;
+}
+
+// Revalidate the session with the server, reusing the last answer on 304
+async function fetchSessionState() {
+  const headers = { 'Content-Type': 'application/json' };
+  if (sessionEtag) {
+    headers['If-None-Match'] = sessionEtag;
+  }
+
   try {
+    // Revalidation is handled here, so bypass the HTTP cache
     const response = await fetch('/api/auth/session-check', {
       method: 'GET',
-      headers: {
-        'Content-Type': 'application/json'
-      }
+      headers: headers,
+      cache: 'no-store'
     });
 
+    if (response.status === 304) {
+      return sessionAuthenticated;
+    }
+
     if (response.ok) {
       const data = await response.json();
-      return data.authenticated || false;
+      sessionEtag = response.headers.get('ETag');
+      sessionAuthenticated = data.authenticated || false;
+      return sessionAuthenticated;
     }
     return false;
   } catch (error) {
@@ -64,14 +95,42 @@ function startSessionChecks() {
     }
   }, 60 * 1000); // Check every minute
 
-  // Verify session with server every 5 minutes
-  sessionCheckInterval = setInterval(async () => {
+  scheduleServerCheck();
+
+  // Check as soon as a hidden tab becomes visible again
+  document.addEventListener('visibilitychange', () => {
+    if (!document.hidden && sessionStartTime) {
+      checkDelay = MIN_CHECK_INTERVAL;
+      scheduleServerCheck(0);
+    }
+  });
+}
+
+// Verify the session with the server, backing off while nothing changes
+function scheduleServerCheck(delay = checkDelay) {
+  if (sessionCheckInterval) {
+    clearTimeout(sessionCheckInterval);
+  }
+
+  sessionCheckInterval = setTimeout(async () => {
+    if (document.hidden) {
+      // Paused until the tab is visible again
+      return;
+    }
+
+    const previousEtag = sessionEtag;
     const isAuthenticated = await checkSession();
-    
+
     if (!isAuthenticated && window.location.pathname !== '/login' && window.location.pathname !== '/register') {
       handleSessionExpired();
+      return;
     }
-  }, CHECK_INTERVAL);
+
+    checkDelay = sessionEtag === previousEtag
+      ? Math.min(checkDelay * 2, MAX_CHECK_INTERVAL)
+      : MIN_CHECK_INTERVAL;
+    scheduleServerCheck();
+  }, delay);
 }
 
 // Show session warning (10 minutes before timeout)
@@ -85,7 +144,7 @@ function showSessionWarning() {
 function handleSessionExpired() {
   // Clear intervals
   if (sessionCheckInterval) {
-    clearInterval(sessionCheckInterval);
+    clearTimeout(sessionCheckInterval);
   }
   
   // Show expiration message
@@ -163,7 +222,7 @@ async function handleLogout(e) {
       
       // Clear session monitoring
       if (sessionCheckInterval) {
-        clearInterval(sessionCheckInterval);
+        clearTimeout(sessionCheckInterval);
       }
       sessionStartTime = null;
       warningShown = false;
@@ -11,13 +11,27 @@ class User:
     """
     User model for authentication and profile management.
     Represents a user document in MongoDB.
+    
+    Users loaded with a field projection are partially hydrated: fields
+    outside the projection keep their defaults (usually None).
     """
     
+    __slots__ = (
+        '_id', 'username', 'email', 'password_hash', 'email_verified',
+        'verification_token', 'verification_token_expires', 'reset_token',
+        'reset_token_expires', 'created_at', 'last_login',
+        'failed_login_attempts', 'lockout_until'
+    )
+    
+    # Lock the account for LOCKOUT_MINUTES after MAX_FAILED_ATTEMPTS failures
+    MAX_FAILED_ATTEMPTS = 5
+    LOCKOUT_MINUTES = 15
+    
     def __init__(
         self,
-        username: str,
-        email: str,
-        password_hash: str,
+        username: Optional[str],
+        email: Optional[str],
+        password_hash: Optional[str],
         _id: Optional[ObjectId] = None,
         email_verified: bool = False,
         verification_token: Optional[str] = None,
@@ -44,27 +58,38 @@ class User:
         self.lockout_until = lockout_until
     
     @staticmethod
-    def hash_password(password: str) -> str:
-        """Hash a password using bcrypt with salt rounds = 12."""
-        salt = bcrypt.gensalt(rounds=12)
+    def hash_password(password: str, rounds: int = 12) -> str:
+        """Hash a password using bcrypt with the given cost (log2 rounds)."""
+        salt = bcrypt.gensalt(rounds=rounds)
         return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
     
     @staticmethod
-    def verify_password(password: str, password_hash: str) -> bool:
+    def get_hash_cost(password_hash: Optional[str]) -> Optional[int]:
+        """Cost stored in a bcrypt hash (``$2b$<cost>$...``), or None if unparseable."""
+        try:
+            return int(password_hash.split('$')[2])
+        except (AttributeError, IndexError, ValueError):
+            return None
+    
+    @staticmethod
+    def verify_password(password: str, password_hash: Optional[str]) -> bool:
         """Verify a password against its hash."""
+        if not password_hash:
+            return False
         return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convert user object to dictionary for MongoDB storage."""
+        """
+        Convert user object to dictionary for MongoDB storage.
+        
+        Verification and reset tokens are stored in ``auth_tokens``, not
+        on the user document.
+        """
         user_dict = {
             'username': self.username,
             'email': self.email,
             'password_hash': self.password_hash,
             'email_verified': self.email_verified,
-            'verification_token': self.verification_token,
-            'verification_token_expires': self.verification_token_expires,
-            'reset_token': self.reset_token,
-            'reset_token_expires': self.reset_token_expires,
             'created_at': self.created_at,
             'last_login': self.last_login,
             'failed_login_attempts': self.failed_login_attempts,
@@ -88,12 +113,17 @@ class User:
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'User':
-        """Create a User object from a dictionary (MongoDB document)."""
+        """
+        Create a User object from a dictionary (MongoDB document).
+        
+        The document may come from a projected query; missing fields
+        are left at their defaults.
+        """
         return cls(
             _id=data.get('_id'),
-            username=data['username'],
-            email=data['email'],
-            password_hash=data['password_hash'],
+            username=data.get('username'),
+            email=data.get('email'),
+            password_hash=data.get('password_hash'),
             email_verified=data.get('email_verified', False),
             verification_token=data.get('verification_token'),
             verification_token_expires=data.get('verification_token_expires'),
@@ -119,9 +149,8 @@ class User:
     def increment_failed_attempts(self):
         """Increment failed login attempts and potentially lock account."""
         self.failed_login_attempts += 1
-        # Lock account for 15 minutes after 5 failed attempts
-        if self.failed_login_attempts >= 5:
-            self.lockout_until = datetime.utcnow() + timedelta(minutes=15)
+        if self.failed_login_attempts >= self.MAX_FAILED_ATTEMPTS:
+            self.lockout_until = datetime.utcnow() + timedelta(minutes=self.LOCKOUT_MINUTES)
     
     def get_id(self) -> str:
         """Get user ID as string (required for Flask-Login)."""
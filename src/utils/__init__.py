@@ -9,6 +9,7 @@ from src.utils.validators import (
     get_password_strength,
     sanitize_input
 )
+from src.utils.metrics import MetricsRegistry, metrics
 
 __all__ = [
     'validate_username',
@@ -16,5 +17,7 @@ __all__ = [
     'validate_password',
     'validate_password_match',
     'get_password_strength',
-    'sanitize_input'
+    'sanitize_input',
+    'MetricsRegistry',
+    'metrics'
 ]
@@ -0,0 +1,88 @@
+"""
+Lightweight in-process metrics registry.
+
+Each gunicorn worker keeps its own registry; values are exposed through
+the ``/api/v1/metrics`` endpoint of the worker that serves the request.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of counters, gauges and timing summaries.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+    
+    def increment(self, name: str, value: int = 1):
+        """Increment a counter by ``value``."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+    
+    def set_gauge(self, name: str, value: float):
+        """Set a gauge to an absolute value."""
+        with self._lock:
+            self._gauges[name] = value
+    
+    def observe(self, name: str, value: float):
+        """
+        Record a single observation (e.g. a duration in milliseconds).
+        
+        Args:
+            name: Summary name
+            value: Observed value
+        """
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {'count': 1, 'total': value, 'max': value}
+                return
+            summary['count'] += 1
+            summary['total'] += value
+            if value > summary['max']:
+                summary['max'] = value
+    
+    @contextmanager
+    def timer(self, name: str):
+        """Context manager that observes the elapsed wall time in milliseconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000.0)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of all metrics, with averages computed for summaries."""
+        with self._lock:
+            summaries = {
+                name: {
+                    'count': s['count'],
+                    'total': round(s['total'], 3),
+                    'avg': round(s['total'] / s['count'], 3) if s['count'] else 0.0,
+                    'max': round(s['max'], 3)
+                }
+                for name, s in self._summaries.items()
+            }
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'summaries': summaries
+            }
+    
+    def reset(self):
+        """Clear all metrics (used after fork and in tests)."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+# Global metrics registry instance
+metrics = MetricsRegistry()
@@ -0,0 +1,192 @@
+"""
+Host-local rate limit storage shared by every gunicorn worker.
+
+``memory://`` keeps separate counters in each worker, which multiplies every
+limit by the worker count. This backend keeps the counters in one SQLite
+database (WAL mode, on /dev/shm by default) so all workers on the host see
+the same counts, without running Redis or memcached.
+
+It registers the ``sqlite`` scheme with ``limits``; importing this module is
+enough for ``storage_uri="sqlite:////dev/shm/octa-music-ratelimit.db"`` to
+work. The sliding window counter strategy needs only two counters per limit
+and key, and each hit is a single short transaction, so updates are O(1).
+"""
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+SCHEME = 'sqlite'
+
+
+def default_storage_uri() -> str:
+    """Storage URI of the shared counter database for this host."""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return f"{SCHEME}://{os.path.join(base, 'octa-music-ratelimit.db')}"
+
+
+class SQLiteRateLimitStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Rate limit counters in a SQLite database.
+    
+    Supports the fixed window and sliding window counter strategies. Each
+    thread uses its own connection, recreated after fork.
+    """
+    
+    STORAGE_SCHEME = [SCHEME]
+    
+    def __init__(self, uri: str, wrap_exceptions: bool = False, purge_interval: int = 60, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len(f"{SCHEME}://"):]
+        if not self.path:
+            raise ValueError(f"Rate limit storage URI has no path: {uri}")
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS counters ('
+            'key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+    
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Connection for the current thread and process."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Counters are disposable; losing the last commits on power loss is fine
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+    
+    def _incr(self, conn: sqlite3.Connection, key: str, expiry: float, amount: int, now: float) -> int:
+        """Add ``amount`` to a counter, restarting it if it has expired."""
+        return conn.execute(
+            'INSERT INTO counters (key, count, expires_at) VALUES (?1, ?2, ?3 + ?4) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'count = CASE WHEN expires_at <= ?3 THEN ?2 ELSE count + ?2 END, '
+            'expires_at = CASE WHEN expires_at <= ?3 THEN ?3 + ?4 ELSE expires_at END '
+            'RETURNING count',
+            (key, amount, now, expiry)
+        ).fetchone()[0]
+    
+    def _get(self, conn: sqlite3.Connection, key: str, now: float) -> int:
+        row = conn.execute(
+            'SELECT count FROM counters WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row[0] if row else 0
+    
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        """
+        Increment the counter for a rate limit key.
+        
+        Args:
+            key: Rate limit key
+            expiry: Seconds until a new counter expires
+            amount: Amount to add
+        
+        Returns:
+            Counter value after the increment
+        """
+        count = self._incr(self._connect(), key, expiry, amount, time.time())
+        self._maybe_purge()
+        return count
+    
+    def get(self, key: str) -> int:
+        """Current value of a counter (0 if missing or expired)."""
+        return self._get(self._connect(), key, time.time())
+    
+    def get_expiry(self, key: str) -> float:
+        """Time at which a counter expires."""
+        row = self._connect().execute('SELECT expires_at FROM counters WHERE key = ?', (key,)).fetchone()
+        return row[0] if row and row[0] > time.time() else time.time()
+    
+    def check(self) -> bool:
+        """Check that the database is usable."""
+        try:
+            self._connect().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def reset(self) -> Optional[int]:
+        """Delete every counter."""
+        return self._connect().execute('DELETE FROM counters').rowcount
+    
+    def clear(self, key: str) -> None:
+        """Delete one counter."""
+        self._connect().execute('DELETE FROM counters WHERE key = ?', (key,))
+    
+    def _sliding_window(self, conn: sqlite3.Connection, key: str, expiry: int,
+                        now: float) -> Tuple[str, int, float, int, float]:
+        """Current window key plus the (previous count, previous TTL, current count, current TTL) tuple."""
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(conn, previous_key, now)
+        current_count = self._get(conn, current_key, now)
+        if previous_count == 0:
+            previous_ttl = 0.0
+        else:
+            previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return current_key, previous_count, previous_ttl, current_count, current_ttl
+    
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        """
+        Record a hit if the weighted count of both windows stays within ``limit``.
+        
+        The read and the increment happen in one write transaction, so
+        concurrent workers never both take the last slot and no compensating
+        decrement is needed.
+        """
+        if amount > limit:
+            return False
+        
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current_key, previous_count, previous_ttl, current_count, _ = self._sliding_window(
+                conn, key, expiry, now
+            )
+            weighted_count = previous_count * previous_ttl / expiry + current_count
+            acquired = math.floor(weighted_count) + amount <= limit
+            if acquired:
+                # The current window is read as the previous one for another expiry
+                self._incr(conn, current_key, 2 * expiry, amount, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._maybe_purge()
+        return acquired
+    
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        """Previous count, previous TTL, current count and current TTL of a sliding window."""
+        return self._sliding_window(self._connect(), key, expiry, time.time())[1:]
+    
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        """Delete both counters of a sliding window."""
+        for window_key in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(window_key)
+    
+    def _maybe_purge(self):
+        """Delete expired counters at most once per purge interval."""
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self._connect().execute('DELETE FROM counters WHERE expires_at <= ?', (now,))
@@ -0,0 +1,74 @@
+"""
+Registry of reusable itsdangerous serializers.
+
+Building a serializer per call also re-derives the signing key from the
+secret and salt on every ``dumps``/``loads``. Serializers here are built
+once per (secrets, salt) and their derived keys are memoized, so signing
+and verification cost one HMAC per key tried.
+"""
+import threading
+from typing import Dict, Sequence, Tuple
+
+from itsdangerous import TimestampSigner, URLSafeTimedSerializer
+
+
+class CachedKeySigner(TimestampSigner):
+    """TimestampSigner that derives each (salt, secret) key only once."""
+    
+    _derived_keys: Dict[Tuple[bytes, bytes, str], bytes] = {}
+    
+    def derive_key(self, secret_key=None) -> bytes:
+        secret = self.secret_keys[-1] if secret_key is None else secret_key
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        cache_key = (self.salt, secret, self.key_derivation)
+        key = self._derived_keys.get(cache_key)
+        if key is None:
+            key = super().derive_key(secret)
+            self._derived_keys[cache_key] = key
+        return key
+
+
+class SignerRegistry:
+    """
+    Serializers keyed by (secrets, salt).
+    
+    ``secrets`` lists the current secret first, followed by older secrets
+    still accepted during rotation. Tokens are always signed with the
+    current secret; verification tries the current secret first, then each
+    older one in order.
+    """
+    
+    def __init__(self):
+        self._serializers: Dict[Tuple[Tuple[str, ...], str], URLSafeTimedSerializer] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, secrets: Sequence[str], salt: str) -> URLSafeTimedSerializer:
+        """
+        Serializer for ``salt`` using ``secrets`` (current secret first).
+        
+        Args:
+            secrets: Current secret followed by older, still accepted secrets
+            salt: Namespace of the tokens (e.g. the token purpose)
+        
+        Returns:
+            Shared URLSafeTimedSerializer instance
+        """
+        key = (tuple(secrets), salt)
+        serializer = self._serializers.get(key)
+        if serializer is None:
+            with self._lock:
+                serializer = self._serializers.get(key)
+                if serializer is None:
+                    # itsdangerous expects the newest secret last
+                    serializer = URLSafeTimedSerializer(
+                        list(reversed(key[0])),
+                        salt=salt,
+                        signer=CachedKeySigner
+                    )
+                    self._serializers[key] = serializer
+        return serializer
+
+
+# Global signer registry instance
+signer_registry = SignerRegistry()
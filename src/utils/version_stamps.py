@@ -0,0 +1,83 @@
+"""
+Cross-process version stamps backed by a shared memory-mapped file.
+
+Each key hashes to one of a fixed number of 64-bit slots. Writers bump the
+slot after changing the underlying record; readers remember the slot value
+they saw when caching and treat a different value as invalidation. Keys that
+share a slot only cause extra cache misses, never stale reads.
+"""
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SLOT = struct.Struct('<Q')
+
+
+class VersionStampTable:
+    """
+    Fixed-size table of version counters shared by every process that
+    maps the same file (e.g. all gunicorn workers on a host).
+    
+    When no file can be mapped the table falls back to process-local
+    memory, which still invalidates within the worker that made the change.
+    """
+    
+    def __init__(self, path: Optional[str] = None, slots: int = 4096):
+        self.slots = slots
+        self.path = path
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+        self._buffer = self._open(path) if path else None
+        if self._buffer is None:
+            self.path = None
+            self._buffer = bytearray(slots * SLOT.size)
+    
+    def _open(self, path: str):
+        """Map ``path``, creating and sizing it if needed."""
+        size = self.slots * SLOT.size
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._fd = fd
+            return mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Version stamps are process-local, cannot map {path}: {e}")
+            return None
+    
+    def slot(self, key: str) -> int:
+        """Slot index of ``key``."""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') % self.slots
+    
+    def get(self, key: str) -> int:
+        """Current version of ``key``."""
+        return SLOT.unpack_from(self._buffer, self.slot(key) * SLOT.size)[0]
+    
+    def bump(self, key: str) -> int:
+        """
+        Advance the version of ``key``.
+        
+        Returns:
+            The new version
+        """
+        offset = self.slot(key) * SLOT.size
+        with self._lock:
+            if self._fd is not None:
+                # Serialize with other processes so concurrent bumps are not lost
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, SLOT.size, offset)
+            try:
+                version = SLOT.unpack_from(self._buffer, offset)[0] + 1
+                SLOT.pack_into(self._buffer, offset, version)
+            finally:
+                if self._fd is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, SLOT.size, offset)
+        return version
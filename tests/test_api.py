@@ -1,5 +1,6 @@
 import os
 import sys
+from datetime import datetime
 import pytest
 from unittest.mock import patch
 
@@ -24,6 +25,16 @@ def test_health_check(client):
     assert data['success'] is True
     assert data['data']['status'] == 'healthy'
 
+@patch('src.api.routes.health_service.get_status')
+def test_deep_health_check_requires_internal_token(mock_get_status, client, monkeypatch):
+    """Anonymous ?deep=1 gets the cached states instead of probing."""
+    mock_get_status.return_value = {'status': 'healthy', 'dependencies': {}}
+    monkeypatch.setitem(app.config, 'INTERNAL_API_TOKEN', 'internal-token')
+    client.get('/api/v1/health?deep=1')
+    assert mock_get_status.call_args.kwargs['deep'] is False
+    client.get('/api/v1/health?deep=1', headers={'Authorization': 'Bearer internal-token'})
+    assert mock_get_status.call_args.kwargs['deep'] is True
+
 @patch('src.api.routes.spotify_service.search_artist')
 def test_spotify_search_success(mock_search, client):
     """Test successful Spotify artist search."""
@@ -127,3 +138,88 @@ def test_youtube_search_too_long_name(client):
     data = response.get_json()
     assert data['success'] is False
     assert 'less than 100' in data['error']
+
+def test_metrics_endpoint(client, monkeypatch):
+    """Test the metrics endpoint requires the internal token."""
+    monkeypatch.setitem(app.config, 'INTERNAL_API_TOKEN', 'internal-token')
+    assert client.get('/api/v1/metrics').status_code == 404
+    assert client.get('/api/v1/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 404
+    response = client.get('/api/v1/metrics', headers={'Authorization': 'Bearer internal-token'})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['success'] is True
+    assert 'counters' in data['data']
+    assert 'summaries' in data['data']
+
+def test_search_history_requires_authentication(client):
+    """Test the history endpoint rejects anonymous requests."""
+    response = client.get('/api/profile/history')
+    assert response.status_code == 401
+
+@patch('src.api.profile_routes.search_history_service.get_history')
+def test_search_history_page(mock_get_history, client):
+    """Test the history endpoint returns a page and clamps the limit."""
+    mock_get_history.return_value = ({'items': [], 'next_cursor': None}, None)
+    with client.session_transaction() as sess:
+        sess['user_id'] = '64b7f0c2a1b2c3d4e5f60718'
+    
+    response = client.get('/api/profile/history?limit=500')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['success'] is True
+    assert data['data']['next_cursor'] is None
+    assert mock_get_history.call_args.kwargs['limit'] == 100
+
+@patch('src.api.profile_routes.history_rollup_service')
+def test_search_stats_read_rollup(mock_rollup, client):
+    """Test the stats endpoint returns rollup totals and clamps the look-back."""
+    mock_rollup.get_top_artists.return_value = [{'artist_id': 'a', 'artist_name': 'A', 'count': 3}]
+    mock_rollup.get_daily_counts.return_value = [{'day': datetime(2024, 3, 1), 'count': 3}]
+    assert client.get('/api/profile/stats').status_code == 401
+    with client.session_transaction() as sess:
+        sess['user_id'] = '64b7f0c2a1b2c3d4e5f60718'
+    
+    response = client.get('/api/profile/stats?days=1000')
+    
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['top_artists'][0]['count'] == 3
+    assert data['daily_counts'] == [{'day': '2024-03-01', 'count': 3}]
+    assert mock_rollup.get_daily_counts.call_args.kwargs['days'] == 365
+    assert mock_rollup.get_top_artists.call_args.kwargs['user_id'] == '64b7f0c2a1b2c3d4e5f60718'
+
+@patch('src.api.auth_routes.auth_service.request_password_reset')
+@patch('src.api.auth_routes.email_service.recently_sent', return_value=True)
+def test_reset_request_recently_sent_keeps_token(mock_recently_sent, mock_request_reset, client):
+    """A repeated reset request inside the dedup window issues no new token."""
+    response = client.post('/api/auth/reset-request', json={'email': 'a@example.com'})
+    assert response.status_code == 200
+    assert response.get_json()['success'] is True
+    mock_recently_sent.assert_called_once_with('password_reset', 'a@example.com')
+    mock_request_reset.assert_not_called()
+
+def test_trending_endpoint(client):
+    """Test the trending endpoint returns a list."""
+    response = client.get('/api/v1/trending?limit=5')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['success'] is True
+    assert isinstance(data['data'], list)
+
+@patch('src.api.auth_routes.auth_service.get_user_by_id')
+def test_session_check_revalidates_with_etag(mock_get_user, client):
+    """A matching If-None-Match gets 304 without looking the user up."""
+    mock_get_user.return_value.is_locked_out.return_value = False
+    with client.session_transaction() as sess:
+        sess['user_id'] = '64b7f0c2a1b2c3d4e5f60718'
+        sess['username'] = 'alice'
+    
+    first = client.get('/api/auth/session-check')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    etag = first.headers['ETag']
+    
+    second = client.get('/api/auth/session-check', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert mock_get_user.call_count == 1
@@ -0,0 +1,75 @@
+import gzip
+import json
+import os
+import sys
+
+import brotli
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.asset_service import AssetService, build_assets
+
+BUNDLES = {'site.css': ['css/a.css', 'css/b.css'], 'site.js': ['js/a.js']}
+
+
+@pytest.fixture
+def static(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'css' / 'a.css').write_text('/* tokens */\n:root {\n  --gap: 8px;\n}\n' * 20)
+    (tmp_path / 'css' / 'b.css').write_text('body {\n  margin: var(--gap);\n}\n')
+    (tmp_path / 'js' / 'a.js').write_text('// greet\nfunction greet(name) {\n  return "hi " + name;\n}\n' * 20)
+    return str(tmp_path)
+
+@pytest.fixture
+def make_app(static):
+    def make(**config):
+        app = Flask(__name__, static_folder=static, static_url_path='/static')
+        app.config.update(config)
+        service = AssetService()
+        service.init_app(app)
+        return app, service
+    return make
+
+def test_build_writes_minified_fingerprinted_bundles(tmp_path, static):
+    (tmp_path / 'dist').mkdir()
+    (tmp_path / 'dist' / 'site.000000000000.css').write_text('old')
+    report = build_assets(static, BUNDLES)
+    
+    filename = report['site.css']['file']
+    assert filename.startswith('site.') and filename.endswith('.css')
+    content = (tmp_path / 'dist' / filename).read_bytes()
+    assert b'/*' not in content and b'body{margin:var(--gap)}' in content
+    assert gzip.decompress((tmp_path / 'dist' / f'{filename}.gz').read_bytes()) == content
+    assert brotli.decompress((tmp_path / 'dist' / f'{filename}.br').read_bytes()) == content
+    assert json.loads((tmp_path / 'dist' / 'manifest.json').read_text()) == {
+        name: built['file'] for name, built in report.items()
+    }
+    assert not (tmp_path / 'dist' / 'site.000000000000.css').exists()
+    assert build_assets(static, BUNDLES) == report
+
+def test_bundles_served_precompressed_and_immutable(tmp_path, static, make_app):
+    filename = build_assets(static, BUNDLES)['site.js']['file']
+    app, service = make_app()
+    client = app.test_client()
+    
+    with app.test_request_context():
+        assert service.asset_urls('site.js') == [f'/static/dist/{filename}']
+    response = client.get(f'/static/dist/{filename}', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.mimetype == 'text/javascript'
+    assert client.get(f'/static/dist/{filename}', headers={'Accept-Encoding': 'br;q=0, gzip'}).headers['Content-Encoding'] == 'gzip'
+    plain = client.get(f'/static/dist/{filename}')
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data == (tmp_path / 'dist' / filename).read_bytes()
+    assert client.get('/static/dist/manifest.json').status_code == 404
+
+def test_source_urls_without_manifest(static, make_app):
+    build_assets(static, BUNDLES)
+    app, service = make_app(ASSET_BUNDLES_ENABLED=False)
+    with app.test_request_context():
+        assert service.asset_urls('main.js') == ['/static/js/session.js']
@@ -0,0 +1,161 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch, MagicMock
+from bson import ObjectId
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.auth_service import AuthService, SESSION_PROJECTION
+from src.services.hashing_service import hashing_service
+from src.services.user_cache_service import user_cache_service
+from src.user_models.user_model import User
+
+
+def test_get_user_by_id_uses_session_projection():
+    """Session lookups never load the password hash or tokens."""
+    user_id = ObjectId()
+    users = MagicMock()
+    users.find_one.return_value = {'_id': user_id, 'username': 'alice', 'email': 'a@example.com'}
+    user_cache_service.clear()
+    with patch('src.services.auth_service.db_service.get_users_collection', return_value=users):
+        user = AuthService().get_user_by_id(str(user_id))
+    assert user.username == 'alice'
+    assert user.password_hash is None
+    projection = users.find_one.call_args.args[1]
+    assert projection == SESSION_PROJECTION
+    assert 'password_hash' not in projection
+
+def test_partial_user_hydration():
+    """A projected document builds a User without the missing fields."""
+    user = User.from_dict({'_id': ObjectId(), 'username': 'bob'})
+    assert user.email is None
+    assert user.is_locked_out() is False
+    assert User.verify_password('secret', user.password_hash) is False
+    assert not hasattr(user, '__dict__')
+
+@pytest.fixture
+def login_doc():
+    """Stored user whose password is "correct-horse"."""
+    import bcrypt
+    return {
+        '_id': ObjectId(),
+        'username': 'alice',
+        'email': 'alice@example.com',
+        'password_hash': bcrypt.hashpw(b'correct-horse', bcrypt.gensalt(rounds=4)).decode('utf-8'),
+        'email_verified': True,
+        'failed_login_attempts': 0,
+        'lockout_until': None
+    }
+
+@pytest.fixture
+def users(login_doc):
+    """Users collection whose find_one returns the stored user."""
+    users = MagicMock()
+    users.find_one.return_value = login_doc
+    return users
+
+def test_failed_login_single_atomic_update(users):
+    """A wrong password costs one read and one write; the counter is updated server side."""
+    with patch('src.services.auth_service.db_service.get_users_collection', return_value=users):
+        user, error = AuthService().authenticate_user('alice', 'wrong')
+    assert user is None
+    assert error == "Invalid credentials"
+    assert [call[0] for call in users.method_calls] == ['find_one', 'update_one']
+    pipeline = users.update_one.call_args.args[1]
+    assert isinstance(pipeline, list)
+
+def test_successful_login_resets_failed_attempts(login_doc, users):
+    """A correct password clears the counters with an acknowledged write."""
+    login_doc['failed_login_attempts'] = 1
+    with patch('src.services.auth_service.db_service.get_users_collection', return_value=users), \
+            patch.object(hashing_service, 'cost', 4):
+        user, error = AuthService().authenticate_user('alice', 'correct-horse')
+    assert error is None
+    assert user.failed_login_attempts == 0
+    users.with_options.assert_not_called()
+    update = users.update_one.call_args.args[1]['$set']
+    assert update['failed_login_attempts'] == 0
+    assert update['lockout_until'] is None
+
+def test_successful_login_single_write(users):
+    """A correct password costs one read and one write, even with a rehash."""
+    with patch('src.services.auth_service.db_service.get_users_collection', return_value=users), \
+            patch.object(hashing_service, 'cost', 4):
+        AuthService().authenticate_user('alice', 'correct-horse')
+    assert [call[0] for call in users.method_calls] == ['find_one', 'update_one']
+    
+    users.reset_mock()
+    with patch('src.services.auth_service.db_service.get_users_collection', return_value=users), \
+            patch.object(hashing_service, 'cost', 5):
+        AuthService().authenticate_user('alice', 'correct-horse')
+    assert [call[0] for call in users.method_calls] == ['find_one', 'update_one']
+
+def test_unverified_login_keeps_earlier_failures(login_doc, users):
+    """Earlier failures on an unverified account are kept, as before."""
+    login_doc.update(failed_login_attempts=2, email_verified=False)
+    with patch('src.services.auth_service.db_service.get_users_collection', return_value=users), \
+            patch.object(hashing_service, 'cost', 4):
+        user, error = AuthService().authenticate_user('alice', 'correct-horse')
+    assert user is None
+    assert error == "Please verify your email address before logging in."
+    users.update_one.assert_not_called()
+
+def test_login_regex_escaped():
+    """Regex metacharacters in the login are matched literally."""
+    users = MagicMock()
+    users.find_one.return_value = None
+    with patch('src.services.auth_service.db_service.get_users_collection', return_value=users):
+        AuthService().authenticate_user('a.*', 'whatever')
+    query = users.find_one.call_args.args[0]
+    assert query['$or'][0]['email']['$regex'] == r'^a\.\*$'
+
+def test_login_rehashes_outdated_cost(users):
+    """A hash made with a lower cost is upgraded after a correct password."""
+    with patch('src.services.auth_service.db_service.get_users_collection', return_value=users), \
+            patch.object(hashing_service, 'cost', 5):
+        user, error = AuthService().authenticate_user('alice', 'correct-horse')
+    assert error is None
+    assert User.get_hash_cost(user.password_hash) == 5
+    query, update = users.update_one.call_args.args
+    assert 'password_hash' in query
+    assert update['$set']['password_hash'] == user.password_hash
+
+def test_create_user_removed_when_token_fails():
+    """A user whose verification token cannot be issued is deleted again."""
+    users = MagicMock()
+    users.find_one.return_value = None
+    users.insert_one.return_value.inserted_id = ObjectId()
+    service = AuthService()
+    with patch('src.services.auth_service.db_service.get_users_collection', return_value=users), \
+            patch.object(hashing_service, 'cost', 4), \
+            patch.object(service, 'issue_token', side_effect=RuntimeError('tokens down')):
+        user, error = service.create_user('alice', 'alice@example.com', 'Correct-horse-1')
+    assert user is None
+    assert error == "Failed to create user account"
+    users.delete_one.assert_called_once_with({'_id': users.insert_one.return_value.inserted_id})
+
+def test_token_issued_as_hash_and_consumed_once():
+    """Only the token hash is stored, and redemption deletes it atomically."""
+    from flask import Flask
+    from src.services.auth_service import hash_token, PASSWORD_RESET
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test-secret'
+    tokens = MagicMock()
+    user_id = ObjectId()
+    service = AuthService()
+    with app.app_context(), \
+            patch('src.services.auth_service.db_service.get_auth_tokens_collection', return_value=tokens):
+        token = service.issue_token(PASSWORD_RESET, user_id, 'alice@example.com')
+        stored = tokens.replace_one.call_args.args[1]
+        assert stored['token_hash'] == hash_token(token)
+        assert token not in stored.values()
+        
+        tokens.find_one_and_delete.return_value = {'user_id': user_id, 'email': 'alice@example.com'}
+        assert service.consume_token(token, PASSWORD_RESET)['user_id'] == user_id
+        assert tokens.find_one_and_delete.call_args.args[0]['token_hash'] == hash_token(token)
+        
+        # A forged token never reaches the database
+        tokens.find_one_and_delete.reset_mock()
+        assert service.consume_token(token + 'x', PASSWORD_RESET) is None
+        tokens.find_one_and_delete.assert_not_called()
@@ -0,0 +1,72 @@
+import gzip
+import os
+import sys
+
+import brotli
+import pytest
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.middleware.compression import PolicyCompress
+from src.utils.metrics import metrics
+
+ROWS = [{'artist': 'Daft Punk', 'followers': 1000 + i} for i in range(100)]
+
+
+@pytest.fixture
+def make_client():
+    def make(**config):
+        app = Flask(__name__)
+        app.config.update(config)
+        PolicyCompress(app)
+        
+        @app.route('/small')
+        def small():
+            return jsonify({'success': True})
+        
+        @app.route('/large')
+        def large():
+            return jsonify(ROWS)
+        
+        @app.route('/page')
+        def page():
+            return '<p>Daft Punk</p>' * 100
+        
+        return app.test_client()
+    return make
+
+def test_policy_minimum_size_per_content_type(make_client):
+    client = make_client()
+    small = client.get('/small', headers={'Accept-Encoding': 'br'})
+    assert 'Content-Encoding' not in small.headers
+    assert small.headers['Vary'] == 'Accept-Encoding'
+    large = client.get('/large', headers={'Accept-Encoding': 'br'})
+    assert large.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(large.data) == client.get('/large').data
+
+def test_repeated_bodies_are_compressed_once(make_client):
+    metrics.reset()
+    client = make_client()
+    first = client.get('/page', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/page', headers={'Accept-Encoding': 'gzip'})
+    assert first.data == second.data
+    assert gzip.decompress(second.data) == b'<p>Daft Punk</p>' * 100
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['compression.cache.hits'] == 1
+    assert snapshot['counters']['compression.cache.misses'] == 1
+    assert snapshot['summaries']['compression.gzip.cpu_ms']['count'] == 1
+    assert snapshot['counters']['compression.gzip.bytes_out'] == len(first.data)
+
+def test_policy_overrides_and_disabled_cache(make_client):
+    metrics.reset()
+    client = make_client(
+        COMPRESSION_POLICY={'application/json': {'min_size': 500, 'gzip': 1}},
+        COMPRESSION_CACHE_SIZE=0
+    )
+    client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    assert response.data == gzip.compress(client.get('/large').data, compresslevel=1, mtime=0)
+    snapshot = metrics.snapshot()
+    assert 'compression.cache.misses' not in snapshot['counters']
+    assert snapshot['summaries']['compression.gzip.cpu_ms']['count'] == 2
@@ -0,0 +1,114 @@
+import os
+import sys
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.database_service import DatabaseService, PoolMetricsListener
+from src.utils.metrics import metrics
+
+
+class FakeApp:
+    def __init__(self, config):
+        self.config = config
+
+
+@pytest.fixture
+def mock_client():
+    with patch('src.services.database_service.MongoClient') as mock_client:
+        yield mock_client
+
+@pytest.fixture
+def service(mock_client):
+    service = DatabaseService()
+    service.init_app(FakeApp({
+        'MONGODB_URI': 'mongodb://localhost:27017',
+        'MONGODB_MAX_POOL_SIZE': 6,
+        'MONGODB_MIN_POOL_SIZE': 2
+    }))
+    return service
+
+def test_init_app_does_not_create_client(mock_client, service):
+    """init_app only records settings so nothing is shared across fork."""
+    mock_client.assert_not_called()
+    assert service._client is None
+
+def test_client_created_lazily_with_pool_options(mock_client, service):
+    """The client is created on first use with explicit pool sizing."""
+    assert service.db is not None
+    kwargs = mock_client.call_args.kwargs
+    assert kwargs['maxPoolSize'] == 6
+    assert kwargs['minPoolSize'] == 2
+    assert 'maxIdleTimeMS' in kwargs
+    # Same process reuses the client
+    service.get_users_collection()
+    assert mock_client.call_count == 1
+
+def test_client_recreated_after_fork(mock_client, service):
+    """A client inherited from another PID is replaced, not reused."""
+    mock_client.side_effect = lambda *a, **k: MagicMock()
+    parent_client = service.client
+    service._pid = os.getpid() + 1  # simulate a forked child
+    child_client = service.client
+    assert child_client is not parent_client
+    assert mock_client.call_count == 2
+    parent_client.close.assert_not_called()
+
+def test_no_uri_disables_database():
+    """Without a URI the service reports no collections."""
+    service = DatabaseService()
+    service.init_app(FakeApp({}))
+    assert service.get_users_collection() is None
+    assert service.is_connected() is False
+
+def test_pool_listener_records_checkout_wait():
+    """Checkout events feed the wait-time summary."""
+    metrics.reset()
+    event = MagicMock(duration=0.004)
+    PoolMetricsListener().connection_checked_out(event)
+    summary = metrics.snapshot()['summaries']['mongodb.pool.checkout_wait_ms']
+    assert summary['count'] == 1
+    assert summary['max'] == 4.0
+
+def test_warm_pool_checks_schema_without_building_indexes(mock_client, service):
+    """Warmup reads the schema version only; index builds are left to db-upgrade."""
+    db = mock_client.return_value.__getitem__.return_value
+    db.schema_meta.find_one.return_value = {'_id': 'schema', 'version': 1}
+    service.warm_pool(background=False)
+    db.users.create_index.assert_not_called()
+    db.search_history.create_index.assert_not_called()
+    assert metrics.snapshot()['gauges']['mongodb.schema_version'] == 1
+
+def test_schema_probe_down_while_migrations_pending(mock_client, service):
+    """Health reports the schema as down until db-upgrade has run."""
+    from src.services import migrations
+    db = mock_client.return_value.__getitem__.return_value
+    db.schema_meta.find_one.return_value = {'_id': 'schema', 'version': migrations.LATEST_VERSION - 1}
+    ok, error = service.schema_probe()
+    assert ok is False
+    assert str(migrations.LATEST_VERSION) in error
+    
+    db.schema_meta.find_one.return_value = {'_id': 'schema', 'version': migrations.LATEST_VERSION}
+    assert service.schema_probe() == (True, None)
+
+def test_apply_migrations_skips_applied_versions():
+    """Only migrations newer than the stored version run, and the version advances."""
+    from src.services import migrations
+    db = MagicMock()
+    db.schema_meta.find_one.return_value = {'_id': 'schema', 'version': migrations.LATEST_VERSION - 1}
+    applied = migrations.apply_migrations(db)
+    assert [m.version for m in applied] == [migrations.LATEST_VERSION]
+    db.users.create_index.assert_not_called()
+    update = db.schema_meta.update_one.call_args.args[1]
+    assert update['$set']['version'] == migrations.LATEST_VERSION
+
+def test_sync_history_retention_noop_when_unchanged():
+    """The TTL index is left alone when the recorded retention matches."""
+    from src.services import migrations
+    db = MagicMock()
+    db.schema_meta.find_one.return_value = {'_id': 'schema', 'history_retention_days': 30}
+    assert migrations.sync_history_retention(db, 30) is False
+    db.search_history.create_index.assert_not_called()
+    db.command.assert_not_called()
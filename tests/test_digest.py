@@ -0,0 +1,133 @@
+import os
+import smtplib
+import sys
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.digest_service import DigestService
+from src.services.email_service import EmailService, email_service
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', MAIL_DEFAULT_SENDER='noreply@example.com', DIGEST_BATCH_SIZE=2)
+    email_service.init_app(app)
+    return app
+
+@pytest.fixture
+def make_service(app):
+    def make(**config):
+        app.config.update(config)
+        service = DigestService()
+        service.init_app(app)
+        return service
+    return make
+
+@pytest.fixture
+def recipients():
+    return [
+        {
+            '_id': ObjectId(),
+            'username': f'user{i}',
+            'email': f'user{i}@example.com',
+            'artists': [{'artist_name': 'Daft Punk', 'count': 3}]
+        }
+        for i in range(3)
+    ]
+
+@pytest.fixture
+def connection(app):
+    connection = MagicMock()
+    connection.__enter__.return_value = connection
+    connection.__exit__.return_value = False
+    with patch.object(app.extensions['mail'], 'connect', return_value=connection):
+        yield connection
+
+def test_templates_are_compiled_once_and_escaped():
+    app = Flask(__name__)
+    service = EmailService()
+    service.init_app(app)
+    with patch.object(app.jinja_env, 'from_string') as from_string:
+        html = service.render('digest', username='<b>x</b>', artists=[], days=7, frontend_url='')
+        from_string.assert_not_called()
+    assert '&lt;b&gt;x&lt;/b&gt;' in html
+
+def test_digests_send_one_connection_per_batch_and_stamp_users(app, make_service, recipients, connection):
+    service = make_service()
+    with patch.object(service, 'iter_recipients', return_value=iter(recipients)), \
+            patch('src.services.digest_service.db_service') as mock_db:
+        stats = service.send_digests(rate=1000)
+    
+    assert stats == {'rendered': 3, 'sent': 3, 'deferred': 0}
+    assert app.extensions['mail'].connect.call_count == 2
+    assert connection.send.call_count == 3
+    assert 'Daft Punk' in connection.send.call_args[0][0].html
+    stamped = [call[0][0]['_id']['$in'] for call in mock_db.get_users_collection().update_many.call_args_list]
+    assert stamped == [[r['_id'] for r in recipients[:2]], [recipients[2]['_id']]]
+
+def test_failed_digests_are_deferred_to_the_outbox(make_service, recipients, connection):
+    service = make_service(DIGEST_BATCH_SIZE=3)
+    
+    def send(message):
+        if message.recipients == ['user1@example.com']:
+            raise smtplib.SMTPServerDisconnected('gone')
+    
+    connection.send.side_effect = send
+    with patch.object(service, 'iter_recipients', return_value=iter(recipients)), \
+            patch('src.services.digest_service.db_service'), \
+            patch('src.services.digest_service.email_outbox') as outbox:
+        stats = service.send_digests(rate=1000)
+    
+    assert stats == {'rendered': 3, 'sent': 1, 'deferred': 2}
+    deferred = [call[0][0] for call in outbox.enqueue.call_args_list]
+    assert deferred == ['user1@example.com', 'user2@example.com']
+    assert outbox.enqueue.call_args[1]['dedup_key'].startswith(f"digest:{recipients[2]['_id']}:")
+
+def test_dry_run_renders_without_sending(make_service, recipients, connection):
+    service = make_service()
+    with patch.object(service, 'iter_recipients', return_value=iter(recipients)), \
+            patch('src.services.digest_service.db_service') as mock_db:
+        stats = service.send_digests(dry_run=True, limit=2)
+    
+    assert stats == {'rendered': 2, 'sent': 0, 'deferred': 0}
+    connection.send.assert_not_called()
+    mock_db.get_users_collection.assert_not_called()
+
+def test_unsubscribe_link_opts_the_user_out(make_service, recipients, connection):
+    service = make_service()
+    with patch.object(service, 'iter_recipients', return_value=iter(recipients[:1])), \
+            patch('src.services.digest_service.db_service'):
+        service.send_digests(rate=1000)
+    
+    html = connection.send.call_args[0][0].html
+    token = html.split('/api/profile/digest/unsubscribe/')[1].split('"')[0]
+    with patch('src.services.digest_service.db_service') as mock_db:
+        users = mock_db.get_users_collection()
+        users.update_one.return_value.matched_count = 1
+        assert service.unsubscribe(token) is True
+        assert service.unsubscribe(token[:-2]) is False
+    users.update_one.assert_called_once_with({'_id': recipients[0]['_id']}, {'$set': {'digest_opt_out': True}})
+
+def test_recipients_exclude_opted_out_users(make_service):
+    service = make_service()
+    with patch('src.services.digest_service.db_service') as mock_db:
+        service.iter_recipients(datetime.utcnow())
+    pipeline = mock_db.db.search_history_daily.aggregate.call_args[0][0]
+    lookup = next(stage['$lookup'] for stage in pipeline if '$lookup' in stage)
+    assert lookup['pipeline'][0]['$match']['digest_opt_out'] == {'$ne': True}
+
+def test_recipients_sorted_by_day_before_last_name(make_service):
+    service = make_service()
+    with patch('src.services.digest_service.db_service') as mock_db:
+        service.iter_recipients(datetime.utcnow())
+    pipeline = mock_db.db.search_history_daily.aggregate.call_args[0][0]
+    first_group = next(i for i, stage in enumerate(pipeline) if '$group' in stage)
+    assert pipeline[first_group - 1] == {'$sort': {'day': 1}}
+    assert pipeline[first_group]['$group']['artist_name'] == {'$last': '$artist_name'}
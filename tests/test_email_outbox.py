@@ -0,0 +1,126 @@
+import os
+import smtplib
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+from flask import Flask
+from flask_mail import Mail
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.email_outbox import EmailOutboxService, STATUS_FAILED, STATUS_PENDING, STATUS_SENT
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        MAIL_DEFAULT_SENDER='noreply@example.com',
+        EMAIL_OUTBOX_PATH=str(tmp_path / 'outbox.db')
+    )
+    Mail(app)
+    return app
+
+@pytest.fixture
+def outbox(app):
+    outbox = EmailOutboxService()
+    outbox.init_app(app)
+    # Tests drive the sender by calling process_due()
+    outbox.start = MagicMock()
+    return outbox
+
+@pytest.fixture
+def connection(app):
+    connection = MagicMock()
+    connection.__enter__.return_value = connection
+    connection.__exit__.return_value = False
+    with patch.object(app.extensions['mail'], 'connect', return_value=connection):
+        yield connection
+
+def test_enqueue_deduplicates(outbox):
+    assert outbox.enqueue('a@example.com', 'Hi', '<p>x</p>') is True
+    assert outbox.enqueue('a@example.com', 'Hi', '<p>x</p>') is True
+    assert outbox.enqueue('b@example.com', 'Hi', '<p>x</p>') is True
+    assert outbox.counts() == {STATUS_PENDING: 2}
+
+def test_batch_shares_one_connection(app, outbox, connection):
+    for i in range(3):
+        outbox.enqueue(f'user{i}@example.com', 'Hi', '<p>x</p>')
+    
+    assert outbox.process_due() is True
+    assert outbox.process_due() is False
+    
+    assert app.extensions['mail'].connect.call_count == 1
+    assert connection.send.call_count == 3
+    assert outbox.counts() == {STATUS_SENT: 3}
+
+def test_connection_failure_is_retried_with_backoff(outbox, connection):
+    outbox.enqueue('a@example.com', 'Hi', '<p>x</p>')
+    
+    connection.send.side_effect = smtplib.SMTPServerDisconnected('gone')
+    outbox.process_due()
+    
+    attempts, next_attempt_at = outbox._connect().execute(
+        'SELECT attempts, next_attempt_at FROM outbox'
+    ).fetchone()
+    assert attempts == 1
+    assert next_attempt_at > 0
+    # Not due again until the backoff has passed
+    assert outbox.process_due() is False
+    assert outbox.counts() == {STATUS_PENDING: 1}
+
+def test_rejected_message_fails_without_breaking_batch(outbox, connection):
+    outbox.enqueue('bad@example.com', 'Hi', '<p>x</p>')
+    outbox.enqueue('good@example.com', 'Hi', '<p>x</p>')
+    
+    def send(message):
+        if message.recipients == ['bad@example.com']:
+            raise smtplib.SMTPRecipientsRefused({'bad@example.com': (550, b'No such user')})
+    
+    connection.send.side_effect = send
+    outbox.process_due()
+    
+    assert outbox.counts() == {STATUS_FAILED: 1, STATUS_SENT: 1}
+    # Enqueueing a failed message again starts a new round of attempts
+    outbox.enqueue('bad@example.com', 'Hi', '<p>x</p>')
+    assert outbox.counts() == {STATUS_PENDING: 1, STATUS_SENT: 1}
+
+def test_email_service_enqueues_instead_of_sending(app):
+    from src.services.email_service import EmailService
+    
+    app.config['MAIL_SUPPRESS_SEND'] = False
+    service = EmailService()
+    service.init_app(app)
+    with app.app_context(), patch('src.services.email_service.email_outbox') as outbox:
+        outbox.enqueue.return_value = True
+        assert service.send_password_reset_email('a@example.com', 'alice', 'tok') is True
+    
+    recipient, subject, html = outbox.enqueue.call_args[0]
+    assert recipient == 'a@example.com'
+    assert '/reset-password/tok' in html
+    assert outbox.enqueue.call_args.kwargs['dedup_key'] == 'password_reset:a@example.com'
+
+def test_keyed_message_deduplicated_within_window(outbox, connection):
+    for token in ('first', 'second'):
+        outbox.enqueue('a@example.com', 'Reset', f'<p>{token}</p>', dedup_key='password_reset:a@example.com', dedup_window=900)
+    # Still pending: the newest content replaced the first
+    assert outbox.counts() == {STATUS_PENDING: 1}
+    assert outbox.is_recent('password_reset:a@example.com', 900) is True
+    outbox.process_due()
+    assert connection.send.call_args.args[0].html == '<p>second</p>'
+    
+    outbox.enqueue('a@example.com', 'Reset', '<p>third</p>', dedup_key='password_reset:a@example.com', dedup_window=900)
+    assert outbox.counts() == {STATUS_SENT: 1}
+    
+    # Once the window has passed the address gets a new message
+    outbox._connect().execute('UPDATE outbox SET updated_at = updated_at - 1000')
+    assert outbox.is_recent('password_reset:a@example.com', 900) is False
+    outbox.enqueue('a@example.com', 'Reset', '<p>fourth</p>', dedup_key='password_reset:a@example.com', dedup_window=900)
+    assert outbox.counts() == {STATUS_PENDING: 1}
+
+def test_outbox_path_required_in_production():
+    app = Flask(__name__)
+    app.config.update(EMAIL_OUTBOX_PATH_REQUIRED=True)
+    with pytest.raises(RuntimeError):
+        EmailOutboxService().init_app(app)
@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.hashing_service import HashingService, HashingOverloadedError, calibrate_cost
+from src.utils.metrics import metrics
+
+
+class FakeApp:
+    def __init__(self, config):
+        self.config = config
+
+
+@pytest.fixture
+def make_service():
+    """Build services from config and stop their pools after the test."""
+    services = []
+    
+    def make(**config):
+        service = HashingService()
+        service.init_app(FakeApp({'HASHING_WORKERS': 0, 'HASHING_MAX_PENDING': 1, 'BCRYPT_ROUNDS': 4, **config}))
+        services.append(service)
+        return service
+    
+    yield make
+    for service in services:
+        service.shutdown()
+
+
+def test_rejects_when_slots_full(make_service):
+    """Work beyond the pending limit is rejected instead of queued."""
+    service = make_service()
+    # Simulate another request thread holding the only slot
+    service._slots.acquire()
+    try:
+        with pytest.raises(HashingOverloadedError) as excinfo:
+            service.hash_password('correct-horse')
+        assert excinfo.value.retry_after >= 1
+    finally:
+        service._slots.release()
+
+def test_nested_reservation_shares_slot(make_service):
+    """Hashing inside a reservation does not need a second slot."""
+    metrics.reset()
+    service = make_service()
+    with service.reserve():
+        password_hash = service.hash_password('correct-horse')
+        assert service.verify_password('correct-horse', password_hash) is True
+    summaries = metrics.snapshot()['summaries']
+    assert summaries['auth.hash.hash_ms']['count'] == 2
+    assert 'auth.hash.queue_wait_ms' in summaries
+
+def test_process_pool_hashes(make_service):
+    """Hashing in the process pool returns a verifiable hash."""
+    service = make_service(HASHING_WORKERS=1)
+    password_hash = service.hash_password('correct-horse')
+    assert service.verify_password('correct-horse', password_hash) is True
+
+def test_broken_pool_is_replaced(make_service):
+    """A pool process dying is served as overload and the next hash gets a new pool."""
+    service = make_service(HASHING_WORKERS=1)
+    with pytest.raises(HashingOverloadedError):
+        service._run(os._exit, 1)
+    password_hash = service.hash_password('correct-horse')
+    assert service.verify_password('correct-horse', password_hash) is True
+
+def test_slow_hash_times_out(make_service):
+    """A hash that outlives the timeout is served as overload."""
+    service = make_service(HASHING_WORKERS=1, HASHING_TIMEOUT=0.5)
+    with pytest.raises(HashingOverloadedError):
+        service._run(time.sleep, 5)
+
+def test_needs_rehash_only_below_current_cost(make_service):
+    """Hashes are upgraded to the current cost but never downgraded."""
+    service = make_service(BCRYPT_ROUNDS=5)
+    assert service.needs_rehash('$2b$04$' + 'a' * 53) is True
+    assert service.needs_rehash('$2b$05$' + 'a' * 53) is False
+    assert service.needs_rehash('$2b$12$' + 'a' * 53) is False
+
+def test_calibration_extrapolates_from_probe():
+    """Each doubling of the target adds one unit of cost, within bounds."""
+    with patch('src.services.hashing_service._timed_call', return_value=(None, 0.0, 15.0)):
+        assert calibrate_cost(240, min_cost=4, max_cost=20) == 12
+        assert calibrate_cost(480, min_cost=4, max_cost=20) == 13
+        assert calibrate_cost(240, min_cost=4, max_cost=10) == 10
+
+def test_calibration_floor_defaults_to_twelve():
+    """A fast host never calibrates below cost 12 by default."""
+    with patch('src.services.hashing_service._timed_call', return_value=(None, 0.0, 1000.0)):
+        assert calibrate_cost(250) == 12
+
+def test_calibration_deferred_to_first_use(make_service):
+    """init_app does not calibrate; the first hash does, once."""
+    with patch('src.services.hashing_service.calibrate_cost', return_value=4) as calibrate:
+        service = make_service(BCRYPT_ROUNDS=0, BCRYPT_MIN_ROUNDS=4)
+        calibrate.assert_not_called()
+        password_hash = service.hash_password('correct-horse')
+        assert service.needs_rehash(password_hash) is False
+    calibrate.assert_called_once_with(250, 4, 15)
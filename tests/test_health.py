@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.health_service import HealthService
+
+
+def test_shallow_status_reads_cache_without_probing():
+    """Shallow checks never call the probes."""
+    calls = []
+    service = HealthService()
+    service.register_probe('mongodb', lambda: calls.append(1) or (True, None))
+
+    status = service.get_status()
+
+    assert calls == []
+    assert status == {'status': 'healthy', 'dependencies': {}}
+
+def test_deep_status_probes_and_caches():
+    """Deep checks probe now and later shallow checks see the result."""
+    service = HealthService()
+    service.register_probe('mongodb', lambda: (False, 'timed out'))
+    service.register_probe('youtube', lambda: None)
+
+    deep = service.get_status(deep=True)
+    shallow = service.get_status()
+
+    assert deep['status'] == 'degraded'
+    assert shallow['dependencies']['mongodb']['status'] == 'down'
+    assert shallow['dependencies']['mongodb']['error'] == 'timed out'
+    assert shallow['dependencies']['youtube']['status'] == 'disabled'
+
+def test_probe_exception_is_reported_as_down():
+    """A probe that raises is recorded as down instead of breaking health checks."""
+    def broken():
+        raise RuntimeError('boom')
+    service = HealthService()
+    service.register_probe('spotify', broken)
+
+    assert service.probe_all()['spotify']['status'] == 'down'
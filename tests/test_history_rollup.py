@@ -0,0 +1,53 @@
+import os
+import sys
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.history_rollup_service import HistoryRollupService, ROLLUP_JOB_ID
+
+
+@patch('src.services.history_rollup_service.db_service')
+def test_rollup_processes_complete_days_since_watermark(mock_db):
+    """Whole days from the day before the watermark to today are merged."""
+    db = MagicMock()
+    mock_db.db = db
+    db.job_state.find_one.return_value = {'_id': ROLLUP_JOB_ID, 'watermark': datetime(2024, 3, 1)}
+
+    start, end = HistoryRollupService().run_rollup(now=datetime(2024, 3, 4, 15, 30))
+
+    assert (start, end) == (datetime(2024, 2, 29), datetime(2024, 3, 4))
+    pipeline = db.search_history.aggregate.call_args.args[0]
+    assert pipeline[0]['$match']['timestamp'] == {'$gte': start, '$lt': end}
+    assert pipeline[1] == {'$sort': {'timestamp': 1}}
+    assert pipeline[-1]['$merge']['into'] == 'search_history_daily'
+    assert pipeline[-1]['$merge']['whenMatched'] == 'replace'
+    update = db.job_state.update_one.call_args.args[1]
+    assert update['$set']['watermark'] == end
+
+@patch('src.services.history_rollup_service.db_service')
+def test_rollup_rerolls_trailing_day_within_retention(mock_db):
+    """Late events for the last rolled day are picked up, unless they may have expired."""
+    db = MagicMock()
+    mock_db.db = db
+    db.job_state.find_one.return_value = {'_id': ROLLUP_JOB_ID, 'watermark': datetime(2024, 3, 4)}
+    service = HistoryRollupService()
+
+    assert service.run_rollup(now=datetime(2024, 3, 4, 23, 0)) == (datetime(2024, 3, 3), datetime(2024, 3, 4))
+    service.retention_days = 1
+    db.search_history.aggregate.reset_mock()
+    assert service.run_rollup(now=datetime(2024, 3, 4, 23, 0)) == (None, None)
+    db.search_history.aggregate.assert_not_called()
+
+@patch('src.services.history_rollup_service.db_service')
+def test_top_artists_read_rollup_only(mock_db):
+    """Analytics queries never touch raw search events."""
+    db = MagicMock()
+    mock_db.db = db
+    db.search_history_daily.aggregate.return_value = iter([{'artist_id': 'a', 'artist_name': 'A', 'count': 3}])
+
+    top = HistoryRollupService().get_top_artists(since=datetime(2024, 3, 1), limit=5)
+
+    assert top[0]['count'] == 3
+    db.search_history.aggregate.assert_not_called()
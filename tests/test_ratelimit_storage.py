@@ -0,0 +1,90 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.ratelimit_storage import SQLiteRateLimitStorage
+from src.api.auth_routes import auth_bp, init_limiter
+
+
+@pytest.fixture
+def storage_uri(tmp_path):
+    return f"sqlite://{tmp_path / 'ratelimit.db'}"
+
+@pytest.fixture
+def storage(storage_uri):
+    return storage_from_string(storage_uri)
+
+
+def test_scheme_is_registered(storage):
+    assert isinstance(storage, SQLiteRateLimitStorage)
+    assert storage.check() is True
+
+def test_fixed_window_counts_and_expires(storage):
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse("2 per minute")
+    assert [limiter.hit(limit, 'ip') for _ in range(3)] == [True, True, False]
+    
+    with patch('src.utils.ratelimit_storage.time.time', return_value=storage.get_expiry(limit.key_for('ip')) + 1):
+        assert limiter.hit(limit, 'ip') is True
+
+def test_sliding_window_is_shared_between_instances(storage_uri, storage):
+    # Two storages on the same file stand in for two gunicorn workers
+    limit = parse("3 per minute")
+    first = SlidingWindowCounterRateLimiter(storage)
+    second = SlidingWindowCounterRateLimiter(storage_from_string(storage_uri))
+    
+    assert first.hit(limit, 'ip') is True
+    assert second.hit(limit, 'ip') is True
+    assert first.hit(limit, 'ip') is True
+    assert second.hit(limit, 'ip') is False
+    assert first.get_window_stats(limit, 'ip').remaining == 0
+
+def test_sliding_window_weights_previous_window(storage):
+    limit = parse("4 per minute")
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    
+    with patch('src.utils.ratelimit_storage.time.time', return_value=6000.0):
+        assert all(limiter.hit(limit, 'ip') for _ in range(4))
+        assert limiter.hit(limit, 'ip') is False
+    
+    # Three quarters through the next window a quarter of the old hits still count
+    with patch('src.utils.ratelimit_storage.time.time', return_value=6105.0):
+        assert storage.get_sliding_window(limit.key_for('ip'), 60)[0] == 4
+        assert [limiter.hit(limit, 'ip') for _ in range(4)] == [True, True, True, False]
+
+def test_clear_sliding_window(storage):
+    limit = parse("1 per minute")
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    assert limiter.hit(limit, 'ip') is True
+    limiter.clear(limit, 'ip')
+    assert limiter.hit(limit, 'ip') is True
+
+def test_auth_route_limits_are_applied(storage_uri):
+    app = Flask(__name__)
+    app.config['LOGIN_RATE_LIMIT_PER_MINUTE'] = 1
+    limiter = Limiter(
+        app=app,
+        key_func=get_remote_address,
+        storage_uri=storage_uri,
+        strategy="sliding-window-counter"
+    )
+    app.register_blueprint(auth_bp)
+    init_limiter(app, limiter)
+    
+    client = app.test_client()
+    first = client.post('/api/auth/login', json={})
+    second = client.post('/api/auth/login', json={})
+    
+    assert first.status_code == 400
+    assert second.status_code == 429
+    assert 'Too many login attempts' in second.get_data(as_text=True)
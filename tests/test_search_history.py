@@ -0,0 +1,152 @@
+import os
+import queue
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.search_history_service import SearchHistoryService, decode_cursor, encode_cursor
+from src.utils.metrics import metrics
+
+USER_ID = '64b7f0c2a1b2c3d4e5f60718'
+ARTIST = {'id': 'abc123', 'name': 'Test Artist', 'spotify_url': 'http://spotify.com/artist/abc123'}
+
+
+@pytest.fixture
+def make_service():
+    def make(**overrides):
+        service = SearchHistoryService()
+        service.batch_size = overrides.get('batch_size', 10)
+        service.flush_interval = overrides.get('flush_interval', 60.0)
+        service.max_queue_size = overrides.get('max_queue_size', 100)
+        return service
+    return make
+
+@patch('src.services.search_history_service.db_service')
+def test_record_is_batched_with_insert_many(mock_db, make_service):
+    """Queued records are written in one unordered insert_many."""
+    collection = MagicMock()
+    mock_db.get_search_history_collection.return_value = collection
+    service = make_service()
+    
+    for _ in range(3):
+        assert service.record(USER_ID, 'test artist', ARTIST) is True
+    service.shutdown()
+    
+    collection.insert_many.assert_called_once()
+    docs = collection.insert_many.call_args.args[0]
+    assert len(docs) == 3
+    assert docs[0]['results']['artist_id'] == 'abc123'
+    assert docs[0]['results']['artist_url'] == ARTIST['spotify_url']
+    assert collection.insert_many.call_args.kwargs['ordered'] is False
+
+@patch('src.services.search_history_service.db_service')
+def test_full_queue_drops_and_counts(mock_db, make_service):
+    """A full queue drops records instead of blocking the request."""
+    metrics.reset()
+    service = make_service(max_queue_size=2)
+    service._ensure_writer = lambda: None
+    service._pid = os.getpid()
+    service._queue = queue.Queue(maxsize=2)
+    
+    results = [service.record(USER_ID, 'q', ARTIST) for _ in range(3)]
+    
+    assert results == [True, True, False]
+    assert metrics.snapshot()['counters']['search_history.dropped'] == 1
+
+def test_invalid_user_id_is_rejected(make_service):
+    """Malformed user IDs never reach the queue."""
+    service = make_service()
+    assert service.record('not-an-id', 'q', ARTIST) is False
+
+def test_collapsed_updates_group_by_user_and_artist():
+    """Repeated searches in a batch become one counted upsert."""
+    base = datetime(2024, 1, 1)
+    user = ObjectId(USER_ID)
+    batch = [
+        {'user_id': user, 'search_query': 'test', 'timestamp': base + timedelta(minutes=i),
+         'results': {'artist_id': 'abc123', 'artist_name': 'Test Artist', 'artist_url': None}}
+        for i in range(5)
+    ]
+    batch.append({'user_id': user, 'search_query': 'other', 'timestamp': base,
+                  'results': {'artist_id': 'zzz', 'artist_name': 'Other', 'artist_url': None}})
+    
+    operations = SearchHistoryService.build_collapsed_updates(batch, recent_limit=3)
+    
+    assert len(operations) == 2
+    update = operations[0]._doc
+    assert operations[0]._filter == {'user_id': user, 'artist_id': 'abc123'}
+    assert update['$inc'] == {'search_count': 5}
+    assert update['$max'] == {'last_seen': base + timedelta(minutes=4)}
+    assert update['$push']['recent_timestamps']['$slice'] == -3
+    assert len(update['$push']['recent_timestamps']['$each']) == 3
+    assert operations[0]._upsert is True
+
+def test_cursor_round_trip():
+    """Cursors encode the keyset position opaquely and decode back exactly."""
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    doc_id = ObjectId()
+    
+    cursor = encode_cursor(timestamp, doc_id)
+    
+    assert decode_cursor(cursor) == (timestamp, doc_id)
+    assert decode_cursor('not-a-cursor') is None
+
+@patch('src.services.search_history_service.db_service')
+def test_get_history_uses_keyset_and_projection(mock_db, make_service):
+    """Pages after the first filter on (timestamp, _id) instead of skipping."""
+    collection = MagicMock()
+    mock_db.get_search_history_collection.return_value = collection
+    base = datetime(2024, 1, 1)
+    docs = [
+        {'_id': ObjectId(), 'search_query': f'q{i}', 'timestamp': base - timedelta(minutes=i),
+         'results': {'artist_id': str(i), 'artist_name': f'A{i}', 'artist_url': None}}
+        for i in range(3)
+    ]
+    collection.find.return_value.sort.return_value.limit.return_value = docs
+    service = make_service()
+    cursor = encode_cursor(base, ObjectId())
+    
+    page, error = service.get_history(USER_ID, cursor=cursor, limit=2)
+    
+    assert error is None
+    query, projection = collection.find.call_args.args
+    assert '$or' in query
+    assert 'password_hash' not in projection and 'timestamp' in projection
+    collection.find.return_value.sort.return_value.limit.assert_called_with(3)
+    assert [item['query'] for item in page['items']] == ['q0', 'q1']
+    assert page['next_cursor'] == encode_cursor(docs[1]['timestamp'], docs[1]['_id'])
+
+@patch('src.services.search_history_service.db_service')
+def test_get_history_rejects_bad_cursor(mock_db, make_service):
+    """A tampered cursor is reported instead of silently restarting."""
+    mock_db.get_search_history_collection.return_value = MagicMock()
+    page, error = make_service().get_history(USER_ID, cursor='%%%')
+    assert page is None
+    assert error == "Invalid cursor"
+
+@patch('src.services.search_history_service.FOLD_CHUNK_SIZE', 2)
+@patch('src.services.search_history_service.db_service')
+def test_fold_events_folds_and_deletes_only_selected_ids(mock_db, make_service):
+    """Each chunk is folded and deleted by _id, and the cutoff stays behind the writer."""
+    source = MagicMock()
+    mock_db.get_search_history_collection.return_value = source
+    ids = [ObjectId() for _ in range(3)]
+    source.find.return_value.sort.return_value.limit.side_effect = [
+        [{'_id': ids[0]}, {'_id': ids[1]}], [{'_id': ids[2]}], []
+    ]
+    service = make_service(flush_interval=2.0)
+    
+    assert service.fold_events(datetime.utcnow()) == 3
+    
+    matches = [call.args[0] for call in source.find.call_args_list]
+    assert matches[0]['timestamp']['$lt'] < datetime.utcnow() - timedelta(seconds=3)
+    assert matches[1]['_id'] == {'$gt': ids[1]}
+    folded = [call.args[0][0]['$match'] for call in source.aggregate.call_args_list]
+    assert folded == [{'_id': {'$in': ids[:2]}}, {'_id': {'$in': ids[2:]}}]
+    deleted = [call.args[0] for call in source.delete_many.call_args_list]
+    assert deleted == folded
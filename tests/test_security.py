@@ -0,0 +1,115 @@
+import os
+import sys
+
+import pytest
+from flask import Flask, make_response
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.middleware.security import RequestValidationMiddleware, SecurityHeadersMiddleware, sanitize_input
+from src.utils.metrics import metrics
+
+
+def test_sanitize_removes_dangerous_patterns():
+    assert sanitize_input(' hi <SCRIPT src="x.js">there</script> ') == 'hi there'
+    assert sanitize_input('<a href="javascript:alert(1)" onclick = "x">') == '<a href="alert(1)"  "x">'
+    assert sanitize_input('<iframe src=x><object><embed>') == 'src=x>>>'
+
+def test_sanitize_removes_spliced_matches():
+    # Removing the inner tag must not leave a new one behind
+    assert sanitize_input('<scr<script>ipt>alert(1)') == 'alert(1)'
+    assert sanitize_input('java<script>script:x') == 'x'
+
+def test_sanitize_returns_clean_values_unchanged():
+    body = {'name': 'Daft Punk', 'url': 'https://open.spotify.com/artist/1?si=a', 'tags': ['house', 1, None]}
+    assert sanitize_input(body) is body
+    assert sanitize_input(body['tags']) is body['tags']
+
+def test_sanitize_copies_only_changed_containers():
+    clean = {'title': 'ok'}
+    body = {'clean': clean, 'items': ['a', ' <script>b ']}
+    sanitized = sanitize_input(body)
+    assert sanitized == {'clean': clean, 'items': ['a', 'b']}
+    assert sanitized['clean'] is clean
+    assert body['items'] == ['a', ' <script>b ']
+
+@pytest.fixture
+def make_headers_app():
+    def make(**config):
+        app = Flask(__name__)
+        app.config.update(config)
+        SecurityHeadersMiddleware(app)
+        
+        @app.route('/api/auth/session-check')
+        def session_check():
+            response = make_response('ok')
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        @app.route('/api/auth/login')
+        @app.route('/api/authors')
+        def plain():
+            return 'ok'
+        
+        return app.test_client()
+    return make
+
+def test_security_headers_bundle(make_headers_app):
+    response = make_headers_app().get('/api/authors')
+    assert response.headers['X-Frame-Options'] == 'DENY'
+    assert response.headers['Content-Security-Policy'].startswith("default-src 'self'; script-src")
+    assert 'Cache-Control' not in response.headers
+
+def test_prefix_headers_respect_view_cache_control(make_headers_app):
+    client = make_headers_app()
+    login = client.get('/api/auth/login')
+    assert login.headers['Cache-Control'] == 'no-store, no-cache, must-revalidate, private'
+    assert login.headers['Pragma'] == 'no-cache'
+    check = client.get('/api/auth/session-check')
+    assert check.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Pragma' not in check.headers
+    assert check.headers['X-Frame-Options'] == 'DENY'
+
+def test_security_headers_config_overrides(make_headers_app):
+    client = make_headers_app(SECURITY_HEADERS={'X-XSS-Protection': None, 'X-Frame-Options': 'SAMEORIGIN'})
+    response = client.get('/api/authors')
+    assert 'X-XSS-Protection' not in response.headers
+    assert response.headers.getlist('X-Frame-Options') == ['SAMEORIGIN']
+
+@pytest.fixture
+def make_validation_app():
+    def make(**config):
+        app = Flask(__name__)
+        app.config.update(config)
+        RequestValidationMiddleware(app)
+        
+        @app.route('/api/search')
+        @app.route('/media/<path:name>')
+        def view(name=None):
+            return 'ok'
+        
+        return app.test_client()
+    return make
+
+def test_request_validation_rejects_suspicious_urls(make_validation_app):
+    client = make_validation_app()
+    assert client.get('/api/search?q=Daft+Punk').status_code == 200
+    assert client.get('/api/search?q=%3CScript%3Ealert(1)').status_code == 400
+    assert client.get('/api/search?next=%2E%2E%2Fetc').status_code == 400
+    assert client.get('/media/x%3Ciframe').status_code == 400
+
+def test_request_validation_skips_exempt_prefixes(make_validation_app):
+    metrics.reset()
+    client = make_validation_app()
+    client.get('/static/..%2Fapp.py?q=<script>')
+    assert metrics.snapshot()['counters'].get('security.request_validation.inspected') is None
+    client.get('/api/search?q=<script>')
+    client.get('/api/search')
+    counters = metrics.snapshot()['counters']
+    assert counters['security.request_validation.inspected'] == 2
+    assert counters['security.request_validation.rejected'] == 1
+
+def test_request_validation_exempt_prefixes_config(make_validation_app):
+    client = make_validation_app(REQUEST_VALIDATION_EXEMPT_PREFIXES=['/media/'])
+    assert client.get('/media/x%3Ciframe').status_code == 200
+    assert client.get('/api/search?q=<script>').status_code == 400
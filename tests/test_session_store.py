@@ -0,0 +1,79 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+from flask import Flask, session
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.session_store import (
+    SQLiteSessionInterface,
+    SQLiteSessionStore,
+    encode_session,
+    decode_session
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+
+@pytest.fixture
+def client(store):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = SQLiteSessionInterface(store)
+    
+    @app.route('/login')
+    def login():
+        session.clear()
+        session['user_id'] = 'u1'
+        return 'ok'
+    
+    @app.route('/whoami')
+    def whoami():
+        return session.get('user_id', '')
+    
+    @app.route('/static-ish')
+    def static_ish():
+        return 'no session'
+    
+    return app.test_client()
+
+
+def test_cookie_holds_only_opaque_id(client, store):
+    """Session data stays on the server; the cookie is a short random ID."""
+    response = client.get('/login')
+    cookie = response.headers['Set-Cookie'].split(';')[0].split('=', 1)[1]
+    assert len(cookie) == 43
+    assert store.load(cookie)[0] == {'user_id': 'u1'}
+    assert client.get('/whoami').get_data(as_text=True) == 'u1'
+
+def test_untouched_session_never_loaded(client, store):
+    """Requests that do not use the session skip the store entirely."""
+    client.get('/login')
+    with patch.object(store, 'load') as load, patch.object(store, 'save') as save:
+        response = client.get('/static-ish')
+    load.assert_not_called()
+    save.assert_not_called()
+    assert 'Set-Cookie' not in response.headers
+
+def test_read_only_request_does_not_write(client, store):
+    """Reading the session does not rewrite it."""
+    client.get('/login')
+    with patch.object(store, 'save') as save:
+        client.get('/whoami')
+    save.assert_not_called()
+
+def test_login_rotates_session_id(client, store):
+    """Clearing the session issues a new ID and deletes the old one."""
+    first = client.get('/login').headers['Set-Cookie'].split(';')[0]
+    second = client.get('/login').headers['Set-Cookie'].split(';')[0]
+    assert first != second
+    assert store.load(first.split('=', 1)[1])[0] is None
+
+def test_encoding_round_trip():
+    """Plain session values round-trip through the compact encoding."""
+    data = {'user_id': 'u1', 'remember_me': True, 'artist': {'name': 'X', 'genres': ['a']}}
+    assert decode_session(encode_session(data)) == data
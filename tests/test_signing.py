@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.signing import SignerRegistry
+
+
+def test_serializer_reused_per_secrets_and_salt():
+    """The same (secrets, salt) returns the same serializer."""
+    registry = SignerRegistry()
+    first = registry.get(('current',), 'password-reset')
+    assert registry.get(['current'], 'password-reset') is first
+    assert registry.get(('current',), 'email-verification') is not first
+
+def test_rotation_keeps_old_tokens_valid():
+    """Tokens signed with a rotated-out secret verify while it is a fallback."""
+    registry = SignerRegistry()
+    old_token = registry.get(('old',), 'password-reset').dumps({'email': 'a@example.com'})
+    rotated = registry.get(('new', 'old'), 'password-reset')
+    assert rotated.loads(old_token, max_age=60) == {'email': 'a@example.com'}
+    # New tokens are signed with the current secret only
+    new_token = rotated.dumps({'email': 'a@example.com'})
+    assert registry.get(('new',), 'password-reset').loads(new_token, max_age=60)
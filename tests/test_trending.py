@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.trending_service import CountMinSketch, SlidingTopK, TrendingService
+
+
+class FakeApp:
+    def __init__(self, config):
+        self.config = config
+
+
+def test_count_min_sketch_never_undercounts():
+    """Estimates are at least the true count for every key."""
+    sketch = CountMinSketch(width=64, depth=4)
+    truth = {f'artist-{i}': i + 1 for i in range(50)}
+    for key, count in truth.items():
+        sketch.add(key, count)
+    for key, count in truth.items():
+        assert sketch.estimate(key) >= count
+
+def test_sliding_window_expires_old_buckets():
+    """Counts leave the window once their bucket expires."""
+    counter = SlidingTopK(window_seconds=60, bucket_count=6, top_k=2)
+    for _ in range(5):
+        counter.add('old', now=0)
+    for _ in range(2):
+        counter.add('new', now=55)
+    assert counter.top(1, now=55)[0] == ('old', 5)
+    assert counter.top(1, now=65)[0] == ('new', 2)
+
+def test_trending_merges_worker_snapshots(tmp_path):
+    """Snapshots from other workers are summed into the global list."""
+    config = {'TRENDING_SNAPSHOT_DIR': str(tmp_path), 'TRENDING_MERGE_INTERVAL': 0}
+    worker_a, worker_b = TrendingService(), TrendingService()
+    worker_a.init_app(FakeApp(config))
+    worker_b.init_app(FakeApp(config))
+    for _ in range(3):
+        worker_a.record({'id': 'x', 'name': 'X'})
+    worker_a.record({'id': 'y', 'name': 'Y'})
+    worker_a.sync()
+    # Same PID in tests, so publish worker A's snapshot under another name
+    os.replace(tmp_path / f'worker-{os.getpid()}.json', tmp_path / 'worker-a.json')
+    for _ in range(2):
+        worker_b.record({'id': 'y', 'name': 'Y'})
+    worker_b.sync()
+    
+    trending = worker_b.get_trending()
+    
+    assert sorted((t['artist_id'], t['score']) for t in trending) == [('x', 3), ('y', 3)]
+
+def test_trending_ignores_snapshots_older_than_window(tmp_path):
+    """A snapshot last written before the window is skipped and removed."""
+    config = {'TRENDING_SNAPSHOT_DIR': str(tmp_path), 'TRENDING_WINDOW_SECONDS': 60}
+    stale = tmp_path / 'worker-gone.json'
+    stale.write_text(json.dumps({'entries': [{'artist_id': 'x', 'artist_name': 'X', 'score': 9}]}))
+    old = time.time() - 120
+    os.utime(stale, (old, old))
+    service = TrendingService()
+    service.init_app(FakeApp(config))
+    service.record({'id': 'y', 'name': 'Y'})
+    
+    service.sync()
+    
+    assert [(t['artist_id'], t['score']) for t in service.get_trending()] == [('y', 1)]
+    assert not stale.exists()
+
+def test_trending_record_and_read_do_not_merge(tmp_path):
+    """Request threads only read the precomputed list; merging is left to the background thread."""
+    service = TrendingService()
+    service.init_app(FakeApp({'TRENDING_SNAPSHOT_DIR': str(tmp_path), 'TRENDING_MERGE_INTERVAL': 0}))
+    service.record({'id': 'x', 'name': 'X'})
+    
+    assert service.get_trending() == []
+    assert list(tmp_path.iterdir()) == []
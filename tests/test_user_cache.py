@@ -0,0 +1,63 @@
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.user_cache_service import UserCacheService
+from src.utils.version_stamps import VersionStampTable
+
+
+class FakeApp:
+    def __init__(self, config):
+        self.config = config
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(**config):
+        cache = UserCacheService()
+        cache.init_app(FakeApp({'USER_CACHE_STAMP_PATH': str(tmp_path / 'stamps'), **config}))
+        return cache
+    return make
+
+
+def test_hit_avoids_loader(make_cache):
+    """A second read is served from memory."""
+    cache = make_cache()
+    loader = MagicMock(return_value=MagicMock(username='alice'))
+    first = cache.get('u1', loader)
+    second = cache.get('u1', loader)
+    assert first is second
+    assert loader.call_count == 1
+
+def test_invalidation_seen_by_other_process(tmp_path, make_cache):
+    """A bump through another mapping of the stamp file drops the entry."""
+    cache = make_cache()
+    loader = MagicMock(side_effect=lambda user_id: MagicMock())
+    cache.get('u1', loader)
+    # A second worker maps the same file and invalidates the user
+    VersionStampTable(str(tmp_path / 'stamps')).bump('u1')
+    cache.get('u1', loader)
+    assert loader.call_count == 2
+
+def test_lru_bound_and_missing_users_not_cached(make_cache):
+    """The cache never grows beyond its size and does not cache misses."""
+    cache = make_cache(USER_CACHE_SIZE=2)
+    for user_id in ('a', 'b', 'c'):
+        cache.get(user_id, lambda user_id: MagicMock())
+    assert list(cache._entries) == ['b', 'c']
+    loader = MagicMock(return_value=None)
+    cache.get('ghost', loader)
+    cache.get('ghost', loader)
+    assert loader.call_count == 2
+
+def test_expired_entry_reloaded(make_cache):
+    """Entries older than the TTL are loaded again."""
+    cache = make_cache(USER_CACHE_TTL=0)
+    loader = MagicMock(side_effect=lambda user_id: MagicMock())
+    cache.get('u1', loader)
+    cache.get('u1', loader)
+    assert loader.call_count == 2